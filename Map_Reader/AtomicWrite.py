@@ -0,0 +1,150 @@
+import os
+import glob
+import json
+import shutil
+import threading
+
+#When data is forced to disk with fsync:
+#   always: every write including each journaled change, nothing is lost on power loss
+#   snapshot: whole file writes only, the last journaled changes can be lost on power loss
+#   never: left to the OS, writes are still atomic so an app crash can't corrupt a file
+FSYNC_POLICIES = ('always', 'snapshot', 'never')
+FSYNC_DEFAULT = 'snapshot'
+
+#Previous generations of a file kept as {path}.bak1, {path}.bak2...
+BACKUPS = 2
+
+def backupPaths(path, backups=BACKUPS):
+    return [f'{path}.bak{n}' for n in range(1, backups + 1)]
+
+def syncDirectory(directory):
+    '''
+    fsync a directory so a rename in it survives power loss, not possible
+    on Windows where renames are journaled by NTFS
+    '''
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def writeTemp(path, text, fsync=FSYNC_DEFAULT):
+    '''
+    Write text, or an iterable of text pieces, to a temporary file next
+    to path
+
+    Returns:
+        path of the temporary file, pass it to commit()
+    '''
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wt') as f:
+        if isinstance(text, str):
+            f.write(text)
+        else:
+            f.writelines(text)
+        f.flush()
+        if fsync != 'never':
+            os.fsync(f.fileno())
+
+    return tmp
+
+def commit(tmp, path, fsync=FSYNC_DEFAULT, backups=BACKUPS):
+    '''
+    Replace path with a file from writeTemp(). The current file becomes
+    the first backup generation, it's hard linked so path always exists.
+    '''
+    if backups and os.path.exists(path):
+        generations = backupPaths(path, backups)
+        for older, newer in zip(reversed(generations[1:]), reversed(generations[:-1])):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+        try:
+            if os.path.exists(generations[0]):
+                os.remove(generations[0])
+            os.link(path, generations[0])
+        except OSError:
+            #filesystems without hard links
+            shutil.copy2(path, generations[0])
+
+    os.replace(tmp, path)
+    if fsync != 'never':
+        syncDirectory(os.path.dirname(os.path.abspath(path)))
+
+def writeAtomic(path, text, fsync=FSYNC_DEFAULT, backups=BACKUPS):
+    '''
+    Write a file with temp file, fsync and rename so a crash or power loss
+    leaves either the old or the new file, never a truncated one
+    '''
+    tmp = writeTemp(path, text, fsync)
+    try:
+        commit(tmp, path, fsync, backups)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def writeJson(path, data, fsync=FSYNC_DEFAULT, backups=BACKUPS, indent=None):
+    writeAtomic(path, json.dumps(data, indent=indent), fsync, backups)
+
+def readRecovering(path, load=json.load, backups=BACKUPS):
+    '''
+    Read and parse a file, falling back to its newest readable backup
+
+    Args:
+        path (str): file to read
+        load (callable): load(f) parses an open text file and raises
+            ValueError if it's damaged
+
+    Returns:
+        data: parsed file
+        source (str): path that was read, not path if it was recovered
+
+    Raises:
+        the error of path if neither it nor any backup could be read
+    '''
+    error = None
+    for candidate in [path] + backupPaths(path, backups):
+        try:
+            with open(candidate, 'rt') as f:
+                return load(f), candidate
+        except (OSError, ValueError) as e:
+            if error is None:
+                error = e
+
+    raise error
+
+def readRecoveringSteps(path, load, backups=BACKUPS):
+    '''
+    readRecovering() with a load generator that reads the file in steps,
+    see ProjectReader.readProjectSteps. Its steps are passed on, a file
+    found damaged part way through is read again from the next backup.
+
+    Returns:
+        data: parsed file
+        source (str): path that was read
+    '''
+    error = None
+    for candidate in [path] + backupPaths(path, backups):
+        try:
+            with open(candidate, 'rt') as f:
+                return (yield from load(f)), candidate
+        except (OSError, ValueError) as e:
+            if error is None:
+                error = e
+
+    raise error
+
+def removeTemp(path):
+    '''
+    Remove temporary files of path left by writes that never finished
+    '''
+    for tmp in glob.glob(glob.escape(path) + '.*.tmp'):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
@@ -0,0 +1,51 @@
+import sys, os
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+import argparse
+import timeit
+import numpy as np
+from geopy.distance import geodesic
+
+import Geodesic
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--points', type=int, default=10000, help='Number of destinations to solve')
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+lat = rng.uniform(-80, 80, args.points)
+lon = rng.uniform(-180, 180, args.points)
+dist = rng.uniform(0, 50, args.points)
+bearing = rng.uniform(0, 360, args.points)
+triples = list(zip(lat.tolist(), lon.tolist(), dist.tolist(), bearing.tolist()))
+
+def geopyPath():
+    #Path used by Tracker.newLocation before Geodesic was added
+    return [geodesic(kilometers=d).destination((la, lo), b) for la, lo, d, b in triples]
+
+def scalarPath():
+    return [Geodesic.destination(la, lo, d * 1000, b) for la, lo, d, b in triples]
+
+def batchPath():
+    return Geodesic.destinations(lat, lon, dist * 1000, bearing)
+
+results = {}
+for name, func in [('geopy', geopyPath), ('scalar', scalarPath), ('batch', batchPath)]:
+    seconds = min(timeit.repeat(func, number=1, repeat=3))
+    results[name] = seconds
+    print(f'{name:>7}: {seconds / args.points * 1e6:10.3f} us/point  ({args.points / seconds:,.0f} points/s)')
+
+print(f'scalar speedup: {results["geopy"] / results["scalar"]:.1f}x')
+print(f' batch speedup: {results["geopy"] / results["batch"]:.1f}x')
+
+expected = geopyPath()
+lat2, lon2 = batchPath()
+error = max(geodesic((p.latitude, p.longitude), (la, lo)).meters for p, la, lo in zip(expected, lat2, lon2))
+print(f'max error vs geopy: {error * 1000:.6f} mm')
+
+#Tangent-plane preview error used by TrackerLoc while tracing
+plane = Geodesic.TangentPlane(float(lat[0]), float(lon[0]), unit=1000)
+print(f'tangent plane error at latitude {lat[0]:.2f}:')
+for km in [0.1, 1, 5, 10, 25, 50, 100]:
+    print(f'{km:>9} km: {plane.maxError(km):12.4f} m')
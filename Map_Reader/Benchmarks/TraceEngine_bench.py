@@ -0,0 +1,40 @@
+import sys, os
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+import argparse
+import numpy as np
+
+import TraceEngine
+import TraceRecorder
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--events', type=int, default=200000, help='Number of synthetic events to replay')
+parser.add_argument('--file', type=str, help='Replay traces from a project_traces.bin file instead')
+parser.add_argument('--compute-every', type=int, default=1, help='Events between derived value updates')
+args = parser.parse_args()
+
+if args.file:
+    traces = list(TraceRecorder.loadTraces(args.file))
+    streams = [(t.ref if not np.isnan(t.ref[0]) else (38.5, -121.5), t.scale or 100, t.units or 'km',
+                np.column_stack((t.samples['dx'], t.samples['dy']))) for t in traces]
+else:
+    #synthetic 1000 Hz mouse drifting north east with jitter
+    rng = np.random.default_rng(0)
+    deltas = rng.integers(-3, 8, size=(args.events, 2))
+    streams = [((38.5, -121.5), 100, 'km', deltas)]
+
+for mode in ['scale', 'location']:
+    totals = []
+    for ref, scale, units, deltas in streams:
+        if mode == 'scale':
+            engine = TraceEngine.TraceEngine()
+        else:
+            engine = TraceEngine.TraceEngine(ref, scale, units)
+        totals.append(TraceEngine.replay(engine, deltas, args.compute_every))
+
+    events = sum(t['Events'] for t in totals)
+    seconds = sum(t['Seconds'] for t in totals)
+    print(f'{mode:>8}: {events:,} events in {seconds:.3f}s  ({events / seconds:,.0f} events/s)')
+    for key in ['P50_us', 'P95_us', 'P99_us', 'Max_us']:
+        print(f'{key:>14}: {max(t[key] for t in totals):8.3f}')
@@ -0,0 +1,113 @@
+from bisect import bisect_left, bisect_right, insort
+from fractions import Fraction
+
+def finalRows(changes):
+    '''
+    Row each change's row ends up at once the changes after it are applied,
+    None if a later change deleted it. Changes are applied after the data
+    was changed, so this is the row to read e.g. an added point from.
+
+    The changes are walked once from the last, keeping the final rows of
+    points added by later changes and the rows later changes delete in
+    sorted lists so each row is found with a bisect.
+
+    Args:
+        changes (list): (op, index) of one key of a ChangeSet
+    '''
+    rows = [None] * len(changes)
+    added = []      #final rows of points added after the current change
+    deleted = []    #(final row it was in front of, order) of points deleted after it
+
+    for k in range(len(changes) - 1, -1, -1):
+        op, index = changes[k]
+        if op == 'set':
+            #every change before a set is replaced by it
+            break
+
+        final, j = locate(index, added, deleted)
+        rows[k] = final
+
+        if op == 'add':
+            #the point isn't there before it was added
+            if final is None:
+                del deleted[j]
+            else:
+                insort(added, final)
+        elif op == 'delete':
+            #the point deleted goes in front of the one now at its row
+            if final is None:
+                anchor, after = deleted[j]
+                before = deleted[j - 1][1] if j and deleted[j - 1][0] == anchor else after - 1
+                deleted.insert(j, (anchor, Fraction(before + after) / 2))
+            else:
+                last = deleted[j - 1][1] + 1 if j and deleted[j - 1][0] == final else 0
+                deleted.insert(j, (final, last))
+
+    return rows
+
+def locate(row, added, deleted):
+    '''
+    Find what is at a row before the later changes are applied
+
+    Args:
+        row (int): row before the later changes
+        added (list): sorted final rows of points added by the later changes
+        deleted (list): sorted (final row, order) of points they delete
+
+    Returns:
+        final (int): final row or None if a later change deletes it
+        j (int): index in deleted of the deleted point if final is None,
+            otherwise where a point deleted in front of it would go
+    '''
+    #smallest final row where the rows up to and including it pass row
+    lo, hi = 0, row + len(added)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if mid + 1 - bisect_right(added, mid) + bisect_left(deleted, (mid + 1,)) > row:
+            hi = mid
+        else:
+            lo = mid + 1
+
+    j = row - (lo - bisect_left(added, lo))
+    end = bisect_left(deleted, (lo + 1,))
+    if j < end:
+        return None, j
+
+    return lo, end
+
+class ChangeSet():
+    '''
+    Changes made to the lists of project data (Points, Reference) since the
+    views last took them, so the tables and map can update just those rows
+    instead of being rebuilt. Changes are the add, delete, edit and set
+    operations recorded in the project journal, kept in order so applying
+    them one at a time keeps row numbers right.
+    '''
+    def __init__(self):
+        self.changes = {}
+
+    def record(self, op, key, index=None):
+        '''
+        Args:
+            op (str): 'add', 'delete', 'edit' or 'set'
+            key (str): project data key
+            index (int): row added, deleted or edited
+        '''
+        if op == 'set':
+            #the whole value was replaced so earlier changes to it don't matter
+            self.changes[key] = [('set', None)]
+        else:
+            self.changes.setdefault(key, []).append((op, index))
+
+    def take(self):
+        '''
+        Return the changes since the last take() and start a new set
+
+        Returns:
+            dict of key -> list of (op, index)
+        '''
+        changes, self.changes = self.changes, {}
+        return changes
+
+    def __bool__(self):
+        return bool(self.changes)
@@ -1,6 +1,10 @@
-from PyQt5.QtWidgets import QGraphicsDropShadowEffect, QLineEdit, QTreeView, QWidget, QVBoxLayout, QGroupBox, QAbstractItemView, QGridLayout, QPushButton
-from PyQt5.QtCore import QDate, QDateTime, QRegExp, QSortFilterProxyModel, Qt, QTime, QModelIndex, QSize, pyqtSignal, QObject
-from PyQt5.QtGui import QStandardItemModel, QIcon, QStandardItem
+from PyQt5.QtWidgets import QGraphicsDropShadowEffect, QLineEdit, QTableView, QHeaderView, QWidget, QVBoxLayout, QGroupBox, QAbstractItemView, QGridLayout, QPushButton
+from PyQt5.QtCore import QDate, QDateTime, QRegExp, Qt, QTime, QModelIndex, QSize, pyqtSignal, QObject, QAbstractTableModel
+from PyQt5.QtGui import QIcon
+import numpy as np
+
+import SearchIndex
+import ChangeSet
 
 class Button(QPushButton):
     def __init__(self, name=None):
@@ -34,22 +38,475 @@ class LineEdit(QLineEdit):
         QLineEdit.focusOutEvent(self, event)
         self.setGraphicsEffect(None)
 
-class DeselectableTreeView(QTreeView):
+class DeselectableTableView(QTableView):
+    '''
+    Table view laid out like a list: whole rows are selected and rows have
+    a fixed height, so unlike QTreeView it never visits rows it doesn't show
+    '''
+    def __init__(self, parent=None):
+        QTableView.__init__(self, parent)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setShowGrid(False)
+        self.setWordWrap(False)
+        self.verticalHeader().hide()
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.horizontalHeader().setStretchLastSection(True)
+        self.horizontalHeader().setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+
     def mousePressEvent(self, e):
         self.clearSelection()
-        QTreeView.mousePressEvent(self, e)
+        QTableView.mousePressEvent(self, e)
 
     def focusOutEvent(self, event):
-        QTreeView.focusOutEvent(self, event)
+        QTableView.focusOutEvent(self, event)
         self.clearSelection()
 
+class TableModel(QAbstractTableModel):
+    '''
+    Model of a Table that reads each cell straight from its rows, a list of
+    dicts, a list of sequences in column order (like reference points) or a
+    PointStore, so only the cells the view shows are ever built.
+    The rows aren't copied: after adding, deleting or editing rows call
+    rowsAdded(), rowsDeleted() or rowsEdited() so views update only those
+    rows, or reset() when the rows are replaced.
+
+    Sorting and filtering are done by the model instead of a proxy. Each
+    column has a typed sort key array, taken from the PointStore's columns
+    or built once from the rows, and the rows are ordered with a stable
+    numpy argsort, so sorting a million points takes milliseconds. order
+    maps view rows to rows and is None while every row is shown in order.
+    The key arrays are kept as rows change, a changed row only has its own
+    key computed and is inserted into order with a binary search over the
+    keys of the shown rows.
+    '''
+    def __init__(self, rows, columns, sortKeys=None, parent=None):
+        '''
+        Args:
+            rows: list of dicts, list of sequences or PointStore
+            columns (list): keys of the rows shown, 'ID' is the row number
+                and '' a check box
+            sortKeys (dict): column -> key of the row value it's sorted by
+        '''
+        QAbstractTableModel.__init__(self, parent)
+        self.columns = columns
+        self.sortKeys = sortKeys or {}
+        self.rows = rows
+        self.count = len(rows)
+        self.checked = set()
+
+        #position of each column's value in rows that are sequences
+        self.positions = {key: i for i, key in enumerate(col for col in columns if col not in ('ID', ''))}
+
+        self.order = None
+        self.sortColumn = -1
+        self.sortOrder = Qt.AscendingOrder
+        self.filterText = ''
+
+        #column -> sort key array of every row, kept as rows change, and
+        #column -> rows in sorted order, cleared when rows change
+        self.keys = {}
+        self.sorted = {}
+
+        #sort keys of the rows in order, None when rows are shown by row
+        #number (unsorted or sorted by ID)
+        self.orderKeys = None
+
+        #PointStore.rankings the description keys were built with
+        self.rankings = getattr(rows, 'rankings', 0)
+
+        #set while applyChanges() works through a batch, the rows already
+        #hold the whole batch so sorting again has to wait for the end
+        self.batch = False
+        self.stale = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.count if self.order is None else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.columns[section]
+
+        return None
+
+    def sourceRow(self, row):
+        '''
+        Row of the rows shown at a view row
+        '''
+        return row if self.order is None else int(self.order[row])
+
+    def value(self, row, key):
+        '''
+        Value of key in a row, a PointStore builds only that cell
+        '''
+        if key == 'ID':
+            return row + 1
+        #the rows change before views are told about it
+        if row >= len(self.rows):
+            return None
+        if hasattr(self.rows, 'cell'):
+            return self.rows.cell(row, key)
+
+        item = self.rows[row]
+        if isinstance(item, dict):
+            return item.get(key)
+
+        return item[self.positions[key]] if key in self.positions else None
+
+    def rowData(self, row):
+        '''
+        Dict of the columns of a row, without the check box column
+        '''
+        return {col: self.value(row, col) for col in self.columns if col}
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = self.sourceRow(index.row())
+        col = self.columns[index.column()]
+        if col == '':
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if row in self.checked else Qt.Unchecked
+        elif role == Qt.DisplayRole:
+            return self.value(row, col)
+
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or self.columns[index.column()] != '' or role != Qt.CheckStateRole:
+            return False
+
+        row = self.sourceRow(index.row())
+        if value == Qt.Checked:
+            self.checked.add(row)
+        else:
+            self.checked.discard(row)
+        self.dataChanged.emit(index, index, [role])
+
+        return True
+
+    def flags(self, index):
+        flags = QAbstractTableModel.flags(self, index)
+        if index.isValid() and self.columns[index.column()] == '':
+            flags |= Qt.ItemIsUserCheckable
+
+        return flags
+
+    def rowKeys(self, column, start=0, stop=None):
+        '''
+        Sort keys of rows start to stop of a column: float for numbers, epoch
+        seconds for dates (see sortKeys) and casefolded strings for text.
+        A PointStore and rows of numbers in column order (reference points)
+        give their keys as numpy columns, other rows are read one at a time.
+        '''
+        stop = self.count if stop is None else stop
+        col = self.columns[column]
+        key = self.sortKeys.get(col, col)
+        if col == 'ID':
+            return np.arange(start, stop)
+        if hasattr(self.rows, 'sortKey'):
+            keys = self.rows.sortKey(key, start, stop)
+            if keys is not None:
+                return keys
+        elif self.count and key in self.positions and not isinstance(self.rows[0], dict):
+            try:
+                return np.array(self.rows[start:stop], dtype=np.float64).reshape(stop - start, -1)[:, self.positions[key]]
+            except (TypeError, ValueError, IndexError):
+                pass
+
+        values = [self.value(row, key) for row in range(start, stop)]
+        try:
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        except (TypeError, ValueError):
+            return np.array(['' if v is None else str(v).casefold() for v in values])
+
+    def sortKey(self, column):
+        '''
+        Array to sort the rows by a column, see rowKeys()
+        '''
+        if self.columns[column] == 'ID':
+            return np.arange(self.count)
+        if column not in self.keys:
+            #a copy, PointStore keys are views of columns changed in place
+            self.keys[column] = np.array(self.rowKeys(column))
+            self.rankings = getattr(self.rows, 'rankings', 0)
+
+        return self.keys[column]
+
+    def sortedRows(self, column):
+        '''
+        Rows in ascending order of a column, ties stay in row order
+        '''
+        if column not in self.sorted:
+            self.sorted[column] = np.argsort(self.sortKey(column), kind='stable')
+
+        return self.sorted[column]
+
+    def clearKeys(self):
+        self.keys.clear()
+        self.sorted.clear()
+
+    def spliceKeys(self, first, stop, count, source=None):
+        '''
+        Replace the keys of rows first to stop in every cached key array
+        with the keys of count rows, only those rows' keys are computed.
+        The new keys are read from row source on (first by default).
+
+        Returns:
+            False if the keys had to be thrown away, the PointStore ranked
+            its descriptions again or a column's values changed type
+        '''
+        self.sorted.clear()
+        for column, keys in list(self.keys.items()):
+            source = first if source is None else source
+            new = self.rowKeys(column, source, source + count) if count else keys[:0]
+            if new.dtype.kind != keys.dtype.kind:
+                self.clearKeys()
+                return False
+            #concatenate so a longer string widens the array instead of being cut
+            self.keys[column] = np.concatenate((keys[:first], new, keys[stop:]))
+
+        if getattr(self.rows, 'rankings', 0) != self.rankings:
+            self.clearKeys()
+            return False
+
+        return True
+
+    def rowKey(self, row):
+        '''
+        Sort key of a row in the sort column, its row number when unsorted
+        '''
+        return row if self.orderKeys is None else self.sortKey(self.sortColumn)[row]
+
+    def accepts(self, row):
+        '''
+        True if a row matches the filter, every word of the filter must
+        start a word of the Description column, or of any column in tables
+        without one
+        '''
+        if not self.filterText:
+            return True
+
+        keys = ['Description'] if 'Description' in self.columns else list(self.positions)
+        return SearchIndex.matches(self.filterText, ' '.join(str(self.value(row, key) or '') for key in keys))
+
+    def arrange(self):
+        '''
+        Compute the order of the rows for the sort column and filter
+        '''
+        if self.sortColumn < 0 and not self.filterText:
+            self.order = None
+            return
+
+        mask = None
+        if self.filterText and 'Description' in self.columns and hasattr(self.rows, 'search'):
+            mask = self.rows.search(self.filterText)
+        elif self.filterText:
+            mask = np.array([self.accepts(row) for row in range(self.count)], dtype=bool)
+
+        #filtering a sorted table only masks the cached sorted rows
+        if self.sortColumn < 0:
+            rows = np.flatnonzero(mask)
+        else:
+            rows = self.sortedRows(self.sortColumn)
+            if self.sortOrder == Qt.DescendingOrder:
+                rows = rows[::-1]
+            if mask is not None:
+                rows = rows[mask[rows]]
+
+        #order is changed in place by rowsAdded() and rowsDeleted()
+        self.order = np.array(rows, dtype=np.int64)
+        if self.sortColumn < 0 or self.columns[self.sortColumn] == 'ID':
+            self.orderKeys = None
+        else:
+            self.orderKeys = self.sortKey(self.sortColumn)[self.order]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.beginResetModel()
+        self.sortColumn = column
+        self.sortOrder = order
+        self.arrange()
+        self.endResetModel()
+
+    def setFilter(self, text):
+        '''
+        Show only the rows matching text, see accepts()
+        '''
+        self.beginResetModel()
+        self.filterText = text if SearchIndex.tokenize(text) else ''
+        self.arrange()
+        self.endResetModel()
+
+    def reset(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.count = len(rows)
+        self.checked.clear()
+        self.clearKeys()
+        self.arrange()
+        self.endResetModel()
+
+    def rearrange(self):
+        '''
+        Sort and filter every row again after the keys were thrown away
+        '''
+        if self.batch:
+            self.stale = True
+            return
+
+        self.beginResetModel()
+        self.arrange()
+        self.endResetModel()
+
+    def place(self, row, source=None):
+        '''
+        Insert a row into order at its sorted position if it passes the
+        filter, a binary search over the keys of the shown rows. The filter
+        reads the row from source (row by default).
+        '''
+        if not self.accepts(row if source is None else source):
+            return
+
+        key = self.rowKey(row)
+        shown = self.order if self.orderKeys is None else self.orderKeys
+        if self.sortColumn < 0 or self.sortOrder == Qt.AscendingOrder:
+            position = int(np.searchsorted(shown, key, side='right'))
+        else:
+            position = len(shown) - int(np.searchsorted(shown[::-1], key, side='left'))
+
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.order = np.insert(self.order, position, row)
+        if self.orderKeys is not None:
+            self.orderKeys = np.concatenate((self.orderKeys[:position], [key], self.orderKeys[position:]))
+        self.endInsertRows()
+
+    def unplace(self, row):
+        '''
+        Remove a row from order if it's shown
+        '''
+        position = np.flatnonzero(self.order == row)
+        if len(position):
+            self.beginRemoveRows(QModelIndex(), int(position[0]), int(position[0]))
+            self.order = np.delete(self.order, position[0])
+            if self.orderKeys is not None:
+                self.orderKeys = np.delete(self.orderKeys, position[0])
+            self.endRemoveRows()
+
+    def rowsAdded(self, first, count=1, source=None):
+        '''
+        count rows were inserted at row first, they are read from row
+        source on when later changes moved them (see applyChanges)
+        '''
+        self.checked = {row + count if row >= first else row for row in self.checked}
+        if self.order is None:
+            self.beginInsertRows(QModelIndex(), first, first + count - 1)
+            self.count += count
+            self.spliceKeys(first, first, count, source)
+            self.endInsertRows()
+            return
+
+        self.count += count
+        if not self.spliceKeys(first, first, count, source):
+            self.rearrange()
+            return
+
+        source = first if source is None else source
+        self.order[self.order >= first] += count
+        for i in range(count):
+            self.place(first + i, source + i)
+
+    def rowsDeleted(self, first, count=1):
+        '''
+        count rows were deleted from row first
+        '''
+        self.checked = {row - count if row >= first + count else row for row in self.checked if not first <= row < first + count}
+        if self.order is None:
+            self.beginRemoveRows(QModelIndex(), first, first + count - 1)
+            self.count -= count
+            self.spliceKeys(first, first + count, 0)
+            self.endRemoveRows()
+            return
+
+        for row in range(first, first + count):
+            self.unplace(row)
+        self.count -= count
+        self.spliceKeys(first, first + count, 0)
+        self.order[self.order >= first + count] -= count
+
+    def rowsEdited(self, first, last=None, source=None):
+        '''
+        Rows first to last (inclusive) were changed in place, they are read
+        from row source on when later changes moved them
+        '''
+        last = first if last is None else last
+        current = self.spliceKeys(first, last + 1, last + 1 - first, source)
+        if self.order is None:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.columns) - 1))
+            return
+        if not current:
+            self.rearrange()
+            return
+
+        #an edited row can move or start or stop passing the filter
+        source = first if source is None else source
+        for i in range(last + 1 - first):
+            self.unplace(first + i)
+            self.place(first + i, source + i)
+
+    def applyChanges(self, changes):
+        '''
+        Apply a batch of ChangeSet changes one at a time. The rows already
+        hold the whole batch, so an added or edited row's keys are read from
+        the row later changes moved it to (ChangeSet.finalRows).
+
+        Args:
+            changes (list): (op, index) of the rows' key in a ChangeSet
+
+        Returns:
+            False if the rows have to be reset instead: they were replaced,
+            a row was deleted after being added or edited, or the keys had
+            to be thrown away part way through
+        '''
+        rows = ChangeSet.finalRows(changes)
+        if any(op == 'set' or (row is None and op != 'delete') for (op, _), row in zip(changes, rows)):
+            return False
+
+        self.batch = True
+        try:
+            for (op, index), row in zip(changes, rows):
+                if op == 'add':
+                    self.rowsAdded(index, source=row)
+                elif op == 'delete':
+                    self.rowsDeleted(index)
+                elif op == 'edit':
+                    self.rowsEdited(index, source=row)
+                if self.stale:
+                    break
+        finally:
+            self.batch = False
+
+        stale, self.stale = self.stale, False
+        return not stale
+
 class Table(QWidget):
-    def __init__(self, name, data, columns=None, index=False, checkable=False, parent=None):
+    def __init__(self, name, data, columns=None, index=False, checkable=False, sortKeys=None, filterable=False, parent=None):
         QWidget.__init__(self, parent)
 
         self.name = name
         self.index = index
         self.checkable = checkable            
+        self.filterable = filterable
+
+        #column name -> key of the row value it's sorted by, e.g. Date -> Timestamp
+        self.sortKeys = sortKeys or {}
         
         if not any([data, columns]):
             self.columns = []
@@ -62,7 +519,7 @@ class Table(QWidget):
         if index:
             self.columns.insert(0, 'ID')
         
-        self.setData(data)
+        self.data = data
 
         self.initUI()
 
@@ -71,53 +528,39 @@ class Table(QWidget):
         
         mainLayout = QVBoxLayout()
 
-        self.proxyModel = QSortFilterProxyModel()
-        self.proxyModel.setDynamicSortFilter(True)
-
-        self.sourceModel = QStandardItemModel(0, len(self.columns), self)
-        
-        for i, column in enumerate(self.columns):
-            self.sourceModel.setHeaderData(i, Qt.Horizontal, column)
-
-        self.proxyModel.setSourceModel(self.sourceModel)
+        self.sourceModel = TableModel(self.data, self.columns, self.sortKeys, self)
         
         self.proxyGroupBox = QGroupBox(self.name)
 
-        self.proxyView = DeselectableTreeView()
-        self.proxyView.setRootIsDecorated(False)
+        self.proxyView = DeselectableTableView()
         self.proxyView.setAlternatingRowColors(True)
-        self.proxyView.setModel(self.proxyModel)
+        self.proxyView.setModel(self.sourceModel)
 
-        if not self.checkable:
-            self.proxyView.setSortingEnabled(True)
-            self.proxyView.sortByColumn(0, Qt.AscendingOrder)
+        if self.checkable:
+            self.proxyView.setColumnWidth(0, 1)
+        else:
+            #rows are already in ID order, sorting them up front would read every row
+            header = self.proxyView.horizontalHeader()
+            header.setSectionsClickable(True)
+            header.setSortIndicatorShown(True)
+            header.setSortIndicator(0, Qt.AscendingOrder)
+            header.sortIndicatorChanged.connect(self.sourceModel.sort)
 
         self.proxyView.setEditTriggers(QAbstractItemView.NoEditTriggers)
 
         proxyLayout = QGridLayout()
-        proxyLayout.addWidget(self.proxyView, 0, 0, 1, 3)
+        if self.filterable:
+            self.filterEdit = QLineEdit()
+            self.filterEdit.setPlaceholderText('Search descriptions')
+            self.filterEdit.setClearButtonEnabled(True)
+            self.filterEdit.textChanged.connect(self.sourceModel.setFilter)
+            proxyLayout.addWidget(self.filterEdit, 0, 0, 1, 3)
+        proxyLayout.addWidget(self.proxyView, 1, 0, 1, 3)
         self.proxyGroupBox.setLayout(proxyLayout)
 
         mainLayout.addWidget(self.proxyGroupBox)
         self.setLayout(mainLayout)
-        self.update(self.data)  
     
-    def setSourceModel(self, model):
-        self.proxyModel.setSourceModel(model)
-
-    def setData(self, data):
-        self.data = []
-        for i, item in enumerate(data):
-            d = {}
-            for col in self.columns:
-                if col == 'ID':
-                    d[col] = item.get(col, i+1)
-                else:
-                    d[col] = item.get(col)
-            self.data.append(d)
-
-        #self.data = [{k: item.get(k, i+1) for k in self.columns} for i, item in enumerate(data)]
-
     def sortBy(self, colName):
         idx = 0
         try:
@@ -133,40 +576,41 @@ class Table(QWidget):
     def columnCount(self):
         return self.sourceModel.columnCount()
 
-    def addRow(self, row_i, rowData):
-        self.sourceModel.insertRow(row_i)
-
-        for col_i, data in enumerate(rowData.values()):
-            if self.checkable and col_i == 0:
-                self.proxyView.setColumnWidth(col_i, 1)
-                item = QStandardItem(True)
-                item.setCheckable(True)
-                item.setCheckState(False)
-                self.sourceModel.setItem(row_i, col_i, item)
-            else:
-                self.sourceModel.setData(self.sourceModel.index(row_i, col_i), data)
-            
     def update(self, data):
-        self.setData(data)
-        self.sourceModel.removeRows(0, self.sourceModel.rowCount())
-        
-        for i, data in enumerate(self.data):
-            self.addRow(i, data)
+        '''
+        Show new rows, views are reset so this reads only the visible rows
+        '''
+        self.data = data
+        self.sourceModel.reset(data)
+
+    def rowsAdded(self, first, count=1):
+        self.sourceModel.rowsAdded(first, count)
+
+    def rowsDeleted(self, first, count=1):
+        self.sourceModel.rowsDeleted(first, count)
+
+    def rowsEdited(self, first, last=None):
+        self.sourceModel.rowsEdited(first, last)
+
+    def applyChanges(self, changes, data=None):
+        '''
+        Update the rows changed since the last refresh
+
+        Args:
+            changes (list): (op, index) of the rows' key in a ChangeSet
+            data: the rows, shown instead of the current ones after a 'set'
+        '''
+        if not self.sourceModel.applyChanges(changes):
+            self.update(self.data if data is None else data)
 
     def getSelectedRowIndex(self):
         '''
         Returns the index of the selected row from the source model
         '''
         try:
-            return self.proxyModel.mapToSource(self.proxyView.selectedIndexes()[0]).row()
+            return self.sourceModel.sourceRow(self.proxyView.selectedIndexes()[0].row())
         except:
             return False
 
     def getCheckedRowData(self):
-        selectedData = []
-        for row_i in range(self.sourceModel.rowCount()):
-            item = self.sourceModel.item(row_i, 0)
-            if item.checkState():
-                selectedData.append(self.data[row_i])
-
-        return selectedData
+        return [self.sourceModel.rowData(row_i) for row_i in sorted(self.sourceModel.checked)]
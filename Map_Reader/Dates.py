@@ -0,0 +1,111 @@
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+#Format of dates written with QDateTime 'MM-dd-yyyy hh:mm:ss ap'
+DATE_FORMAT = '%m-%d-%Y %I:%M:%S %p'
+
+#Timestamp of a point without a date in numpy columns
+NO_DATE = np.iinfo(np.int64).min
+
+EPOCH = datetime(1970, 1, 1)
+
+#points traced in one session share most of their dates
+@lru_cache(maxsize=4096)
+def timestamp(date):
+    '''
+    Sortable epoch seconds of a date string or None if it can't be parsed
+    '''
+    try:
+        #fixed width MM-dd-yyyy hh:mm:ss ap, slicing is ~5x faster than strptime
+        if len(date) != 22 or date[2] != '-' or date[13] != ':':
+            raise ValueError(date)
+        hour = int(date[11:13]) % 12 + (12 if date[20:22].lower() == 'pm' else 0)
+        return int(datetime(
+            int(date[6:10]), int(date[0:2]), int(date[3:5]),
+            hour, int(date[14:16]), int(date[17:19])
+        ).timestamp())
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        return int(datetime.strptime(date, DATE_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+def now():
+    '''
+    Epoch seconds and UTC offset in seconds of the current time, points
+    are stored with both so they show the time they were recorded at
+    '''
+    current = datetime.now().astimezone()
+    return int(current.timestamp()), int(current.utcoffset().total_seconds())
+
+def utcOffset(ts):
+    '''
+    UTC offset in seconds of this computer's timezone at epoch seconds ts
+    '''
+    return int(datetime.fromtimestamp(ts).astimezone().utcoffset().total_seconds())
+
+def timestamps(dates):
+    '''
+    Vectorized timestamp() of many date strings, used to convert the
+    points of legacy projects in one pass. Dates are in this computer's
+    timezone, its offset is looked up once per distinct hour.
+
+    Args:
+        dates (list): date strings, None or '' for points without a date
+
+    Returns:
+        ts (np.ndarray): int64 epoch seconds, NO_DATE where unparsable
+        offsets (np.ndarray): int32 UTC offsets in seconds
+    '''
+    parsed = pd.to_datetime(pd.Series(dates, dtype=object), format=DATE_FORMAT, errors='coerce')
+    wall = parsed.to_numpy().astype('datetime64[s]').astype(np.int64)
+    valid = wall != NO_DATE
+
+    ts = np.full(len(wall), NO_DATE, dtype=np.int64)
+    offsets = np.zeros(len(wall), dtype=np.int32)
+    if not valid.any():
+        return ts, offsets
+
+    hours, inverse = np.unique(wall[valid] // 3600, return_inverse=True)
+    hourOffsets = np.array([
+        int(hour * 3600 - (EPOCH + timedelta(hours=int(hour))).timestamp())
+        for hour in hours.tolist()
+    ], dtype=np.int32)
+
+    offsets[valid] = hourOffsets[inverse]
+    ts[valid] = wall[valid] - offsets[valid]
+
+    return ts, offsets
+
+def formatDate(ts, offset=None):
+    '''
+    Inverse of timestamp(), format epoch seconds the way QDateTime does
+    with 'MM-dd-yyyy hh:mm:ss ap' or '' for a missing date
+
+    Args:
+        ts (int): epoch seconds
+        offset (int): UTC offset in seconds, this computer's timezone if None
+    '''
+    if ts is None or ts == NO_DATE:
+        return ''
+    if offset is None:
+        offset = utcOffset(ts)
+
+    #gmtime of the wall clock is ~2x faster than datetime and locale independent
+    wall = time.gmtime(ts + offset)
+    return time.strftime('%m-%d-%Y %I:%M:%S ', wall) + ('am' if wall.tm_hour < 12 else 'pm')
+
+def formatDates(ts, offsets):
+    '''
+    formatDate() of columns of timestamps and offsets
+
+    Returns:
+        list of date strings
+    '''
+    return [formatDate(t, o) for t, o in zip(np.asarray(ts).tolist(), np.asarray(offsets).tolist())]
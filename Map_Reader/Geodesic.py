@@ -0,0 +1,255 @@
+import math
+import numpy as np
+
+#WGS-84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+#Meters per unit of measurement selectable in ScaleWindow
+UNITS = {
+    'km': 1000.0,
+    'm': 1.0,
+    'mi': 1609.344,
+    'ft': 0.3048
+}
+
+#Convergence limits for Vincenty's iteration on sigma
+TOLERANCE = 1e-12
+MAX_ITERATIONS = 200
+
+def toMeters(dist, units):
+    '''
+    Convert distance in given units (km, m, mi, ft) to meters
+
+    Args:
+        dist (float or ndarray): distance in given units
+        units (str): unit of measurement
+
+    Returns:
+        distance in meters
+    '''
+    try:
+        return dist * UNITS[units]
+    except KeyError:
+        raise ValueError(f'Unsupported units: {units}')
+
+def destination(lat, lon, dist, bearing):
+    '''
+    Solve the direct geodesic problem on the WGS-84 ellipsoid for a single
+    point using Vincenty's formulae. Uses the math module only so a single
+    call doesn't pay numpy's per-call overhead.
+
+    Args:
+        lat (float): latitude of the start point in degrees
+        lon (float): longitude of the start point in degrees
+        dist (float): distance in meters
+        bearing (float): initial bearing in degrees clockwise from north
+
+    Returns:
+        lat2 (float): latitude of the destination in degrees
+        lon2 (float): longitude of the destination in degrees
+    '''
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+
+    alpha1 = math.radians(bearing)
+    sinAlpha1 = math.sin(alpha1)
+    cosAlpha1 = math.cos(alpha1)
+
+    tanU1 = (1 - f) * math.tan(math.radians(lat))
+    cosU1 = 1 / math.sqrt(1 + tanU1**2)
+    sinU1 = tanU1 * cosU1
+
+    sigma1 = math.atan2(tanU1, cosAlpha1)
+    sinAlpha = cosU1 * sinAlpha1
+    cosSqAlpha = 1 - sinAlpha**2
+    uSq = cosSqAlpha * (a**2 - b**2) / b**2
+    A = 1 + uSq / 16384 * (4096 + uSq * (-768 + uSq * (320 - 175 * uSq)))
+    B = uSq / 1024 * (256 + uSq * (-128 + uSq * (74 - 47 * uSq)))
+
+    sigma = dist / (b * A)
+    for _ in range(MAX_ITERATIONS):
+        cos2SigmaM = math.cos(2 * sigma1 + sigma)
+        sinSigma = math.sin(sigma)
+        cosSigma = math.cos(sigma)
+        deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (
+            cosSigma * (-1 + 2 * cos2SigmaM**2) -
+            B / 6 * cos2SigmaM * (-3 + 4 * sinSigma**2) * (-3 + 4 * cos2SigmaM**2)))
+        prev = sigma
+        sigma = dist / (b * A) + deltaSigma
+        if abs(sigma - prev) < TOLERANCE:
+            break
+
+    cos2SigmaM = math.cos(2 * sigma1 + sigma)
+    sinSigma = math.sin(sigma)
+    cosSigma = math.cos(sigma)
+
+    x = sinU1 * sinSigma - cosU1 * cosSigma * cosAlpha1
+    lat2 = math.atan2(
+        sinU1 * cosSigma + cosU1 * sinSigma * cosAlpha1,
+        (1 - f) * math.sqrt(sinAlpha**2 + x**2)
+    )
+    lam = math.atan2(sinSigma * sinAlpha1, cosU1 * cosSigma - sinU1 * sinSigma * cosAlpha1)
+    C = f / 16 * cosSqAlpha * (4 + f * (4 - 3 * cosSqAlpha))
+    L = lam - (1 - C) * f * sinAlpha * (sigma + C * sinSigma * (
+        cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM**2)))
+
+    lon2 = (lon + math.degrees(L) + 540) % 360 - 180
+
+    return math.degrees(lat2), lon2
+
+def destinations(lat, lon, dist, bearing):
+    '''
+    Vectorized version of destination(). Solves the direct geodesic problem
+    for many (start point, distance, bearing) triples in one pass. Arguments
+    are broadcast against each other so a single reference can be paired
+    with arrays of distances and bearings.
+
+    Args:
+        lat (array_like): latitudes of the start points in degrees
+        lon (array_like): longitudes of the start points in degrees
+        dist (array_like): distances in meters
+        bearing (array_like): initial bearings in degrees clockwise from north
+
+    Returns:
+        lat2 (ndarray): latitudes of the destinations in degrees
+        lon2 (ndarray): longitudes of the destinations in degrees
+    '''
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+
+    lat, lon, dist, bearing = np.broadcast_arrays(
+        np.asarray(lat, dtype=np.float64),
+        np.asarray(lon, dtype=np.float64),
+        np.asarray(dist, dtype=np.float64),
+        np.asarray(bearing, dtype=np.float64)
+    )
+
+    alpha1 = np.radians(bearing)
+    sinAlpha1 = np.sin(alpha1)
+    cosAlpha1 = np.cos(alpha1)
+
+    tanU1 = (1 - f) * np.tan(np.radians(lat))
+    cosU1 = 1 / np.sqrt(1 + tanU1**2)
+    sinU1 = tanU1 * cosU1
+
+    sigma1 = np.arctan2(tanU1, cosAlpha1)
+    sinAlpha = cosU1 * sinAlpha1
+    cosSqAlpha = 1 - sinAlpha**2
+    uSq = cosSqAlpha * (a**2 - b**2) / b**2
+    A = 1 + uSq / 16384 * (4096 + uSq * (-768 + uSq * (320 - 175 * uSq)))
+    B = uSq / 1024 * (256 + uSq * (-128 + uSq * (74 - 47 * uSq)))
+
+    sigma0 = dist / (b * A)
+    sigma = sigma0
+    for _ in range(MAX_ITERATIONS):
+        cos2SigmaM = np.cos(2 * sigma1 + sigma)
+        sinSigma = np.sin(sigma)
+        cosSigma = np.cos(sigma)
+        deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (
+            cosSigma * (-1 + 2 * cos2SigmaM**2) -
+            B / 6 * cos2SigmaM * (-3 + 4 * sinSigma**2) * (-3 + 4 * cos2SigmaM**2)))
+        prev = sigma
+        sigma = sigma0 + deltaSigma
+        if sigma.size == 0 or np.max(np.abs(sigma - prev)) < TOLERANCE:
+            break
+
+    cos2SigmaM = np.cos(2 * sigma1 + sigma)
+    sinSigma = np.sin(sigma)
+    cosSigma = np.cos(sigma)
+
+    x = sinU1 * sinSigma - cosU1 * cosSigma * cosAlpha1
+    lat2 = np.arctan2(
+        sinU1 * cosSigma + cosU1 * sinSigma * cosAlpha1,
+        (1 - f) * np.sqrt(sinAlpha**2 + x**2)
+    )
+    lam = np.arctan2(sinSigma * sinAlpha1, cosU1 * cosSigma - sinU1 * sinSigma * cosAlpha1)
+    C = f / 16 * cosSqAlpha * (4 + f * (4 - 3 * cosSqAlpha))
+    L = lam - (1 - C) * f * sinAlpha * (sigma + C * sinSigma * (
+        cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM**2)))
+
+    lon2 = (lon + np.degrees(L) + 540) % 360 - 180
+
+    return np.degrees(lat2), lon2
+
+class TangentPlane():
+    '''
+    Local tangent-plane approximation of the ellipsoid around a fixed
+    reference point. The radii of curvature are computed once so mapping
+    an east/north offset to latitude and longitude costs two multiplies.
+    Used for live previews while tracing, exact positions should still be
+    solved with destination().
+    '''
+    def __init__(self, lat, lon, unit=1.0):
+        '''
+        Args:
+            lat (float): latitude of the reference point in degrees
+            lon (float): longitude of the reference point in degrees
+            unit (float): meters per unit of the offsets passed to locate()
+        '''
+        self.lat = lat
+        self.lon = lon
+        self.unit = unit
+
+        e2 = WGS84_F * (2 - WGS84_F)
+        phi = math.radians(lat)
+        w = math.sqrt(1 - e2 * math.sin(phi)**2)
+
+        #meridional and prime vertical radius of curvature
+        self.M = WGS84_A * (1 - e2) / w**3
+        self.N = WGS84_A / w
+
+        self.latPerUnit = math.degrees(unit / self.M)
+        self.lonPerUnit = math.degrees(unit / (self.N * max(math.cos(phi), 1e-12)))
+
+    def locate(self, east, north):
+        '''
+        Return the latitude and longitude of an offset from the reference
+
+        Args:
+            east (float or ndarray): offset towards east in units
+            north (float or ndarray): offset towards north in units
+        '''
+        return self.lat + north * self.latPerUnit, self.lon + east * self.lonPerUnit
+
+    def offset(self, lat, lon):
+        '''
+        Inverse of locate(), return the east and north offset in units of
+        a point from the reference
+
+        Args:
+            lat (float or ndarray): latitude in degrees
+            lon (float or ndarray): longitude in degrees
+        '''
+        dLon = (np.subtract(lon, self.lon) + 540) % 360 - 180
+        return dLon / self.lonPerUnit, np.subtract(lat, self.lat) / self.latPerUnit
+
+    def destination(self, dist, bearing):
+        '''
+        Tangent-plane counterpart of destination() with distance in units
+        '''
+        b = np.radians(bearing)
+        return self.locate(dist * np.sin(b), dist * np.cos(b))
+
+    def error(self, lat, lon, lat2, lon2):
+        '''
+        Approximate distance in meters between two nearby points using the
+        local radii of curvature
+        '''
+        dNorth = np.radians(np.subtract(lat2, lat)) * self.M
+        dEast = np.radians((np.subtract(lon2, lon) + 540) % 360 - 180) * self.N * math.cos(math.radians(self.lat))
+        return np.hypot(dNorth, dEast)
+
+    def maxError(self, dist, samples=36):
+        '''
+        Worst case difference in meters between the tangent-plane location
+        and the exact geodesic solution for a trace of the given length,
+        sampled over bearings evenly spaced around the reference.
+
+        Args:
+            dist (float): trace length in units
+            samples (int): number of bearings to check
+        '''
+        bearing = np.linspace(0, 360, samples, endpoint=False)
+        lat, lon = self.destination(dist, bearing)
+        lat2, lon2 = destinations(self.lat, self.lon, dist * self.unit, bearing)
+        return float(np.max(self.error(lat, lon, lat2, lon2)))
@@ -0,0 +1,202 @@
+import numpy as np
+
+import Geodesic
+
+#Fewest control points needed to fit each kind of transform
+MIN_POINTS = {
+    'affine': 3,
+    'homography': 4
+}
+
+#Largest condition number of the normalized control points before they are
+#treated as collinear (or all in the same place) and rejected
+MAX_CONDITION = 1e6
+
+class GeoTransform():
+    '''
+    Projective mapping from map pixels (x right, y up, same frame as the
+    Tracker's net dx, dy) to latitude and longitude, fitted from control
+    points. An affine transform corrects scale, rotation and skew of the
+    map, a homography also corrects perspective (photographed maps).
+    Mapping a point is a single 3x3 matrix multiply and arrays of points are
+    mapped in one vectorized pass.
+    '''
+    def __init__(self, matrix, kind='affine', lonOrigin=0.0):
+        '''
+        Args:
+            matrix (array_like): 3x3 matrix mapping (x, y, 1) to (lat, lon - lonOrigin, w)
+            kind (str): 'affine' or 'homography'
+            lonOrigin (float): longitude the fit is relative to so maps
+                crossing the antimeridian don't wrap
+        '''
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.kind = kind
+        self.lonOrigin = lonOrigin
+        self.inverseMatrix = np.linalg.inv(self.matrix)
+
+        #plain floats for scalar apply() without numpy overhead
+        self.rows = tuple(tuple(row) for row in self.matrix.tolist())
+
+    @classmethod
+    def fit(cls, pixels, coords, kind=None):
+        '''
+        Least-squares fit of a transform from control points
+
+        Args:
+            pixels (array_like): (n, 2) x, y pixel position of each control point
+            coords (array_like): (n, 2) latitude and longitude of each control point
+            kind (str): 'affine' (default) or 'homography', a homography is
+                only fitted when asked for since a few hand traced points
+                give it no redundancy and it can add wild perspective
+
+        Returns:
+            GeoTransform
+
+        Raises:
+            ValueError: too few control points, unknown kind or the
+                control points are collinear
+        '''
+        pixels = np.atleast_2d(np.asarray(pixels, dtype=np.float64))
+        coords = np.atleast_2d(np.asarray(coords, dtype=np.float64))
+        n = len(pixels)
+
+        if kind is None:
+            kind = 'affine'
+        if kind not in MIN_POINTS:
+            raise ValueError(f'Unsupported transform: {kind}')
+        if n < MIN_POINTS[kind] or len(coords) != n:
+            raise ValueError(f'{kind} needs at least {MIN_POINTS[kind]} control points')
+
+        lonOrigin = float(coords[0, 1])
+        target = np.column_stack((
+            coords[:, 0],
+            (coords[:, 1] - lonOrigin + 540) % 360 - 180
+        ))
+
+        #normalize both point sets so the solve is well conditioned
+        pNorm = normalization(pixels)
+        tNorm = normalization(target)
+        p = pixels @ pNorm[:2, :2].T + pNorm[:2, 2]
+        t = target @ tNorm[:2, :2].T + tNorm[:2, 2]
+
+        #lstsq and svd quietly return a rank deficient fit for collinear points
+        for points in (p, t):
+            if np.linalg.cond(np.column_stack((points, np.ones(n)))) > MAX_CONDITION:
+                raise ValueError('Control points are collinear')
+
+        if kind == 'affine':
+            A = np.column_stack((p, np.ones(n)))
+            solution = np.linalg.lstsq(A, t, rcond=None)[0]
+            H = np.vstack((solution.T, [0, 0, 1]))
+        else:
+            #direct linear transform, the null vector of the stacked constraints
+            zeros = np.zeros((n, 3))
+            ph = np.column_stack((p, np.ones(n)))
+            A = np.vstack((
+                np.hstack((ph, zeros, -t[:, [0]] * ph)),
+                np.hstack((zeros, ph, -t[:, [1]] * ph))
+            ))
+            H = np.linalg.svd(A)[2][-1].reshape(3, 3)
+
+        matrix = np.linalg.inv(tNorm) @ H @ pNorm
+        matrix /= matrix[2, 2]
+
+        return cls(matrix, kind, lonOrigin)
+
+    def apply(self, x, y):
+        '''
+        Map a single pixel position to latitude and longitude
+
+        Args:
+            x (float): pixels right of the origin
+            y (float): pixels up from the origin
+
+        Returns:
+            lat (float): latitude in degrees
+            lon (float): longitude in degrees
+        '''
+        (a, b, c), (d, e, f), (g, h, i) = self.rows
+        w = g * x + h * y + i
+        lat = (a * x + b * y + c) / w
+        lon = (d * x + e * y + f) / w
+
+        return lat, (self.lonOrigin + lon + 540) % 360 - 180
+
+    def applyMany(self, pixels):
+        '''
+        Map an array of pixel positions to latitude and longitude
+
+        Args:
+            pixels (array_like): (n, 2) x, y pixel positions
+
+        Returns:
+            coords (ndarray): (n, 2) latitude and longitude
+        '''
+        pixels = np.atleast_2d(np.asarray(pixels, dtype=np.float64))
+        out = pixels @ self.matrix[:, :2].T + self.matrix[:, 2]
+        coords = out[:, :2] / out[:, [2]]
+        coords[:, 1] = (self.lonOrigin + coords[:, 1] + 540) % 360 - 180
+
+        return coords
+
+    def inverse(self, lat, lon):
+        '''
+        Pixel position of a latitude and longitude
+
+        Returns:
+            x (float): pixels right of the origin
+            y (float): pixels up from the origin
+        '''
+        lon = (lon - self.lonOrigin + 540) % 360 - 180
+        x, y, w = self.inverseMatrix @ (lat, lon, 1.0)
+
+        return float(x / w), float(y / w)
+
+    def residuals(self, pixels, coords):
+        '''
+        Distance in meters between each control point and where the
+        transform maps its pixel position
+        '''
+        coords = np.atleast_2d(np.asarray(coords, dtype=np.float64))
+        fitted = self.applyMany(pixels)
+        plane = Geodesic.TangentPlane(coords[:, 0].mean(), coords[0, 1])
+
+        return plane.error(coords[:, 0], coords[:, 1], fitted[:, 0], fitted[:, 1])
+
+def normalization(points):
+    '''
+    Similarity transform moving points to their centroid with an average
+    distance of sqrt(2) from it (Hartley normalization)
+    '''
+    center = points.mean(axis=0)
+    spread = np.hypot(*(points - center).T).mean()
+    s = np.sqrt(2) / spread if spread > 0 else 1.0
+
+    return np.array([
+        [s, 0, -s * center[0]],
+        [0, s, -s * center[1]],
+        [0, 0, 1]
+    ])
+
+def fromControlPoints(controlPoints, kind=None):
+    '''
+    Fit a transform from control points stored in project data
+
+    Args:
+        controlPoints (list): dicts with X, Y, Latitude and Longitude
+        kind (str): 'affine' or 'homography', see GeoTransform.fit
+
+    Returns:
+        GeoTransform or None if there are too few control points or they
+        are collinear
+    '''
+    if len(controlPoints) < MIN_POINTS['affine']:
+        return None
+
+    pixels = [(point['X'], point['Y']) for point in controlPoints]
+    coords = [(point['Latitude'], point['Longitude']) for point in controlPoints]
+
+    try:
+        return GeoTransform.fit(pixels, coords, kind)
+    except (ValueError, np.linalg.LinAlgError):
+        return None
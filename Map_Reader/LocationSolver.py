@@ -0,0 +1,69 @@
+from collections import namedtuple
+import numpy as np
+
+import Geodesic
+
+#Result of a solve, residuals are range residuals in meters per observation
+Solution = namedtuple('Solution', 'lat lon residuals')
+
+#Weight of the cross-track (bearing) residuals relative to range residuals.
+#Kept small so the solution is driven by the traced distances, it only
+#picks the correct side when two range circles intersect twice and keeps
+#the system determined with fewer than three references
+BEARING_WEIGHT = 1e-3
+
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 50
+
+def solve(refs, dists, bearings, bearingWeight=BEARING_WEIGHT):
+    '''
+    Least-squares position from (reference, distance, bearing) observations
+    using Gauss-Newton in a local tangent plane centered on the references.
+    Every iteration is a single vectorized pass over all observations so the
+    cost grows linearly with the number of references.
+
+    Args:
+        refs (array_like): (n, 2) latitude and longitude of each reference
+        dists (array_like): traced distance from each reference in meters
+        bearings (array_like): traced bearing from each reference in degrees
+        bearingWeight (float): weight of cross-track residuals
+
+    Returns:
+        Solution: latitude, longitude and range residuals in meters
+    '''
+    refs = np.atleast_2d(np.asarray(refs, dtype=np.float64))
+    dists = np.asarray(dists, dtype=np.float64)
+    bearings = np.asarray(bearings, dtype=np.float64)
+
+    plane = Geodesic.TangentPlane(refs[:, 0].mean(), refs[:, 1].mean())
+
+    #reference and traced points in meters east, north of the center
+    r = np.column_stack(plane.offset(refs[:, 0], refs[:, 1]))
+    lat, lon = Geodesic.destinations(refs[:, 0], refs[:, 1], dists, bearings)
+    p = np.column_stack(plane.offset(lat, lon))
+
+    #planar distance and direction of each traced line
+    d = np.hypot(*(p - r).T)
+    u = np.divide(p - r, d[:, None], out=np.zeros_like(p), where=d[:, None] > 0)
+
+    #start from the average of the traced points
+    x = p.mean(axis=0)
+    w = bearingWeight
+
+    for _ in range(MAX_ITERATIONS):
+        v = x - r
+        rho = np.hypot(*v.T)
+        grad = np.divide(v, rho[:, None], out=np.zeros_like(v), where=rho[:, None] > 0)
+
+        residuals = np.concatenate((rho - d, w * (u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0])))
+        J = np.vstack((grad, w * np.column_stack((-u[:, 1], u[:, 0]))))
+
+        step = np.linalg.lstsq(J, -residuals, rcond=None)[0]
+        x = x + step
+        if np.hypot(*step) < TOLERANCE:
+            break
+
+    rho = np.hypot(*(x - r).T)
+    lat, lon = plane.locate(x[0], x[1])
+
+    return Solution(float(lat), float(lon), rho - d)
@@ -1,12 +1,17 @@
+import os
 import sys
 from PyQt5.QtWidgets import QAction, QMainWindow, QMessageBox, QMenu
-from PyQt5.QtCore import QDateTime, QDate, Qt
+from PyQt5.QtCore import QDateTime, QDate, Qt, QTimer
 import pandas as pd
 from functools import partial
 
 import Tracker
+import MotionSource
+import Georeference
+from PointStore import PointStore
 from Windows import *
 from CustomQtObjects import Table
+from ChangeSet import ChangeSet
 
 class MainWindow(QMainWindow):
     def __init__(self, projectName, controller, reference=None, createdDate=None, openExisting=False, api=None):
@@ -18,13 +23,28 @@ class MainWindow(QMainWindow):
         self.scale = None
         self.reference = reference
         self.units = None
-        self.points = []
+        self.scaleSource = MotionSource.CURSOR
+        self.points = PointStore()
+        self.controlPoints = []
+        self.transform = None
         self.savedPoints = []
+        self.changes = ChangeSet()
         self.createdDate = createdDate
 
-        #Open existing json file containing all data
+        #Steps reading the points of an existing project, the points read
+        #so far are added to the table and map between steps
+        self.loading = None
+        self.loadedRows = 0
+        self.loadTimer = QTimer(self)
+        self.loadTimer.timeout.connect(self.loadPoints)
+
+        #Results of writes made off the GUI thread
+        self.controller.worker.saved.connect(self.saved)
+        self.controller.worker.failed.connect(self.saveFailed)
+
+        #Start reading the existing project, the points are read after the window is shown
         if openExisting:
-            self.openExistingProject(self.projectName)
+            loaded = self.openExistingProject(self.projectName)
 
         #----------------------Menu Bar-----------------------#
         menubar = self.menuBar()
@@ -101,12 +121,23 @@ class MainWindow(QMainWindow):
         self.menuAPISettings.triggered.connect(self.launchAPISettings)
         self.settingsMenu.addAction(self.menuAPISettings)
 
+        self.menuControlPoint = QAction("Add Control Point", self)
+        self.menuControlPoint.setShortcut("Ctrl+G")
+        self.menuControlPoint.setStatusTip('Trace a map feature with known coordinates')
+        self.menuControlPoint.triggered.connect(self.controlPointTracker)
+        self.settingsMenu.addAction(self.menuControlPoint)
+
+        self.menuClearControlPoints = QAction("Clear Control Points", self)
+        self.menuClearControlPoints.setStatusTip('Clear Control Points')
+        self.menuClearControlPoints.triggered.connect(self.clearControlPoints)
+        self.settingsMenu.addAction(self.menuClearControlPoints)
+
         self.viewMenu = menubar.addMenu('View')
 
         self.menuRefresh = QAction("Refresh", self)
         self.menuRefresh.setShortcut("Ctrl+R")
         self.menuRefresh.setStatusTip('Refresh')
-        self.menuRefresh.triggered.connect(self.refresh)
+        self.menuRefresh.triggered.connect(self.reload)
         self.viewMenu.addAction(self.menuRefresh)
 
         self.menuTheme = QMenu('Theme', self)
@@ -138,12 +169,16 @@ class MainWindow(QMainWindow):
             'Points', 
             self.points, 
             columns=['Latitude', 'Longitude', 'Date', 'Description'],
-            index=True)
+            index=True,
+            sortKeys={'Date': 'Timestamp'},
+            filterable=True)
         self.table.setFixedSize(800, 600)
+        self.table.filterEdit.textChanged.connect(self.highlightMatches)
 
         self.refDisplayTable = Table(
             'Reference Points',
-            [{'Latitude': lat, 'Longitude': lon} for lat, lon in self.reference],
+            self.reference,
+            columns=['Latitude', 'Longitude'],
             index=True
         )
         self.refDisplayTable.setMinimumHeight(250)
@@ -187,6 +222,12 @@ class MainWindow(QMainWindow):
 
         self.setWindowTitle(f'Map Reader - {self.projectName}')
         self.show()
+
+        if self.loading:
+            self.setLoading(True)
+            self.loadTimer.start()
+        elif openExisting:
+            self.projectLoaded(loaded)
     
     def setProjectName(self, name):
         
@@ -209,7 +250,7 @@ class MainWindow(QMainWindow):
         if self.refWindow.exec_():
             point = self.refWindow.getConfirmedData()
             self.reference.append(point)
-            self.saveFile()
+            self.recordChange('add', 'Reference', point)
             self.refresh()
 
     def manualAddWindow(self):
@@ -220,7 +261,7 @@ class MainWindow(QMainWindow):
         if self.manualAddWindow.exec_():
             point = self.manualAddWindow.getConfirmedData()
             self.points.append(point)
-            self.saveFile()
+            self.recordChange('add', 'Points', point)
             self.refresh()
 
     def scaleTracker(self):
@@ -236,7 +277,14 @@ class MainWindow(QMainWindow):
         self.scaleConfirm = ScaleWindow(dist_px, self)
         if self.scaleConfirm.exec_():
             self.scale, self.units = self.scaleConfirm.getConfirmedData()
-            self.saveFile()
+            self.scaleSource = MotionSource.sourceName(self.scaleTrace.motionSource)
+            self.recordChange('set', 'Scale', self.scale)
+            self.recordChange('set', 'Units', self.units)
+            self.recordChange('set', 'ScaleSource', self.scaleSource)
+            self.controller.saveTraces(
+                self.projectName,
+                [trace._replace(scale=self.scale, units=self.units) for trace in self.scaleTrace.traces]
+            )
             self.scaleTrace.close()
         else:
             self.scaleTrace.resetTrace()
@@ -246,14 +294,34 @@ class MainWindow(QMainWindow):
         Launches window to locate new point from reference point
         '''
         if self.reference and self.scale and self.units:
+            #scales are in the units of the backend they were traced with,
+            #evdev counts and cursor pixels don't match
+            source = MotionSource.defaultSource()
+            name = MotionSource.sourceName(source)
+            if name != self.scaleSource:
+                if source:
+                    source.close()
+                QMessageBox.warning(
+                    self,
+                    'Scale Error',
+                    f'The scale was traced with the {self.scaleSource} pointer backend but {name} is in use, '
+                    'set the scale again before tracing'
+                )
+                return
+
             self.referenceTable = ReferenceSelectionWindow(self.reference)
             if self.referenceTable.exec_():
                 self.locationTrace = Tracker.TrackerLoc( 
                     self.referenceTable.selectedData, 
                     self.scale, 
                     self.units,
-                    parent=self
+                    parent=self,
+                    motionSource=source,
+                    singleTrace=self.referenceTable.singleTrace,
+                    transform=self.transform
                 )
+            elif source:
+                source.close()
 
     def confirmLocation(self, lat, lon):
         '''
@@ -264,13 +332,80 @@ class MainWindow(QMainWindow):
         if self.locationConfirm.exec_():
             self.locationTrace.close()
             data = self.locationConfirm.getConfirmedData()
+
+            #link the traces to the point so they're removed with it
+            traces = self.locationTrace.traces
+            if traces:
+                data['TraceId'] = traces[0].id
+                traces = [trace._replace(point=traces[0].id) for trace in traces]
+
             self.points.append(data)
             self.menuExport.setEnabled(True)
-            self.saveFile()
+            self.recordChange('add', 'Points', data)
+            self.controller.saveTraces(self.projectName, traces)
             self.refresh()
         else:
             self.locationTrace.resetTrace()
 
+    def controlPointTracker(self):
+        '''
+        Launches window to trace a control point. Control points are traced
+        from the first one (the first reference point when there are none)
+        so they share the same pixel origin.
+        '''
+        if self.controlPoints:
+            anchor = (self.controlPoints[0]['Latitude'], self.controlPoints[0]['Longitude'])
+        elif self.reference:
+            anchor = self.reference[0]
+        else:
+            return
+
+        self.controlTrace = Tracker.TrackerControl(anchor, self)
+
+    def confirmControlPoint(self, dx, dy):
+        '''
+        Launches window to enter the coordinates of a traced control point
+        and refits the georeferencing transform
+        '''
+        self.controlWindow = ReferenceWindow(self)
+        self.controlWindow.setWindowTitle('Add Control Point')
+
+        if self.controlWindow.exec_():
+            lat, lon = self.controlWindow.getConfirmedData()
+
+            if not self.controlPoints:
+                anchor = self.controlTrace.ref
+                self.controlPoints.append({'X': 0, 'Y': 0, 'Latitude': anchor[0], 'Longitude': anchor[1]})
+            self.controlPoints.append({'X': dx, 'Y': dy, 'Latitude': lat, 'Longitude': lon})
+
+            self.transform = Georeference.fromControlPoints(self.controlPoints)
+            self.recordChange('set', 'ControlPoints', self.controlPoints)
+            self.controlTrace.close()
+
+            needed = Georeference.MIN_POINTS['affine'] - len(self.controlPoints)
+            if self.transform:
+                QMessageBox.information(
+                    self,
+                    'Control Points',
+                    f'Map georeferenced from {len(self.controlPoints)} control points ({self.transform.kind})'
+                )
+            elif needed > 0:
+                QMessageBox.information(
+                    self,
+                    'Control Points',
+                    f'{needed} more control point(s) needed to georeference the map'
+                )
+        else:
+            self.controlTrace.resetTrace()
+
+    def clearControlPoints(self):
+        '''
+        Remove all control points and go back to scale and bearing tracing
+        '''
+        self.controlPoints = []
+        self.transform = None
+        self.recordChange('set', 'ControlPoints', [])
+
     def launchAPISettings(self):
         '''
         Launch API key window to update API key from settings menu
@@ -307,7 +442,9 @@ class MainWindow(QMainWindow):
             'Reference': self.reference,
             'Scale': self.scale,
             'Units': self.units,
+            'ScaleSource': self.scaleSource,
             'Points': self.points,
+            'ControlPoints': self.controlPoints,
         }
         if self.controller.saveProject(self.projectName, savestate):
             pass
@@ -318,24 +455,132 @@ class MainWindow(QMainWindow):
                 f'Project failed to be saved'
             )
 
+    def recordChange(self, op, key, value=None, index=None):
+        '''
+        Save a single change to the project store instead of rewriting
+        the whole project, see ProjectJournal and SQLiteStore. The change
+        is also added to self.changes for the next refresh().
+        '''
+        #points and reference points are only ever added at the end
+        row = len(self.points if key == 'Points' else self.reference) - 1 if op == 'add' else index
+        self.changes.record(op, key, row)
+
+        if not self.controller.recordChange(op, key, value, index):
+            QMessageBox.critical(
+                self,
+                'Save Error',
+                f'Project failed to be saved'
+            )
+
     def openExistingProject(self, projectName):
         '''
-        Populates table with existing project data from given project
+        Start reading an existing project. The data written before the
+        points is read now so the window can be built, the rest is read a
+        chunk of points at a time by loadPoints() once the window is shown.
+
+        Returns:
+            the project data if it was read completely, see projectLoaded()
         '''
-        data = self.controller.getProjectData(projectName)
+        self.loading = self.controller.openStoreSteps(projectName)
 
-        if data:
-            self.projectName = data.get('ProjectName')
-            self.createdDate = data.get('Created')
-            self.reference = data.get('Reference')
-            self.scale = data.get('Scale')
-            self.units = data.get('Units')
-            self.points = data.get('Points')
+        try:
+            #projects written before dumpProject() can have their points first
+            data = next(self.loading)
+            while data.get('Reference') is None:
+                data = next(self.loading)
+        except StopIteration as stop:
+            self.loading = None
+            return stop.value
+
+        self.setProjectData(data)
+        self.loadedRows = len(self.points)
+
+    def setProjectData(self, data):
+        '''
+        Set the project data, keys that weren't read yet keep their value
+        '''
+        self.projectName = data.get('ProjectName', self.projectName)
+        self.createdDate = data.get('Created', self.createdDate)
+        reference = data.get('Reference')
+        self.reference = reference if reference is not None else []
+        self.scale = data.get('Scale', self.scale)
+        self.units = data.get('Units', self.units)
+        self.scaleSource = data.get('ScaleSource', self.scaleSource)
+        points = data.get('Points')
+        self.points = points if isinstance(points, PointStore) else PointStore(points or [])
+        self.controlPoints = data.get('ControlPoints') or []
+        self.transform = Georeference.fromControlPoints(self.controlPoints)
+
+    def loadPoints(self):
+        '''
+        Read the next chunk of points of the project being opened and add
+        them to the table and map
+        '''
+        try:
+            data = next(self.loading)
+        except StopIteration as stop:
+            self.loadTimer.stop()
+            self.loading = None
+            #None when the project was closed before it was read
+            if stop.value is not None:
+                self.projectLoaded(stop.value)
         else:
+            self.showLoaded(data['Points'])
+
+    def showLoaded(self, points):
+        '''
+        Add the points read since the last chunk to the table and map
+        '''
+        if points is not self.points:
+            #read again from a backup, the project file was damaged part way
+            self.points = points
+            self.reload()
+        elif len(points) > self.loadedRows:
+            count = len(points) - self.loadedRows
+            self.table.rowsAdded(self.loadedRows, count)
+            self.mapWindow.pointsLoaded(self.loadedRows, count)
+        self.loadedRows = len(points)
+
+    def projectLoaded(self, data):
+        '''
+        Finish opening the project once all of it has been read
+        '''
+        self.setLoading(False)
+
+        if not data:
             QMessageBox.critical(
                 self,
                 'File Not Found',
-                f'{projectName} is not supported')
+                f'{self.projectName} is not supported')
+            return
+
+        #openStoreSteps() upgraded the data to the current ProjectSchema and
+        #journal entries it applied may have changed any of it
+        changed = self.controller.replayed or data['Points'] is not self.points or data['Reference'] is not self.reference
+        self.setProjectData(data)
+        if changed:
+            self.reload()
+            self.loadedRows = len(self.points)
+        else:
+            self.showLoaded(self.points)
+        self.recordChange('set', 'LastAccessed', QDateTime().currentDateTime().toString('MM-dd-yyyy hh:mm:ss ap'))
+
+        if self.controller.recovered:
+            QMessageBox.warning(
+                self,
+                'Project Recovered',
+                f'{self.projectName} was damaged and has been restored from {os.path.basename(self.controller.recovered)}, '
+                'the most recent changes may be missing'
+            )
+
+    def setLoading(self, loading):
+        '''
+        Disable changing the project while its points are being read
+        '''
+        for widget in (self.addRefButton, self.setScaleButton, self.traceButton, self.manPointButton):
+            widget.setEnabled(not loading)
+        for action in (self.menuSave, self.menuExport, self.settingsMenu):
+            action.setEnabled(not loading)
 
     def closeApplication(self):
         '''
@@ -349,24 +594,43 @@ class MainWindow(QMainWindow):
         )
 
         if choice == QMessageBox.Yes:
+            self.controller.flush()
             sys.exit()
 
     def export(self, file_type):
         '''
-        Export table data to csv file
+        Export table data to csv file, the result is shown when the
+        persistence worker has written it
         '''
-        if self.controller.exportProjectData(self.projectName, self.points, file_type):
+        self.controller.exportProjectData(self.projectName, self.points.toFrame(), file_type)
+
+    def saved(self, key):
+        '''
+        Slot for the persistence worker's saved signal
+        '''
+        if key.startswith('export:'):
             QMessageBox.information(
                 self,
                 'Export File',
-                f'{file_type} file was successfully created'
+                f'{key[7:]} file was successfully created'
             )
-        else:
+
+    def saveFailed(self, key, message):
+        '''
+        Slot for the persistence worker's failed signal
+        '''
+        if key.startswith('export:'):
             QMessageBox.critical(
                 self,
                 'Export File',
-                f'{file_type} file failed to be created'
-            )	
+                f'{key[7:]} file failed to be created'
+            )
+        else:
+            QMessageBox.critical(
+                self,
+                'Save Error',
+                f'{key} failed to be saved: {message}'
+            )
 
     def deleteRowFromTable(self):
         '''
@@ -384,8 +648,11 @@ class MainWindow(QMainWindow):
             )
 
             if choice == QMessageBox.Yes:
+                traceId = self.points.cell(table_row, 'TraceId')
                 del self.points[table_row]
-                self.saveFile()
+                self.recordChange('delete', 'Points', index=table_row)
+                if traceId is not None:
+                    self.controller.deleteTraces(self.projectName, [traceId])
                 self.refresh()
         
         elif ref_row is not False:
@@ -405,12 +672,32 @@ class MainWindow(QMainWindow):
 
                 if choice == QMessageBox.Yes:
                     del self.reference[ref_row]
-                    self.saveFile()
+                    self.recordChange('delete', 'Reference', index=ref_row)
                     self.refresh()
 
     def refresh(self):
+        '''
+        Push the changes recorded since the last refresh to the tables and
+        map, only the rows that changed are updated
+        '''
+        changes = self.changes.take()
+        self.table.applyChanges(changes.get('Points', ()), self.points)
+        self.refDisplayTable.applyChanges(changes.get('Reference', ()), self.reference)
+        self.mapWindow.applyChanges(changes)
+
+    def highlightMatches(self):
+        '''
+        Highlight the points matching the table's search on the map
+        '''
+        self.mapWindow.highlight(self.table.filterEdit.text())
+
+    def reload(self):
+        '''
+        Rebuild the tables and map from the project data
+        '''
+        self.changes.take()
         self.table.update(self.points)
-        self.refDisplayTable.update([{'Latitude': lat, 'Longitude': lon} for lat, lon in self.reference])
+        self.refDisplayTable.update(self.reference)
         self.mapWindow.update(self.api, self.reference, self.points)
 
     def keyPressEvent(self, event):
@@ -420,5 +707,5 @@ class MainWindow(QMainWindow):
         '''
         key = event.key()
 
-        if key == Qt.Key_Delete:
+        if key == Qt.Key_Delete and not self.loading:
             self.deleteRowFromTable()
\ No newline at end of file
@@ -0,0 +1,171 @@
+import os
+import sys
+import glob
+import struct
+from abc import ABC, abstractmethod
+from collections import deque
+
+#https://www.kernel.org/doc/html/latest/input/input.html#event-interface
+EVENT_FORMAT = 'llHHi'
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+EV_REL = 0x02
+REL_X = 0x00
+REL_Y = 0x01
+
+#Name of the backend measuring cursor position when there is no motion source,
+#scales are only valid for the backend they were traced with
+CURSOR = 'cursor'
+
+class MotionSource(ABC):
+    '''
+    Base class for sources of relative mouse motion. Deltas follow screen
+    convention (x right, y down) and are accumulated by the source until
+    read() is called so no motion is lost between reads. Sources report
+    device units, name identifies the backend a scale was traced with.
+    '''
+    name = None
+
+    def start(self):
+        '''
+        Discard any motion that happened before tracking started
+        '''
+        self.read()
+
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def read(self):
+        '''
+        Return the (dx, dy) travelled since the last read
+        '''
+
+    def close(self):
+        self.stop()
+
+class SyntheticMotionSource(MotionSource):
+    '''
+    Motion source fed from code, used for tests and replaying traces
+    '''
+    name = 'synthetic'
+
+    def __init__(self, deltas=()):
+        self.queue = deque(deltas)
+
+    def push(self, dx, dy):
+        self.queue.append((dx, dy))
+
+    def extend(self, deltas):
+        self.queue.extend(deltas)
+
+    def start(self):
+        pass
+
+    def read(self):
+        dx = dy = 0
+        while self.queue:
+            x, y = self.queue.popleft()
+            dx += x
+            dy += y
+
+        return dx, dy
+
+class EvdevMotionSource(MotionSource):
+    '''
+    Reads relative pointer motion straight from Linux evdev devices
+    (/dev/input/event*). Motion is reported even when the cursor is pinned
+    against a screen edge, so the cursor never has to be warped back to
+    the center. Requires read access to the devices (usually membership
+    of the input group).
+    '''
+    name = 'evdev'
+
+    def __init__(self, paths=None):
+        '''
+        Args:
+            paths (list): device paths to read, defaults to every device
+                reporting REL_X and REL_Y
+        '''
+        self.paths = paths if paths is not None else self.findDevices()
+        self.fds = []
+        self.buffers = {}
+
+        for path in self.paths:
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError:
+                continue
+            self.fds.append(fd)
+            self.buffers[fd] = b''
+
+        if not self.fds:
+            raise OSError('No readable relative pointer devices')
+
+    @staticmethod
+    def findDevices():
+        '''
+        Return paths of input devices that report relative x and y motion
+        '''
+        devices = []
+        for cap in sorted(glob.glob('/sys/class/input/event*/device/capabilities/rel')):
+            try:
+                with open(cap, 'rt') as f:
+                    bits = int(f.read().split()[-1], 16)
+            except (OSError, ValueError, IndexError):
+                continue
+
+            if bits & (1 << REL_X) and bits & (1 << REL_Y):
+                name = cap.split('/')[4]
+                devices.append(os.path.join('/dev/input', name))
+
+        return devices
+
+    def read(self):
+        dx = dy = 0
+
+        for fd in self.fds:
+            data = self.buffers[fd]
+            while True:
+                try:
+                    chunk = os.read(fd, EVENT_SIZE * 64)
+                except BlockingIOError:
+                    break
+                if not chunk:
+                    break
+                data += chunk
+
+            #keep partial events for the next read
+            end = len(data) - len(data) % EVENT_SIZE
+            for _, _, evType, code, value in struct.iter_unpack(EVENT_FORMAT, data[:end]):
+                if evType == EV_REL:
+                    if code == REL_X:
+                        dx += value
+                    elif code == REL_Y:
+                        dy += value
+            self.buffers[fd] = data[end:]
+
+        return dx, dy
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+def defaultSource():
+    '''
+    Return the best relative motion source for this platform or None if
+    the Tracker should fall back to measuring cursor position
+    '''
+    if sys.platform.startswith('linux'):
+        try:
+            return EvdevMotionSource()
+        except OSError:
+            return None
+
+    return None
+
+def sourceName(source):
+    '''
+    Name of the backend that measures motion for source, see CURSOR
+    '''
+    return source.name if source else CURSOR
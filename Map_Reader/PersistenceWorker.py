@@ -0,0 +1,105 @@
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+#Save requests for the same key within this window (ms) are written once
+SAVE_DELAY = 200
+
+class SaveJob(QRunnable):
+    '''
+    Runs a single write on the thread pool and reports back to the worker
+    '''
+    def __init__(self, worker, key, fn, args):
+        super(SaveJob, self).__init__()
+        self.worker = worker
+        self.key = key
+        self.fn = fn
+        self.args = args
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.worker.finish(self.key, f'{e.__class__.__name__}: {e}')
+        else:
+            #writers returning False failed without raising
+            self.worker.finish(self.key, 'Write failed' if result is False else None)
+
+class PersistenceWorker(QObject):
+    '''
+    Writes files on a QThreadPool instead of the GUI thread. Requests are
+    keyed (settings, a project, an export...) and requests for the same key
+    made within SAVE_DELAY ms are coalesced so only the latest is written.
+    Writes for one key never run concurrently. Results are reported with
+    the saved and failed signals which are delivered on the GUI thread.
+    '''
+    saved = pyqtSignal(str)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, delay=SAVE_DELAY, parent=None):
+        super(PersistenceWorker, self).__init__(parent)
+        self.pool = QThreadPool(self)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.running = set()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.dispatch)
+
+    def submit(self, key, fn, *args):
+        '''
+        Queue a write, replacing any queued write with the same key
+
+        Args:
+            key (str): what is being written
+            fn (callable): function doing the write, returns False or
+                raises on failure
+            args: arguments passed to fn, should be copies of any data
+                the GUI thread may keep changing
+        '''
+        with self.lock:
+            self.pending[key] = (fn, args)
+        self.timer.start()
+
+    def dispatch(self):
+        '''
+        Start queued writes whose key isn't already being written
+        '''
+        with self.lock:
+            ready = [key for key in self.pending if key not in self.running]
+            jobs = [(key, self.pending.pop(key)) for key in ready]
+            self.running.update(ready)
+
+        for key, (fn, args) in jobs:
+            self.pool.start(SaveJob(self, key, fn, args))
+
+    def finish(self, key, error):
+        '''
+        Called from the pool thread when a write finishes
+        '''
+        with self.lock:
+            self.running.discard(key)
+            again = key in self.pending
+
+        if error:
+            self.failed.emit(key, error)
+        else:
+            self.saved.emit(key)
+
+        #a newer request came in while this one was writing
+        if again:
+            self.dispatch()
+
+    def flush(self):
+        '''
+        Write everything queued and wait until all writes have finished
+        '''
+        self.timer.stop()
+        while True:
+            self.dispatch()
+            self.pool.waitForDone()
+            with self.lock:
+                if not self.pending and not self.running:
+                    break
@@ -0,0 +1,529 @@
+import bisect
+import weakref
+import numpy as np
+import pandas as pd
+
+import Dates
+from Dates import NO_DATE
+from SearchIndex import SearchIndex
+
+#Keys of a point dict in the current ProjectSchema, each has a column
+COLUMNS = ('Latitude', 'Longitude', 'Timestamp', 'UTCOffset', 'Description')
+
+#Id of the first trace recorded for a located point, the traces it was
+#located with are stored with it (see TraceRecorder). Only points located
+#since traces were linked have one, so the key is left out when it's unset.
+TRACE_KEY = 'TraceId'
+NO_TRACE = -1
+
+def extraKeys(point):
+    '''
+    Keys of a point dict that have no column, None if there aren't any
+    '''
+    if len(point) > len(COLUMNS) + (TRACE_KEY in point):
+        return {key: value for key, value in point.items() if key not in COLUMNS and key != TRACE_KEY}
+
+    return None
+
+class PointStore():
+    '''
+    Columnar storage of a project's points. Latitude and longitude are
+    float64 columns, dates are int64 epoch seconds with an int32 UTC offset,
+    descriptions are int32 codes into a table of interned strings and the
+    TraceId of located points is an int64, about 48 bytes per point
+    instead of a dict of strings. Columns grow by
+    doubling so append() is O(1) amortized, and lat, lon, time and ids
+    return views that can be handed to numpy or pandas without copying.
+
+    Each point keeps a stable id that doesn't change when other points are
+    deleted. Iterating or indexing yields point dicts in the same form as
+    project_data.json so code expecting a list of dicts keeps working.
+    Dates are only formatted for display by rows(), dates() and toFrame().
+    Points must have the layout of the current ProjectSchema, any other
+    keys (such as a Date the migration couldn't parse) are rare and kept
+    by id in the extra dict so nothing is lost.
+    '''
+    def __init__(self, points=(), capacity=1024):
+        '''
+        Args:
+            points (iterable): point dicts to load
+            capacity (int): initial number of rows allocated
+        '''
+        self.count = 0
+        self.nextId = 0
+        self.strings = ['']
+        self.codes = {'': 0}
+        self.extra = {}
+        self.ranks = None
+        self.rankings = 0
+        self.index = None
+        self.shared = None
+        self.allocate(max(capacity, len(points) if hasattr(points, '__len__') else 0))
+        self.extend(points)
+
+    def allocate(self, capacity):
+        '''
+        Resize every column to hold capacity rows
+        '''
+        capacity = max(capacity, 1)
+        columns = (
+            ('_lat', np.float64),
+            ('_lon', np.float64),
+            ('_time', np.int64),
+            ('_offset', np.int32),
+            ('_desc', np.int32),
+            ('_trace', np.int64),
+            ('_ids', np.int64)
+        )
+        for name, dtype in columns:
+            column = np.empty(capacity, dtype=dtype)
+            if self.count:
+                column[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, column)
+
+    def intern(self, text):
+        '''
+        Code of a description, adding it to the string table if it's new
+        '''
+        text = text or ''
+        code = self.codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            self.codes[text] = code
+            self.strings.append(text)
+
+        return code
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def lat(self):
+        return self._lat[:self.count]
+
+    @property
+    def lon(self):
+        return self._lon[:self.count]
+
+    @property
+    def time(self):
+        return self._time[:self.count]
+
+    @property
+    def offsets(self):
+        return self._offset[:self.count]
+
+    @property
+    def ids(self):
+        return self._ids[:self.count]
+
+    @property
+    def traces(self):
+        return self._trace[:self.count]
+
+    @property
+    def descriptionCodes(self):
+        return self._desc[:self.count]
+
+    def descriptions(self):
+        '''
+        Object array of every description, strings are shared not copied
+        '''
+        return np.array(self.strings, dtype=object)[self.descriptionCodes]
+
+    def descriptionRanks(self):
+        '''
+        Position of each interned description in case-insensitive order.
+        Descriptions interned since the last call are ranked halfway between
+        their neighbours, found with a binary search, so the ranks already
+        given out never change and sort keys built from them stay valid.
+        Every description is only ranked again when a gap runs out, which
+        increments rankings.
+        '''
+        if self.ranks is None:
+            return self.rankAll()
+
+        if len(self.ranks) != len(self.strings):
+            ranks = np.empty(len(self.strings), dtype=np.float64)
+            ranks[:len(self.ranks)] = self.ranks
+            for code in range(len(self.ranks), len(self.strings)):
+                text = self.strings[code].casefold()
+                i = bisect.bisect_right(self.rankTexts, text)
+                if i and self.rankTexts[i - 1] == text:
+                    ranks[code] = ranks[self.rankOrder[i - 1]]
+                    continue
+
+                low = ranks[self.rankOrder[i - 1]] if i else ranks[self.rankOrder[0]] - 1
+                high = ranks[self.rankOrder[i]] if i < len(self.rankOrder) else low + 2
+                rank = (low + high) / 2
+                if not low < rank < high:
+                    return self.rankAll()
+
+                ranks[code] = rank
+                self.rankOrder.insert(i, code)
+                self.rankTexts.insert(i, text)
+            self.ranks = ranks
+
+        return self.ranks
+
+    def rankAll(self):
+        '''
+        Rank every description, descriptions equal ignoring case share a rank
+        '''
+        texts = [text.casefold() for text in self.strings]
+        order = sorted(range(len(texts)), key=texts.__getitem__)
+        ranks = np.empty(len(texts), dtype=np.float64)
+
+        #codes of the distinct descriptions in order and their casefolded
+        #text, searched for new ones
+        self.rankOrder = []
+        self.rankTexts = []
+        previous = None
+        for code in order:
+            if texts[code] != previous:
+                previous = texts[code]
+                self.rankOrder.append(code)
+                self.rankTexts.append(previous)
+            ranks[code] = len(self.rankOrder) - 1
+
+        self.ranks = ranks
+        self.rankings += 1
+
+        return ranks
+
+    def sortKey(self, key, start=0, stop=None):
+        '''
+        Typed array to sort the rows by: float64 coordinates, int64 epoch
+        seconds for dates and case-insensitive ranks for descriptions. The
+        coordinate and date keys are views of the columns.
+
+        Args:
+            key (str): column to sort by
+            start (int): first row
+            stop (int): row after the last, None for every row
+
+        Returns:
+            numpy array or None if key isn't a column
+        '''
+        stop = self.count if stop is None else stop
+        if key == 'Latitude':
+            return self._lat[start:stop]
+        if key == 'Longitude':
+            return self._lon[start:stop]
+        if key in ('Timestamp', 'Date'):
+            return self._time[start:stop]
+        if key == 'Description':
+            return self.descriptionRanks()[self._desc[start:stop]]
+
+        return None
+
+    def search(self, query):
+        '''
+        Boolean array of the rows whose description contains every word of
+        the query, the words can be prefixes, see SearchIndex. The index is
+        built on the first search and then only indexes new descriptions.
+        '''
+        if self.index is None:
+            self.index = SearchIndex(self.strings)
+
+        hit = self.index.search(query)
+        if hit is None:
+            return np.ones(self.count, dtype=bool)
+
+        return hit[self.descriptionCodes]
+
+    def dates(self):
+        '''
+        List of every date formatted for display, in the timezone each
+        point was recorded in
+        '''
+        dates = Dates.formatDates(self.time, self.offsets)
+        for pointId, extra in self.extra.items():
+            if 'Date' in extra:
+                dates[self.indexOf(pointId)] = extra['Date']
+
+        return dates
+
+    def append(self, point):
+        '''
+        Add a point dict, returns the id of the new point
+        '''
+        self.extend((point,))
+        return self.nextId - 1
+
+    def extend(self, points):
+        '''
+        Add many point dicts
+        '''
+        points = list(points)
+        n = len(points)
+        if not n:
+            return
+
+        if self.count + n > len(self._lat):
+            self.allocate(max(len(self._lat) * 2, self.count + n))
+
+        s = slice(self.count, self.count + n)
+        self._lat[s] = np.fromiter((p['Latitude'] for p in points), np.float64, n)
+        self._lon[s] = np.fromiter((p['Longitude'] for p in points), np.float64, n)
+        self._time[s] = np.fromiter((NO_DATE if p['Timestamp'] is None else p['Timestamp'] for p in points), np.int64, n)
+        self._offset[s] = np.fromiter((p['UTCOffset'] or 0 for p in points), np.int32, n)
+        self._desc[s] = np.fromiter((self.intern(p['Description']) for p in points), np.int32, n)
+        self._trace[s] = np.fromiter((p.get(TRACE_KEY, NO_TRACE) for p in points), np.int64, n)
+        self._ids[s] = np.arange(self.nextId, self.nextId + n)
+
+        for i, p in enumerate(points):
+            extra = extraKeys(p)
+            if extra is not None:
+                self.extra[self.nextId + i] = extra
+
+        self.count += n
+        self.nextId += n
+
+    def extendColumns(self, lat, lon, time, offsets, descriptions, traces, extra=None):
+        '''
+        Add points given as columns, e.g. rows read from a database, without
+        building a dict per point
+
+        Args:
+            lat (sequence): latitudes
+            lon (sequence): longitudes
+            time (sequence): epoch seconds, NO_DATE for points without a date
+            offsets (sequence): UTC offsets in seconds
+            descriptions (sequence): description strings
+            traces (sequence): TraceId of each point, NO_TRACE if unset
+            extra (dict): position in the columns -> keys without a column
+        '''
+        n = len(lat)
+        if not n:
+            return
+
+        if self.count + n > len(self._lat):
+            self.allocate(max(len(self._lat) * 2, self.count + n))
+
+        s = slice(self.count, self.count + n)
+        self._lat[s] = lat
+        self._lon[s] = lon
+        self._time[s] = time
+        self._offset[s] = offsets
+        self._desc[s] = np.fromiter((self.intern(text) for text in descriptions), np.int32, n)
+        self._trace[s] = traces
+        self._ids[s] = np.arange(self.nextId, self.nextId + n)
+
+        for i, keys in (extra or {}).items():
+            self.extra[self.nextId + i] = keys
+
+        self.count += n
+        self.nextId += n
+
+    def point(self, i):
+        '''
+        Point dict of row i
+        '''
+        ts = int(self._time[i])
+        point = {
+            'Latitude': float(self._lat[i]),
+            'Longitude': float(self._lon[i]),
+            'Timestamp': None if ts == NO_DATE else ts,
+            'UTCOffset': None if ts == NO_DATE else int(self._offset[i]),
+            'Description': self.strings[self._desc[i]]
+        }
+        if self._trace[i] != NO_TRACE:
+            point[TRACE_KEY] = int(self._trace[i])
+        if self.extra:
+            point.update(self.extra.get(int(self._ids[i]), ()))
+
+        return point
+
+    def row(self, i):
+        '''
+        Point dict of row i with its Date formatted for display
+        '''
+        point = self.point(i)
+        if 'Date' not in point:
+            point['Date'] = Dates.formatDate(point['Timestamp'], point['UTCOffset'])
+
+        return point
+
+    def cell(self, i, key):
+        '''
+        Value of one key of row(i) without building the point dict, the
+        table reads only the cells it shows
+        '''
+        if key == 'Latitude':
+            return float(self._lat[i])
+        if key == 'Longitude':
+            return float(self._lon[i])
+        if key == 'Description':
+            return self.strings[self._desc[i]]
+        if key == TRACE_KEY:
+            return None if self._trace[i] == NO_TRACE else int(self._trace[i])
+        if key in ('Timestamp', 'UTCOffset', 'Date') and int(self._ids[i]) not in self.extra:
+            ts = int(self._time[i])
+            if ts == NO_DATE:
+                return '' if key == 'Date' else None
+            if key == 'Date':
+                return Dates.formatDate(ts, int(self._offset[i]))
+            return ts if key == 'Timestamp' else int(self._offset[i])
+
+        return self.row(i).get(key)
+
+    def rows(self):
+        '''
+        List of every point with its Date formatted for display
+        '''
+        return [self.row(i) for i in range(self.count)]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.point(j) for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('point index out of range')
+
+        return self.point(i)
+
+    def __setitem__(self, i, point):
+        '''
+        Replace the point of row i, it keeps its id
+        '''
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('point index out of range')
+
+        self.unshare()
+        pointId = int(self._ids[i])
+        self._lat[i] = point['Latitude']
+        self._lon[i] = point['Longitude']
+        self._time[i] = NO_DATE if point['Timestamp'] is None else point['Timestamp']
+        self._offset[i] = point['UTCOffset'] or 0
+        self._desc[i] = self.intern(point['Description'])
+        self._trace[i] = point.get(TRACE_KEY, NO_TRACE)
+
+        self.extra.pop(pointId, None)
+        extra = extraKeys(point)
+        if extra is not None:
+            self.extra[pointId] = extra
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.point(i)
+
+    def copy(self):
+        '''
+        Independent copy of the store, only the columns of stored points
+        are copied
+        '''
+        store = PointStore.__new__(PointStore)
+        store.count = self.count
+        store.nextId = self.nextId
+        store.strings = list(self.strings)
+        store.codes = dict(self.codes)
+        store.extra = {pointId: dict(extra) for pointId, extra in self.extra.items()}
+        store.ranks = None
+        store.rankings = 0
+        store.index = None
+        store.shared = None
+        for name in ('_lat', '_lon', '_time', '_offset', '_desc', '_trace', '_ids'):
+            setattr(store, name, getattr(self, name)[:max(self.count, 1)].copy())
+
+        return store
+
+    def frozen(self):
+        '''
+        Copy of the store as it is now that shares its columns instead of
+        copying them, so it can be written on another thread without
+        blocking the GUI thread. Appends only write rows past the frozen
+        count, a delete or edit copies the columns first while the frozen
+        store is alive (copy on write). The frozen store must not be changed.
+        '''
+        store = PointStore.__new__(PointStore)
+        store.count = self.count
+        store.nextId = self.nextId
+        #strings are only ever appended to and extra is copied on write
+        store.strings = self.strings
+        store.codes = self.codes
+        store.extra = self.extra
+        store.ranks = None
+        store.rankings = 0
+        store.index = None
+        store.shared = None
+        for name in ('_lat', '_lon', '_time', '_offset', '_desc', '_trace', '_ids'):
+            setattr(store, name, getattr(self, name))
+
+        self.shared = weakref.ref(store)
+        return store
+
+    def unshare(self):
+        '''
+        Copy the columns and extra keys if a frozen store still shares
+        them, called before rows are changed in place
+        '''
+        if self.shared is not None and self.shared() is not None:
+            self.allocate(len(self._lat))
+            self.extra = dict(self.extra)
+        self.shared = None
+
+    def __delitem__(self, i):
+        '''
+        Delete row i, the remaining rows keep their ids
+        '''
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('point index out of range')
+
+        self.unshare()
+        self.extra.pop(int(self._ids[i]), None)
+        for name in ('_lat', '_lon', '_time', '_offset', '_desc', '_trace', '_ids'):
+            column = getattr(self, name)
+            column[i:self.count - 1] = column[i + 1:self.count]
+
+        self.count -= 1
+
+    def indexOf(self, pointId):
+        '''
+        Row of a point id or -1, ids are increasing so this is a binary search
+        '''
+        i = int(np.searchsorted(self.ids, pointId))
+        return i if i < self.count and self._ids[i] == pointId else -1
+
+    def toDicts(self):
+        '''
+        List of point dicts for project_data.json
+        '''
+        return list(self)
+
+    def toFrame(self):
+        '''
+        DataFrame of the points for reports, the numeric columns are views
+        of the store
+        '''
+        return pd.DataFrame({
+            'Latitude': self.lat,
+            'Longitude': self.lon,
+            'Date': self.dates(),
+            'Description': self.descriptions()
+        }, copy=False)
+
+    def mapPoints(self, start=0, stop=None):
+        '''
+        Points from row start to stop in the form index.html expects
+        '''
+        stop = self.count if stop is None else stop
+        dates = self.dates()[start:stop] if stop - start == self.count else [self.cell(i, 'Date') for i in range(start, stop)]
+        descriptions = self.strings
+        return [{
+            'Point': {'lat': lat, 'lng': lon},
+            'Description': descriptions[code],
+            'Date': date
+        } for lat, lon, code, date in zip(self._lat[start:stop].tolist(), self._lon[start:stop].tolist(), self._desc[start:stop].tolist(), dates)]
+
+    @property
+    def nbytes(self):
+        '''
+        Bytes used by the columns of stored points, excluding the string table
+        '''
+        return self.count * (8 + 8 + 8 + 4 + 4 + 8 + 8)
@@ -0,0 +1,166 @@
+import os
+import json
+import threading
+
+CATALOG_NAME = 'catalog.json'
+
+#Files whose size and mtime decide if a catalog entry is still valid
+DATA_FILES = (
+    'project_data.json',
+    'project_journal.jsonl',
+    'project_journal.jsonl.1',
+    'project.db',
+    'project.db-wal'
+)
+
+def signature(directory):
+    '''
+    Size and mtime of each data file of a project, cheap to compute with
+    stat() no matter how large the project is
+
+    Returns:
+        list of [name, size, mtime_ns] for the files that exist
+    '''
+    sig = []
+    for name in DATA_FILES:
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        sig.append([name, st.st_size, st.st_mtime_ns])
+
+    return sig
+
+class ProjectCatalog():
+    '''
+    Cached metadata (name, point count, created/last accessed dates, size)
+    of every project, stored in Projects/catalog.json. An entry is used as
+    long as the project's data files have the same size and mtime as when
+    it was written, otherwise the project is read once with the summarize
+    callback and the entry replaced, so listing projects doesn't parse them.
+    Projects that can't be read get an entry whose Points is None, so a
+    corrupt project is only read again once its files change.
+    Entries are only ever replaced, never changed in place, so they can be
+    handed to another thread.
+    '''
+    def __init__(self, projectsDir, summarize):
+        '''
+        Args:
+            projectsDir (str): directory containing the projects
+            summarize (callable): summarize(name) returns a dict with
+                ProjectName, Points (count), Created and LastAccessed
+        '''
+        self.projectsDir = projectsDir
+        self.path = os.path.join(projectsDir, CATALOG_NAME)
+        self.summarize = summarize
+
+        #entries are refreshed by ProjectScanner while the GUI thread updates them
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.path, 'rt') as f:
+                self.entries = json.loads(f.read())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def projects(self):
+        '''
+        Return catalog entries of every project, refreshing stale ones
+
+        Returns:
+            list of entry dicts ordered by project name
+        '''
+        entries = {name: entry for name, entry in self.scan()}
+        return [entries[name] for name in sorted(entries)]
+
+    def scan(self, interrupted=None):
+        '''
+        Yield (name, entry) of every project. Projects with a valid entry
+        are yielded first, then stale ones are read one at a time so a
+        large or unreadable project doesn't hold up the others. Unreadable
+        projects are yielded (and cached) with an entry whose Points is None.
+
+        Args:
+            interrupted (callable): stop scanning when it returns True
+        '''
+        names = sorted(f.name for f in os.scandir(self.projectsDir) if f.is_dir())
+        stale = []
+
+        for name in names:
+            with self.lock:
+                entry = self.entries.get(name)
+            if entry is not None and entry.get('Signature') == signature(os.path.join(self.projectsDir, name)):
+                yield name, entry
+            else:
+                stale.append(name)
+
+        for name in stale:
+            if interrupted and interrupted():
+                return
+            yield name, self.refresh(name)
+
+        with self.lock:
+            for name in set(self.entries) - set(names):
+                del self.entries[name]
+
+        if stale:
+            self.save()
+
+    def refresh(self, name):
+        '''
+        Rebuild the entry of one project, the signature is taken after
+        reading it in case reading touched the files (SQLite)
+
+        Returns:
+            the new entry, its Points is None if the project can't be read
+        '''
+        summary = self.summarize(name)
+        if not summary:
+            #cached as unreadable until the files change
+            return self.update(name, {'ProjectName': name, 'Points': None})
+
+        return self.update(name, summary)
+
+    def update(self, name, summary, sig=None):
+        '''
+        Store the entry of a project whose files are up to date on disk
+
+        Args:
+            name (str): project directory name
+            summary (dict): ProjectName, Points, Created and LastAccessed
+            sig (list): signature() of the project, computed if not given
+        '''
+        if sig is None:
+            sig = signature(os.path.join(self.projectsDir, name))
+
+        entry = {
+            'ProjectName': summary.get('ProjectName') or name,
+            'Points': summary.get('Points', 0),
+            'Created': summary.get('Created'),
+            'LastAccessed': summary.get('LastAccessed'),
+            'Size': sum(size for _, size, _ in sig),
+            'Signature': sig
+        }
+        with self.lock:
+            self.entries[name] = entry
+
+        return entry
+
+    def rename(self, old, new):
+        with self.lock:
+            entry = self.entries.pop(old, None)
+            if entry:
+                self.entries[new] = dict(entry, ProjectName=new)
+
+    def save(self):
+        '''
+        Write the catalog, it's only a cache so failures are ignored
+        '''
+        tmp = self.path + '.tmp'
+        with self.lock:
+            try:
+                with open(tmp, 'wt') as f:
+                    f.write(json.dumps(self.entries))
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
@@ -8,7 +8,20 @@ from PyQt5.QtCore import Qt, QDateTime, QStringListModel, QDate
 from PyQt5.QtWidgets import qApp, QMessageBox, QFileDialog
 from PyQt5 import QtGui
 import pandas as pd
-import json
+import sqlite3
+from functools import partial
+
+import TraceRecorder
+import MotionSource
+import AtomicWrite
+import ProjectJournal
+import ProjectSchema
+import ProjectReader
+from PointStore import PointStore
+import SQLiteStore
+import ProjectCatalog
+from ProjectScanner import ProjectScanner
+from PersistenceWorker import PersistenceWorker
 
 DIR_NAME = os.path.abspath(os.path.dirname(__file__))
 SETTINGS_DIR = os.path.join(DIR_NAME, 'Settings')
@@ -16,6 +29,33 @@ SETTINGS_PATH = os.path.join(SETTINGS_DIR, 'settings.json')
 PROJECTS_DIR = os.path.join(DIR_NAME, 'Projects')
 RESOURCES_DIR = os.path.join(DIR_NAME, 'Resources')
 
+DEFAULT_SETTINGS = {
+    'Theme': None,
+    'API': None,
+    'Storage': 'json',
+    'Fsync': AtomicWrite.FSYNC_DEFAULT
+}
+
+def writeReport(path, data, file_type):
+    '''
+    Write points to a report file, runs on the persistence worker
+
+    Args:
+        data: DataFrame or list of point dicts
+    '''
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+
+    if file_type == 'csv':
+        df.to_csv(path, index=False)
+    elif file_type == 'json':
+        df.to_json(path)
+    elif file_type == 'xlsx':
+        df.to_excel(path, index=False)
+    elif file_type == 'html':
+        df.to_html(path, index=False)
+    else:
+        raise ValueError(f'Unsupported file type: {file_type}')
+
 class ProjectController():
     def __init__(self):
         icon_path = os.path.join(RESOURCES_DIR, 'icons', 'app_icon.png')
@@ -26,30 +66,51 @@ class ProjectController():
         if not os.path.exists(SETTINGS_DIR):
             self.createSettingsFile()
 
+        #Writes files off the GUI thread, flushed before the app quits
+        self.worker = PersistenceWorker()
+        qApp.aboutToQuit.connect(self.flush)
+
         self.loadSettings()
+
+        #Cached project metadata for the starter window
+        self.catalog = ProjectCatalog.ProjectCatalog(PROJECTS_DIR, self.summarizeProject)
+        self.scanner = None
+        self.worker.saved.connect(self.storeSaved)
+
         self.sw = StarterWindow(self)
         self.mw = None
+        self.store = None
+        self.storeName = None
+        self.opening = None
+        self.recovered = None
+        self.replayed = 0
     
     def loadSettings(self):
         '''
-        Load default user settings
+        Load default user settings, a damaged settings file is restored
+        from its backup or replaced by the defaults
         '''
-        with open(SETTINGS_PATH, 'rt') as f:
-            self.settings = json.loads(f.read())
+        try:
+            self.settings = AtomicWrite.readRecovering(SETTINGS_PATH)[0]
+        except (OSError, ValueError):
+            self.settings = dict(DEFAULT_SETTINGS)
 
         self.loadTheme(self.settings.get('Theme'))
 
     def saveSettings(self):
         '''
-        Save updated settings data 
+        Queue updated settings data to be saved, failures are reported
+        by the worker's failed signal
         '''
-        try:
-            with open(SETTINGS_PATH, 'w+') as f:
-                f.write(json.dumps(self.settings))
-        except:
-            return False
-        else:
-            return True
+        self.worker.submit('settings', AtomicWrite.writeJson, SETTINGS_PATH, dict(self.settings), self.fsyncPolicy())
+        return True
+
+    def fsyncPolicy(self):
+        '''
+        Fsync setting, one of AtomicWrite.FSYNC_POLICIES
+        '''
+        policy = self.settings.get('Fsync')
+        return policy if policy in AtomicWrite.FSYNC_POLICIES else AtomicWrite.FSYNC_DEFAULT
 
     def loadTheme(self, theme=None):
         '''
@@ -78,13 +139,8 @@ class ProjectController():
         Create settings directory and settings.json file if it doesn't exist
         this function should only be called on first launch of application
         '''
-        default_data = {
-            'Theme': None,
-            'API': None
-        }
         os.mkdir(SETTINGS_DIR)
-        with open(SETTINGS_PATH, 'w+') as f:
-            f.write(json.dumps(default_data))
+        AtomicWrite.writeJson(SETTINGS_PATH, DEFAULT_SETTINGS)
 
     def newProject(self, window_ref):
         '''
@@ -113,12 +169,14 @@ class ProjectController():
                 'Reference': ref,
                 'Scale': 0,
                 'Units': '',
-                'Points': []
+                'ScaleSource': MotionSource.CURSOR,
+                'Points': [],
+                'ControlPoints': [],
+                'SchemaVersion': ProjectSchema.SCHEMA_VERSION
         }
         try:
             os.makedirs(os.path.join(PROJECTS_DIR, project_name, 'Reports'))
-            with open(project_file, 'w+') as f:
-                f.write(json.dumps(default_data))
+            AtomicWrite.writeJson(project_file, default_data, self.fsyncPolicy())
 
         except FileExistsError:
             QMessageBox.critical(
@@ -134,6 +192,9 @@ class ProjectController():
         '''
         Close the currently open projects and redisplay starter window
         '''
+        self.flush()
+        self.worker.saved.disconnect(self.mw.saved)
+        self.worker.failed.disconnect(self.mw.saveFailed)
         self.mw.close()
         self.sw = StarterWindow(self)
 
@@ -153,6 +214,8 @@ class ProjectController():
         '''
         window_ref: (QDialog) a reference to the window that called this function
         '''
+        #the starter window's scan must not read the project while it's opened
+        self.stopScan()
         path = os.path.join(PROJECTS_DIR, project_name, 'project_data.json')
         
         if os.path.exists(path):
@@ -166,67 +229,348 @@ class ProjectController():
                 f'{project_name} file failed to be created'
             )
                
+    def openStore(self, project_name):
+        '''
+        Open the storage backend of a project and return its data. Projects
+        are stored in project_data.json with a ProjectJournal unless the
+        Storage setting is 'sqlite' or they already have a project.db, json
+        projects are migrated to SQLite the first time they're opened with
+        the sqlite setting. Projects with an older ProjectSchema version are
+        upgraded and saved once here. If the project file was damaged and
+        restored from a backup, recovered is set to the backup's path.
+        '''
+        return ProjectReader.drain(self.openStoreSteps(project_name))
+
+    def openStoreSteps(self, project_name):
+        '''
+        openStore() a chunk of points at a time so MainWindow can show the
+        points while the rest are read, yields the project data read so
+        far after each chunk (see ProjectReader.readProjectSteps). Closing
+        the store stops reading. When it's done, replayed is the number of
+        journal entries applied on top of the points that were yielded.
+        '''
+        self.closeStore()
+        self.opening = self.readStore(project_name)
+        return self.opening
+
+    def readStore(self, project_name):
+        directory = os.path.join(PROJECTS_DIR, project_name)
+        fsync = self.fsyncPolicy()
+        self.recovered = None
+        self.replayed = 0
+
+        try:
+            if os.path.exists(os.path.join(directory, SQLiteStore.DB_NAME)):
+                self.store = SQLiteStore.SQLiteStore(directory, fsync)
+            elif self.settings.get('Storage') == 'sqlite':
+                self.store = SQLiteStore.SQLiteStore.migrate(directory, fsync)
+            else:
+                #points are streamed into a PointStore, upgraded chunk by chunk,
+                #and shared with MainWindow which changes them before recording
+                self.store = ProjectJournal.ProjectJournal(
+                    directory,
+                    schedule=partial(self.worker.submit, 'project'),
+                    fsync=fsync,
+                    points=PointStore,
+                    prepare=ProjectSchema.upgradePoints,
+                    live=True,
+                    stream=True
+                )
+            data = yield from self.store.loadSteps()
+            self.recovered = self.store.recovered
+            self.replayed = self.store.replayed
+            if ProjectSchema.upgrade(data) and not self.store.snapshot(data):
+                raise OSError(f'Failed to save upgraded project: {self.store.error}')
+        except (OSError, ValueError, KeyError, IndexError, TypeError, sqlite3.Error):
+            self.opening = None
+            if self.store:
+                self.store.close()
+                self.store = None
+            return False
+        except GeneratorExit:
+            #closed while reading
+            if self.store:
+                self.store.close()
+                self.store = None
+            raise
+        else:
+            self.opening = None
+            self.storeName = project_name
+            return data
+
+    def closeStore(self):
+        '''
+        Fold the open journal into project_data.json and close the store
+        '''
+        #a project still being read is closed without saving
+        if self.opening:
+            opening, self.opening = self.opening, None
+            opening.close()
+
+        #queued snapshots must be written before the project can be renamed
+        self.worker.flush()
+
+        if self.store:
+            summary = self.store.summary()
+            self.store.close()
+
+            #drop the traces of points deleted while the project was open
+            try:
+                TraceRecorder.compactTraces(os.path.join(PROJECTS_DIR, self.storeName, 'project_traces.bin'))
+            except (OSError, ValueError):
+                pass
+
+            #files are final now, cache them for the starter window
+            self.catalog.update(self.storeName, summary)
+            self.catalog.save()
+
+            self.store = None
+            self.storeName = None
+
+    def recordChange(self, op, key, value=None, index=None):
+        '''
+        Append a single change to the open project's store
+
+        Args:
+            op (str): 'add', 'delete', 'edit' or 'set'
+            key (str): project data key
+            value: new item or value for add, edit and set
+            index (int): list index for delete and edit
+        '''
+        try:
+            self.store.record(op, key, value, index)
+        except:
+            return False
+        else:
+            self.updateCatalog()
+            return True
+
+    def updateCatalog(self):
+        '''
+        Queue the open project's catalog entry to be updated so the starter
+        window is current even if the app doesn't close cleanly. Updates
+        within the worker's SAVE_DELAY are written once, and the files'
+        signature is taken on the worker when the entry is written.
+        '''
+        if self.store:
+            self.worker.submit('catalog', self.writeCatalog, self.storeName, self.store.summary())
+
+    def writeCatalog(self, project_name, summary):
+        '''
+        Store and write a project's catalog entry, run on the worker
+        '''
+        self.catalog.update(project_name, summary)
+        self.catalog.save()
+
+    def storeSaved(self, key):
+        '''
+        Slot for the persistence worker's saved signal, a compacted journal
+        changes the project's files so its catalog entry is updated again
+        '''
+        if key == 'project':
+            self.updateCatalog()
+
     def saveProject(self, project_name, project_data):
         '''
         Saves the project data in json format and writes to a file
         '''
+        project_data['SchemaVersion'] = ProjectSchema.SCHEMA_VERSION
+
+        if self.store and self.storeName == project_name:
+            #recordChange() already wrote every change to a SQLite project's
+            #rows, only the metadata is saved instead of rewriting them
+            if isinstance(self.store, SQLiteStore.SQLiteStore):
+                saved = self.store.saveMeta(project_data)
+            else:
+                saved = self.store.snapshot(project_data, wait=False)
+            if not saved:
+                return False
+            self.updateCatalog()
+            return True
+
         project_path = os.path.join(PROJECTS_DIR, project_name, 'project_data.json')
 
         try:
-            with open(project_path, 'w+') as f:
-                f.write(json.dumps(project_data, indent=2))
+            AtomicWrite.writeAtomic(project_path, ProjectReader.dumpProject(project_data), self.fsyncPolicy())
+        except:
+            return False
+        else:
+            return True
+
+    def saveTraces(self, project_name, traces):
+        '''
+        Append recorded trace samples to the binary sidecar next to project_data.json
+        or to the traces table of a SQLite project
+        '''
+        if isinstance(self.store, SQLiteStore.SQLiteStore) and self.storeName == project_name:
+            try:
+                self.store.saveTraces(traces)
+            except sqlite3.Error:
+                return False
+            else:
+                return True
+
+        traces_path = os.path.join(PROJECTS_DIR, project_name, 'project_traces.bin')
+
+        try:
+            TraceRecorder.saveTraces(traces_path, traces)
+        except:
+            return False
+        else:
+            return True
+
+    def deleteTraces(self, project_name, points):
+        '''
+        Remove the traces of deleted points. The traces are marked deleted
+        in the binary sidecar and dropped from it when the store is closed.
+
+        Args:
+            points (list): TraceId of each deleted point
+        '''
+        if isinstance(self.store, SQLiteStore.SQLiteStore) and self.storeName == project_name:
+            try:
+                self.store.deleteTraces(points)
+            except sqlite3.Error:
+                return False
+            else:
+                return True
+
+        traces_path = os.path.join(PROJECTS_DIR, project_name, 'project_traces.bin')
+
+        try:
+            TraceRecorder.deleteTraces(traces_path, points)
         except:
             return False
         else:
             return True
 
+    def getTraces(self, project_name):
+        '''
+        Return list of traces recorded for the project
+        '''
+        if isinstance(self.store, SQLiteStore.SQLiteStore) and self.storeName == project_name:
+            return list(self.store.loadTraces())
+
+        traces_path = os.path.join(PROJECTS_DIR, project_name, 'project_traces.bin')
+
+        if not os.path.exists(traces_path):
+            return []
+
+        try:
+            return list(TraceRecorder.loadTraces(traces_path))
+        except:
+            return []
+
     def setProjectName(self, old_name, new_name):
         '''
         Rename project
         '''
         old_path = os.path.join(PROJECTS_DIR, old_name)
         new_path = os.path.join(PROJECTS_DIR, new_name)
+        reopen = self.storeName == old_name
+
+        #the store keeps its files open inside the project directory
+        self.closeStore()
 
         try:
             os.rename(old_path, new_path)
         except:
+            if reopen:
+                self.openStore(old_name)
             return False
         else:
+            self.catalog.rename(old_name, new_name)
+            if reopen:
+                self.openStore(new_name)
             return True
     
     def exportProjectData(self, project_name, data, file_type):
         '''
+        Queue a report of the project's points to be written, the result
+        is reported by the worker's saved and failed signals with the key
+        export:{file_type}
         '''
-        df = pd.DataFrame(data)
         path = os.path.join(PROJECTS_DIR, project_name, 'Reports', QDate.currentDate().toString("MM-dd-yy") + f'_Report.{file_type}')
 
+        #the worker needs its own copy, a PointStore frame shares its columns
+        data = data.copy() if isinstance(data, pd.DataFrame) else list(data)
+        self.worker.submit(f'export:{file_type}', writeReport, path, data, file_type)
+        return True
+
+    def flush(self):
+        '''
+        Write all queued data and close the open store
+        '''
+        self.stopScan()
+        self.closeStore()
+        self.worker.flush()
+    
+    def getProjectData(self, project_name):
+        '''
+        Return project data including changes still in its journal,
+        upgraded to the current ProjectSchema without saving it
+        '''
+        directory = os.path.join(PROJECTS_DIR, project_name)
+
         try:
-            if file_type == 'csv':
-                df.to_csv(path, index=False)
-            elif file_type == 'json':
-                df.to_json(path)
-            elif file_type == 'xlsx':
-                df.to_excel(path, index=False)
-            elif file_type == 'html':
-                df.to_html(path, index=False)
+            if os.path.exists(os.path.join(directory, SQLiteStore.DB_NAME)):
+                store = SQLiteStore.SQLiteStore(directory)
+                data = store.load()
+                store.close()
             else:
-                raise ValueError   
+                data = ProjectJournal.loadProject(directory)[0]
+            ProjectSchema.upgrade(data)
         except:
             return False
         else:
-            return True
-    
-    def getProjectData(self, project_name):
+            return data
 
-        path = os.path.join(PROJECTS_DIR, project_name, 'project_data.json')
+    def summarizeProject(self, project_name):
+        '''
+        Read the catalog metadata of a project, SQLite projects are
+        summarized without reading their points
+        '''
+        directory = os.path.join(PROJECTS_DIR, project_name)
 
         try:
-            with open(path, 'r') as f:
-                data = json.loads(f.read())
+            if os.path.exists(os.path.join(directory, SQLiteStore.DB_NAME)):
+                store = SQLiteStore.SQLiteStore(directory)
+                summary = store.summary()
+                store.close()
+            else:
+                data = ProjectJournal.loadProject(directory)[0]
+                summary = {
+                    'ProjectName': data.get('ProjectName'),
+                    'Points': len(data.get('Points') or []),
+                    'Created': data.get('Created'),
+                    'LastAccessed': data.get('LastAccessed')
+                }
         except:
             return False
         else:
-            return data
+            return summary
+
+    def getCatalog(self):
+        '''
+        Return catalog entries (ProjectName, Points, Created, LastAccessed,
+        Size) of every project, only projects changed outside the app since
+        they were cataloged are read
+        '''
+        return self.catalog.projects()
+
+    def scanProjects(self):
+        '''
+        Start listing projects on a background thread, connect to the
+        returned scanner's found signal to receive them
+        '''
+        self.stopScan()
+        self.scanner = ProjectScanner(self.catalog)
+        return self.scanner
+
+    def stopScan(self):
+        if self.scanner:
+            self.scanner.stop()
+            self.scanner = None
 
     def getAllProjectData(self):
 
@@ -0,0 +1,409 @@
+import os
+import json
+import threading
+from functools import partial
+
+import AtomicWrite
+import ProjectReader
+
+SNAPSHOT_NAME = 'project_data.json'
+JOURNAL_NAME = 'project_journal.jsonl'
+
+#Journal entries are folded into the snapshot after this many operations
+COMPACT_EVERY = 256
+
+OPERATIONS = ('add', 'delete', 'edit', 'set')
+
+def applyOp(data, entry):
+    '''
+    Apply a single journal entry to project data
+
+    Args:
+        data (dict): project data
+        entry (dict): journal entry with op, key and value and/or index
+    '''
+    op = entry['op']
+    key = entry['key']
+
+    if op == 'add':
+        data.setdefault(key, []).append(entry['value'])
+    elif op == 'delete':
+        del data[key][entry['index']]
+    elif op == 'edit':
+        data[key][entry['index']] = entry['value']
+    elif op == 'set':
+        data[key] = entry['value']
+    else:
+        raise ValueError(f'Unsupported journal operation: {op}')
+
+def readEntries(path):
+    '''
+    Yield the entries of a journal file, stopping at a partially written line
+    '''
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rt') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                break
+
+def readSnapshot(directory, points=list, prepare=None):
+    '''
+    Read the snapshot of a project, falling back to the newest readable
+    backup if it was damaged by a crash or power loss. Points are streamed
+    into the container, see ProjectReader.readProject.
+
+    Returns:
+        data (dict): snapshot data
+        source (str): path of the file that was read
+    '''
+    return AtomicWrite.readRecovering(
+        os.path.join(directory, SNAPSHOT_NAME),
+        load=partial(ProjectReader.readProject, points=points, prepare=prepare)
+    )
+
+def readSnapshotSteps(directory, points=list, prepare=None):
+    '''
+    readSnapshot() a chunk of points at a time, see
+    ProjectReader.readProjectSteps
+    '''
+    return AtomicWrite.readRecoveringSteps(
+        os.path.join(directory, SNAPSHOT_NAME),
+        load=partial(ProjectReader.readProjectSteps, points=points, prepare=prepare)
+    )
+
+def loadProject(directory, snapshot=None, contiguous=False, points=list, prepare=None):
+    '''
+    Read project data from its snapshot and replay any journal entries
+    newer than the snapshot. Doesn't modify any files.
+
+    Args:
+        directory (str): project directory
+        snapshot (dict): snapshot already read with readSnapshot()
+        contiguous (bool): stop at the first missing entry, used when the
+            snapshot is a backup older than the journal
+        points (callable): creates the container of the points
+        prepare (callable): applied to lists of points before they're
+            added, including points added by journal entries
+
+    Returns:
+        data (dict): project data
+        seq (int): sequence number of the last applied entry
+        pending (int): number of entries applied on top of the snapshot
+    '''
+    data = readSnapshot(directory, points, prepare)[0] if snapshot is None else snapshot
+
+    seq = data.pop('JournalSeq', 0)
+    pending = 0
+    journal = os.path.join(directory, JOURNAL_NAME)
+
+    #rotated journal is left behind if a compaction didn't finish
+    for path in (journal + '.1', journal):
+        for entry in readEntries(path):
+            if entry['seq'] <= seq:
+                continue
+            if contiguous and entry['seq'] != seq + 1:
+                return data, seq, pending
+            if prepare and entry['key'] == 'Points' and entry['op'] in ('add', 'edit'):
+                prepare([entry['value']])
+            applyOp(data, entry)
+            seq = entry['seq']
+            pending += 1
+
+    return data, seq, pending
+
+def copyData(data):
+    '''
+    Deep copy of project data, a PointStore is copied by its columns
+    instead of through json
+    '''
+    points = data.get('Points')
+    copy = json.loads(json.dumps({key: value for key, value in data.items() if key != 'Points'}))
+    if points is not None:
+        copy['Points'] = json.loads(json.dumps(points)) if isinstance(points, list) else points.copy()
+
+    return copy
+
+def freeze(value):
+    '''
+    Copy of a project data value that later changes don't affect, lists
+    are only ever replaced or appended to so a shallow copy is enough.
+    A PointStore is frozen without copying its columns, see
+    PointStore.frozen.
+    '''
+    if hasattr(value, 'frozen'):
+        return value.frozen()
+
+    return value.copy() if hasattr(value, 'copy') else value
+
+class ProjectJournal():
+    '''
+    Append-only log of changes to a project. Each add, delete, edit or set
+    is written as one JSON line so saving a change costs the same no matter
+    how many points the project has. Every COMPACT_EVERY operations the
+    journal is rotated and the full project data is written to
+    project_data.json in the background, entries already in the snapshot
+    are skipped by their sequence number when loading.
+
+    The snapshot is read and written in chunks by ProjectReader, so the
+    points can be kept in a PointStore instead of a list of dicts. With
+    live set, load() hands out the journal's own data instead of a copy
+    so the project is only held in memory once. The caller then changes
+    the lists and points in place before recording each change, and only
+    set operations are applied by the journal.
+    Snapshots are written with AtomicWrite and keep backup generations.
+    If the snapshot is damaged when the project is opened it's restored
+    from the newest readable backup and recovered is set to its path.
+    '''
+    def __init__(self, directory, compactEvery=COMPACT_EVERY, schedule=None, fsync=AtomicWrite.FSYNC_DEFAULT, points=list, prepare=None, live=False, stream=False):
+        '''
+        Args:
+            directory (str): project directory
+            compactEvery (int): entries between compactions
+            schedule (callable): schedule(fn, *args) runs a snapshot write
+                in the background, defaults to a new thread per write
+            fsync (str): one of AtomicWrite.FSYNC_POLICIES, 'always' also
+                syncs every journaled change
+            points (callable): creates the container of the points, list
+                or PointStore
+            prepare (callable): applied to each chunk of points read, see
+                ProjectSchema.upgradePoints
+            live (bool): share the project data with the caller, which
+                applies changes to it before recording them
+            stream (bool): don't read the project yet, loadSteps() reads
+                it a chunk of points at a time
+        '''
+        self.directory = directory
+        self.snapshotPath = os.path.join(directory, SNAPSHOT_NAME)
+        self.journalPath = os.path.join(directory, JOURNAL_NAME)
+        self.rotatedPath = self.journalPath + '.1'
+        self.compactEvery = compactEvery
+        self.fsync = fsync
+        self.live = live
+        self.schedule = schedule if schedule else self.startThread
+        self.thread = None
+        self.error = None
+        self.file = None
+        self.recovered = None
+        self.replayed = 0
+
+        #guards the snapshot and rotated journal shared with background writes
+        self.lock = threading.Lock()
+
+        self.opening = self.open(points, prepare)
+        if not stream:
+            ProjectReader.drain(self.opening)
+            self.opening = None
+
+    def open(self, points, prepare):
+        '''
+        Read the project, yielding the data read so far after each chunk
+        of points, see ProjectReader.readProjectSteps
+        '''
+        AtomicWrite.removeTemp(self.snapshotPath)
+        snapshot, source = yield from readSnapshotSteps(self.directory, points, prepare)
+        self.recovered = source if source != self.snapshotPath else None
+        if self.recovered and os.path.exists(self.snapshotPath):
+            #set aside so it doesn't take the place of a good backup
+            os.replace(self.snapshotPath, self.snapshotPath + '.damaged')
+
+        #a backup's journal entries may have been folded into the damaged
+        #snapshot already, only replay them if none are missing
+        self.data, self.seq, self.pending = loadProject(
+            self.directory,
+            snapshot,
+            contiguous=bool(self.recovered),
+            points=points,
+            prepare=prepare
+        )
+        #entries applied on top of the snapshot, the data may have changed
+        #anywhere since it was last yielded
+        self.replayed = self.pending
+        self.writtenSeq = 0
+        self.rotatedSeq = self.seq
+        self.file = open(self.journalPath, 'at')
+
+        #fold a journal left from the last session into the snapshot, this
+        #also drops a partially written last line and restores a damaged
+        #snapshot
+        if os.path.getsize(self.journalPath) or os.path.exists(self.rotatedPath) or self.recovered:
+            self.compact(wait=True)
+
+    def record(self, op, key, value=None, index=None):
+        '''
+        Append an operation to the journal and apply it to the journal's
+        copy of the project data, in live mode the caller has already
+        applied it unless it's a set
+
+        Args:
+            op (str): 'add', 'delete', 'edit' or 'set'
+            key (str): project data key (Points, Reference, Scale...)
+            value: new item or value for add, edit and set
+            index (int): list index for delete and edit
+        '''
+        self.seq += 1
+        entry = {'seq': self.seq, 'op': op, 'key': key}
+        if index is not None:
+            entry['index'] = index
+        if op != 'delete':
+            entry['value'] = value
+
+        line = json.dumps(entry)
+
+        #apply the decoded line so the in memory data matches a reload
+        try:
+            if op not in OPERATIONS:
+                raise ValueError(f'Unsupported journal operation: {op}')
+            if op == 'set' or not self.live:
+                applyOp(self.data, json.loads(line))
+        except (KeyError, IndexError, TypeError, ValueError):
+            self.seq -= 1
+            raise
+
+        self.file.write(line + '\n')
+        self.file.flush()
+        if self.fsync == 'always':
+            os.fsync(self.file.fileno())
+
+        self.pending += 1
+        if self.pending >= self.compactEvery:
+            self.compact()
+
+    def load(self):
+        '''
+        Return a copy of the project data, or the data itself in live mode
+        '''
+        return self.data if self.live else copyData(self.data)
+
+    def loadSteps(self):
+        '''
+        load() a chunk of points at a time when the journal was created
+        with stream, yields the data read so far
+        '''
+        if self.opening:
+            opening, self.opening = self.opening, None
+            yield from opening
+
+        return self.load()
+
+    def summary(self):
+        '''
+        Metadata shown in the project catalog
+        '''
+        return {
+            'ProjectName': self.data.get('ProjectName'),
+            'Points': len(self.data.get('Points') or []),
+            'Created': self.data.get('Created'),
+            'LastAccessed': self.data.get('LastAccessed')
+        }
+
+    def snapshot(self, data, wait=True):
+        '''
+        Replace the project data and write it out
+
+        Args:
+            data (dict): full project data
+            wait (bool): write on the calling thread
+        '''
+        #in live mode data holds the caller's lists and points, compact()
+        #freezes them before they're written
+        self.data = dict(data) if self.live else copyData(data)
+
+        #newer than anything already queued even though nothing was journaled
+        self.seq += 1
+        return self.compact(wait)
+
+    def compact(self, wait=False):
+        '''
+        Rotate the journal and write the project data to the snapshot file
+
+        Args:
+            wait (bool): write on the calling thread instead of scheduling it
+
+        Returns:
+            False if a write on the calling thread failed
+        '''
+        with self.lock:
+            self.file.close()
+            if os.path.exists(self.rotatedPath):
+                #last write hasn't finished or failed, keep its entries
+                with open(self.journalPath, 'rt') as src, open(self.rotatedPath, 'at') as dst:
+                    dst.write(src.read())
+                os.remove(self.journalPath)
+            else:
+                os.replace(self.journalPath, self.rotatedPath)
+            self.rotatedSeq = self.seq
+            self.file = open(self.journalPath, 'at')
+        self.pending = 0
+
+        snapshot = {key: freeze(value) for key, value in self.data.items()}
+        snapshot['JournalSeq'] = self.seq
+
+        if wait:
+            return self.writeSnapshot(snapshot)
+
+        self.schedule(self.writeSnapshot, snapshot)
+        return True
+
+    def writeSnapshot(self, snapshot):
+        '''
+        Write the snapshot then drop the rotated journal if the snapshot
+        contains all of it. Snapshots older than one already written are
+        discarded so writes finishing out of order are harmless.
+
+        Returns:
+            False if the write failed
+        '''
+        seq = snapshot['JournalSeq']
+
+        try:
+            tmp = AtomicWrite.writeTemp(self.snapshotPath, ProjectReader.dumpProject(snapshot), self.fsync)
+
+            with self.lock:
+                if seq < self.writtenSeq:
+                    os.remove(tmp)
+                    return True
+                AtomicWrite.commit(tmp, self.snapshotPath, self.fsync)
+                self.writtenSeq = seq
+                if self.rotatedSeq <= seq and os.path.exists(self.rotatedPath):
+                    os.remove(self.rotatedPath)
+        except OSError as e:
+            self.error = e
+            return False
+        else:
+            self.error = None
+            return True
+
+    def startThread(self, fn, *args):
+        '''
+        Default scheduler, one thread per write
+        '''
+        self.join()
+        self.thread = threading.Thread(target=fn, args=args)
+        self.thread.start()
+
+    def join(self):
+        '''
+        Wait for a write started by the default scheduler to finish
+        '''
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        '''
+        Fold the journal into the snapshot and close it
+        '''
+        self.join()
+        if self.file is None:
+            #closed before the project was read
+            self.opening = None
+            return
+        if self.pending:
+            self.compact(wait=True)
+        self.file.close()
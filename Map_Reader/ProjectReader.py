@@ -0,0 +1,197 @@
+import re
+import json
+
+#Points passed on at a time while reading or writing a project
+CHUNK_SIZE = 10000
+
+#Characters read from the file at a time
+READ_SIZE = 1 << 16
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+#Characters that can follow a complete value
+SEPARATORS = ' \t\n\r,:]}'
+
+class StreamDecoder():
+    '''
+    Decodes json values one at a time from a text file, holding at most
+    READ_SIZE characters plus the value being decoded
+    '''
+    def __init__(self, f, readSize=READ_SIZE):
+        self.f = f
+        self.readSize = readSize
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.scan = json.JSONDecoder().scan_once
+
+    def fill(self):
+        '''
+        Read more of the file, returns False at the end of the file
+        '''
+        if self.eof:
+            return False
+
+        text = self.f.read(self.readSize)
+        if not text:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        '''
+        Next character that isn't whitespace, '' at the end of the file
+        '''
+        while True:
+            #most values follow a separator without whitespace
+            if self.pos < len(self.buffer) and self.buffer[self.pos] not in ' \t\n\r':
+                return self.buffer[self.pos]
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        '''
+        Consume the next character, it must be one of chars
+        '''
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f'Expected {chars!r} at character {self.pos}, found {char!r}')
+        self.pos += 1
+
+        return char
+
+    def decode(self):
+        '''
+        Decode the next value. A value must be followed by whitespace or a
+        separator in the buffer, otherwise it may be a number cut in half
+        (1 of 1.5) and more of the file is read first.
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = self.scan(self.buffer, self.pos)
+            except (StopIteration, ValueError):
+                if not self.fill():
+                    raise ValueError(f'Invalid or truncated value at character {self.pos}')
+                continue
+
+            if (end == len(self.buffer) or self.buffer[end] not in SEPARATORS) and self.fill():
+                continue
+
+            self.pos = end
+            return value
+
+def iterProject(f, chunkSize=CHUNK_SIZE):
+    '''
+    Yield the (key, value) pairs of a project_data.json file without
+    reading it all at once. The Points array is yielded as several
+    ('Points', chunk) pairs of at most chunkSize points.
+
+    Raises:
+        ValueError: the file is damaged or truncated
+    '''
+    stream = StreamDecoder(f)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+
+    while True:
+        key = stream.decode()
+        stream.expect(':')
+
+        if key == 'Points' and stream.peek() == '[':
+            stream.expect('[')
+            chunk = []
+            if stream.peek() == ']':
+                stream.expect(']')
+            else:
+                while True:
+                    chunk.append(stream.decode())
+                    if len(chunk) == chunkSize:
+                        yield key, chunk
+                        chunk = []
+                    if stream.expect(',]') == ']':
+                        break
+            yield key, chunk
+        else:
+            yield key, stream.decode()
+
+        if stream.expect(',}') == '}':
+            return
+
+def readProjectSteps(f, points=list, prepare=None, chunkSize=CHUNK_SIZE):
+    '''
+    readProject() a chunk of points at a time, so the points read so far
+    can be shown while the rest of the file is read. Yields the project
+    data read so far after each chunk is added, the keys written before
+    the points (all of them for files written by dumpProject) are already
+    in it. Returns the project data.
+    '''
+    data = {}
+    for key, value in iterProject(f, chunkSize):
+        if key == 'Points' and isinstance(value, list):
+            if key not in data:
+                data[key] = points()
+            if prepare:
+                prepare(value)
+            data[key].extend(value)
+            yield data
+        else:
+            data[key] = value
+
+    return data
+
+def readProject(f, points=list, prepare=None, chunkSize=CHUNK_SIZE):
+    '''
+    Read project data streaming its points into a container, so the file
+    text and the dicts of every point are never in memory at once
+
+    Args:
+        f: open text file
+        points (callable): creates the container of the points, it needs
+            an extend() method (list, PointStore)
+        prepare (callable): prepare(chunk) is applied to each chunk of
+            points before they're added, see ProjectSchema.upgradePoints
+        chunkSize (int): points decoded before they're added
+
+    Returns:
+        project data dict
+    '''
+    return drain(readProjectSteps(f, points, prepare, chunkSize))
+
+def drain(steps):
+    '''
+    Run a generator of loading steps to the end and return its result
+    '''
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+def dumpProject(data, chunkSize=CHUNK_SIZE):
+    '''
+    Yield the json text of project data in pieces, the points are
+    serialized chunkSize at a time, one per line
+
+    Args:
+        data (dict): project data, Points can be any sequence of dicts
+            supporting slicing (list, PointStore)
+    '''
+    items = [(key, value) for key, value in data.items() if key != 'Points']
+    yield '{\n'
+    for key, value in items:
+        yield f'  {json.dumps(key)}: {json.dumps(value)},\n'
+
+    points = data.get('Points') or []
+    yield '  "Points": ['
+    for start in range(0, len(points), chunkSize):
+        chunk = points[start:start + chunkSize]
+        yield (',\n    ' if start else '\n    ') + ',\n    '.join(json.dumps(point) for point in chunk)
+    yield '\n  ]\n}\n' if len(points) else ']\n}\n'
@@ -0,0 +1,27 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+class ProjectScanner(QThread):
+    '''
+    Enumerates projects through the ProjectCatalog on a background thread
+    and emits each one as soon as it's known. Cataloged projects arrive
+    almost immediately, projects that have to be read follow one at a time.
+    '''
+    #project directory name, catalog entry
+    found = pyqtSignal(str, dict)
+
+    def __init__(self, catalog, parent=None):
+        super(ProjectScanner, self).__init__(parent)
+        self.catalog = catalog
+
+    def run(self):
+        for name, entry in self.catalog.scan(self.isInterruptionRequested):
+            if self.isInterruptionRequested():
+                break
+            self.found.emit(name, entry)
+
+    def stop(self):
+        '''
+        Ask the scan to stop and wait for the project being read
+        '''
+        self.requestInterruption()
+        self.wait()
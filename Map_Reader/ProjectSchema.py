@@ -0,0 +1,118 @@
+import Dates
+import MotionSource
+
+#Version of the project data layout written by this version of the app
+SCHEMA_VERSION = 3
+
+#Version -> function upgrading project data from it to the next version
+MIGRATIONS = {}
+
+#Version -> function upgrading a list of points from it to the next version.
+#Projects are read in chunks and SchemaVersion can come after the points,
+#so these must leave points that are already upgraded unchanged.
+POINT_MIGRATIONS = {}
+
+def migration(version, points=False):
+    '''
+    Register the decorated function as the migration of project data from
+    version to version + 1, it changes the data in place
+
+    Args:
+        version (int): version the migration upgrades from
+        points (bool): the function takes a list of points instead of
+            the project data
+    '''
+    def register(fn):
+        (POINT_MIGRATIONS if points else MIGRATIONS)[version] = fn
+        return fn
+
+    return register
+
+@migration(0)
+def addMissingKeys(data):
+    '''
+    Projects from before SchemaVersion can be missing keys added later
+    '''
+    for key, default in (('Reference', []), ('Scale', 0), ('Units', ''), ('Points', []), ('ControlPoints', [])):
+        if data.get(key) is None:
+            data[key] = default
+
+    for key in ('ProjectName', 'Created', 'LastAccessed'):
+        data.setdefault(key, None)
+
+@migration(0, points=True)
+def addDescriptions(points):
+    for point in points:
+        if point.get('Description') is None:
+            point['Description'] = ''
+
+@migration(1, points=True)
+def timestampPoints(points):
+    '''
+    Replace the Date string of each point with Timestamp and UTCOffset,
+    all dates are parsed in one pass. Dates that can't be parsed are left
+    in the point with a Timestamp of None.
+    '''
+    legacy = [point for point in points if 'Timestamp' not in point]
+    if not legacy:
+        return
+
+    ts, offsets = Dates.timestamps([point.get('Date') for point in legacy])
+    for point, t, offset in zip(legacy, ts.tolist(), offsets.tolist()):
+        if t == Dates.NO_DATE:
+            point['Timestamp'] = None
+            point['UTCOffset'] = None
+        else:
+            point.pop('Date', None)
+            point['Timestamp'] = t
+            point['UTCOffset'] = offset
+
+@migration(2)
+def addScaleSource(data):
+    '''
+    Scales were traced from cursor pixels before motion sources were added
+    '''
+    data.setdefault('ScaleSource', MotionSource.CURSOR)
+
+def version(data):
+    '''
+    Schema version of project data, projects written before versioning are 0
+    '''
+    return data.get('SchemaVersion', 0)
+
+def upgrade(data):
+    '''
+    Run the migrations from the data's version up to SCHEMA_VERSION and
+    stamp the new version
+
+    Args:
+        data (dict): project data, changed in place
+
+    Returns:
+        True if the data was migrated and should be saved
+
+    Raises:
+        ValueError: the project was written by a newer version of the app
+    '''
+    current = version(data)
+    if current > SCHEMA_VERSION:
+        raise ValueError(f'Project schema version {current} is newer than {SCHEMA_VERSION}')
+
+    #points already in a PointStore were upgraded by upgradePoints()
+    points = data.get('Points')
+    for v in range(current, SCHEMA_VERSION):
+        if v in MIGRATIONS:
+            MIGRATIONS[v](data)
+        if v in POINT_MIGRATIONS and isinstance(points, list):
+            POINT_MIGRATIONS[v](data['Points'])
+
+    data['SchemaVersion'] = SCHEMA_VERSION
+    return current != SCHEMA_VERSION
+
+def upgradePoints(points):
+    '''
+    Upgrade a chunk of points read before the project's SchemaVersion is
+    known, used as the prepare function of ProjectReader.readProject()
+    '''
+    for v in sorted(POINT_MIGRATIONS):
+        POINT_MIGRATIONS[v](points)
@@ -0,0 +1,560 @@
+import os
+import json
+import sqlite3
+from array import array
+
+import numpy as np
+
+import AtomicWrite
+import ProjectJournal
+import ProjectReader
+import ProjectSchema
+from PointStore import PointStore, TRACE_KEY, NO_TRACE, extraKeys
+from Dates import NO_DATE
+from TraceRecorder import Trace, SAMPLE_DTYPE, NO_POINT
+
+DB_NAME = 'project.db'
+
+#Migrations are written to this name and only renamed to DB_NAME once
+#complete, so a failed migration never leaves an empty project.db
+MIGRATE_NAME = DB_NAME + '.migrate'
+
+#Rows inserted per executemany() when migrating
+CHUNK_SIZE = 10000
+
+#PRAGMA synchronous of each AtomicWrite fsync policy, in WAL mode NORMAL
+#only syncs at checkpoints and can lose the last commits on power loss
+SYNCHRONOUS = {
+    'always': 'FULL',
+    'snapshot': 'NORMAL',
+    'never': 'OFF'
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS reference_points (
+    id INTEGER PRIMARY KEY,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL
+);
+{points}
+{indexes}
+CREATE TABLE IF NOT EXISTS traces (
+    id INTEGER PRIMARY KEY,
+    trace_id INTEGER,
+    ref_latitude REAL,
+    ref_longitude REAL,
+    scale REAL,
+    units TEXT,
+    samples BLOB,
+    point_trace_id INTEGER
+);
+'''
+
+#A column per key of a point in the current ProjectSchema, data is only set
+#for points with keys that have no column (json of those keys)
+POINTS_TABLE = '''
+CREATE TABLE IF NOT EXISTS points (
+    id INTEGER PRIMARY KEY,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    timestamp INTEGER,
+    utc_offset INTEGER,
+    description TEXT,
+    trace_id INTEGER,
+    data TEXT
+);
+'''
+POINTS_INDEXES = '''
+CREATE INDEX IF NOT EXISTS points_location ON points (latitude, longitude);
+CREATE INDEX IF NOT EXISTS points_timestamp ON points (timestamp);
+'''
+SCHEMA = SCHEMA.format(points=POINTS_TABLE, indexes=POINTS_INDEXES)
+
+POINT_COLUMNS = 'latitude, longitude, timestamp, utc_offset, description, trace_id, data'
+INSERT_POINT = f'INSERT INTO points ({POINT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)'
+
+#Project data keys stored as json in the meta table
+META_KEYS = ('ProjectName', 'Created', 'LastAccessed', 'Scale', 'Units', 'ScaleSource', 'ControlPoints', 'SchemaVersion')
+
+def pointRow(point):
+    '''
+    Row values of a point dict of the current ProjectSchema, keys without a
+    column are kept as json
+    '''
+    extra = extraKeys(point)
+    return (
+        point['Latitude'],
+        point['Longitude'],
+        point['Timestamp'],
+        point['UTCOffset'],
+        point['Description'],
+        point.get(TRACE_KEY),
+        None if extra is None else json.dumps(extra)
+    )
+
+def storeRows(points, start, stop):
+    '''
+    Row values of rows start to stop of a PointStore, read from its columns
+    without building a dict per point
+    '''
+    ts = points.time[start:stop].tolist()
+    offsets = points.offsets[start:stop].tolist()
+    traces = points.traces[start:stop].tolist()
+    ids = points.ids[start:stop].tolist()
+    strings = points.strings
+
+    return [(
+        lat,
+        lon,
+        None if t == NO_DATE else t,
+        None if t == NO_DATE else offset,
+        strings[code],
+        None if trace == NO_TRACE else trace,
+        json.dumps(points.extra[pointId]) if pointId in points.extra else None
+    ) for lat, lon, t, offset, code, trace, pointId in zip(
+        points.lat[start:stop].tolist(),
+        points.lon[start:stop].tolist(),
+        ts,
+        offsets,
+        points.descriptionCodes[start:stop].tolist(),
+        traces,
+        ids
+    )]
+
+def rowPoint(row):
+    '''
+    Point dict of the values of a row, inverse of pointRow()
+    '''
+    lat, lon, ts, offset, description, trace, extra = row
+    point = {
+        'Latitude': lat,
+        'Longitude': lon,
+        'Timestamp': ts,
+        'UTCOffset': offset,
+        'Description': description
+    }
+    if trace is not None:
+        point[TRACE_KEY] = trace
+    if extra is not None:
+        point.update(json.loads(extra))
+
+    return point
+
+class SQLiteStore():
+    '''
+    SQLite project storage (./Projects/{Project_Name}/project.db), used
+    instead of project_data.json when the Storage setting is 'sqlite'.
+    Points are indexed on latitude/longitude and on their date so they
+    can be appended, counted and queried without loading the project.
+    Implements the same record()/snapshot()/close() interface as
+    ProjectJournal so ProjectController can use either.
+    '''
+    def __init__(self, directory, fsync=AtomicWrite.FSYNC_DEFAULT, name=DB_NAME):
+        '''
+        Args:
+            directory (str): project directory
+            fsync (str): one of AtomicWrite.FSYNC_POLICIES
+            name (str): database file name
+        '''
+        self.directory = directory
+        self.path = os.path.join(directory, name)
+        self.error = None
+        self.recovered = None
+        self.replayed = 0
+
+        #table -> row ids in insertion order so rows are found by index
+        #without an OFFSET scan, loaded when first needed
+        self.ids = {}
+
+        self.db = sqlite3.connect(self.path)
+
+        #WAL keeps each appended point to a single sequential write
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(f'PRAGMA synchronous={SYNCHRONOUS.get(fsync, "NORMAL")}')
+        self.db.executescript(SCHEMA)
+
+        #traces tables created before traces were linked to their point
+        if 'point_trace_id' not in [row[1] for row in self.db.execute('PRAGMA table_info(traces)')]:
+            self.db.execute('ALTER TABLE traces ADD COLUMN point_trace_id INTEGER')
+        self.db.execute('CREATE INDEX IF NOT EXISTS traces_point ON traces (point_trace_id)')
+        self.db.commit()
+
+        #points tables that kept every point as json
+        if 'utc_offset' not in [row[1] for row in self.db.execute('PRAGMA table_info(points)')]:
+            self.splitPoints()
+
+    def splitPoints(self):
+        '''
+        Move the points of a points table that kept each point as json into
+        typed columns, in one transaction so an interrupted upgrade leaves
+        the old table. Row ids are kept.
+        '''
+        with self.db:
+            self.db.execute('BEGIN')
+            self.db.execute('ALTER TABLE points RENAME TO points_json')
+            self.db.execute(POINTS_TABLE)
+
+            last = -1
+            while True:
+                rows = self.db.execute(
+                    'SELECT id, data FROM points_json WHERE id > ? ORDER BY id LIMIT ?',
+                    (last, CHUNK_SIZE)
+                ).fetchall()
+                if not rows:
+                    break
+                chunk = [json.loads(data) for _, data in rows]
+                ProjectSchema.upgradePoints(chunk)
+                self.db.executemany(
+                    f'INSERT INTO points (id, {POINT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(row[0],) + pointRow(point) for row, point in zip(rows, chunk)]
+                )
+                last = rows[-1][0]
+
+            #dropping the old table drops its indexes, so the names are free
+            self.db.execute('DROP TABLE points_json')
+            for statement in POINTS_INDEXES.split(';'):
+                if statement.strip():
+                    self.db.execute(statement)
+
+    @classmethod
+    def migrate(cls, directory, fsync=AtomicWrite.FSYNC_DEFAULT):
+        '''
+        Create the database of a json project, project_data.json and its
+        journal are left in place. The data is upgraded to the current
+        ProjectSchema first so the points are only written once. The
+        database is built as MIGRATE_NAME and renamed to DB_NAME when it's
+        complete, a migration that fails or is interrupted leaves the
+        project on json.
+
+        Args:
+            directory (str): project directory
+            fsync (str): one of AtomicWrite.FSYNC_POLICIES
+
+        Returns:
+            SQLiteStore
+        '''
+        data = ProjectJournal.loadProject(directory, points=PointStore, prepare=ProjectSchema.upgradePoints)[0]
+        ProjectSchema.upgrade(data)
+
+        #left by an interrupted migration
+        tmp = os.path.join(directory, MIGRATE_NAME)
+        for path in (tmp, tmp + '-wal', tmp + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+        store = cls(directory, fsync, MIGRATE_NAME)
+        try:
+            with store.db:
+                store.writeMeta(data)
+                store.writeReferences(data.get('Reference') or [])
+                store.insertPoints(data.get('Points') or [])
+        finally:
+            #closing checkpoints the WAL into the file and removes it
+            store.close()
+
+        AtomicWrite.commit(tmp, os.path.join(directory, DB_NAME), fsync, backups=0)
+
+        return cls(directory, fsync)
+
+    def writeMeta(self, data):
+        self.db.executemany(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            [(key, json.dumps(data.get(key))) for key in META_KEYS if key in data]
+        )
+
+    def writeReferences(self, refs):
+        self.db.executemany(
+            'INSERT INTO reference_points (latitude, longitude) VALUES (?, ?)',
+            [(lat, lon) for lat, lon in refs]
+        )
+
+    def insertPoints(self, points):
+        '''
+        Insert points in chunks so an iterator of points is never held in
+        memory all at once, a PointStore is read from its columns
+        '''
+        if isinstance(points, PointStore):
+            for start in range(0, len(points), CHUNK_SIZE):
+                self.db.executemany(INSERT_POINT, storeRows(points, start, start + CHUNK_SIZE))
+            return
+
+        chunk = []
+        for point in points:
+            chunk.append(pointRow(point))
+            if len(chunk) == CHUNK_SIZE:
+                self.db.executemany(INSERT_POINT, chunk)
+                chunk = []
+
+        self.db.executemany(INSERT_POINT, chunk)
+
+    def meta(self):
+        '''
+        Return project data without the points
+        '''
+        data = {key: json.loads(value) for key, value in self.db.execute('SELECT key, value FROM meta')}
+        data['Reference'] = self.references()
+
+        return data
+
+    def load(self):
+        '''
+        Return the full project data in the same form as project_data.json,
+        the points are streamed into a PointStore
+        '''
+        return ProjectReader.drain(self.loadSteps())
+
+    def loadSteps(self):
+        '''
+        load() CHUNK_SIZE points at a time, yields the data read so far
+        after each chunk, see ProjectReader.readProjectSteps. The columns
+        are added to the PointStore as they are, only the json of keys
+        without a column is decoded.
+        '''
+        data = self.meta()
+        data['Points'] = points = PointStore()
+        ids = array('q')
+        cursor = self.db.execute(
+            'SELECT id, latitude, longitude, COALESCE(timestamp, ?), COALESCE(utc_offset, 0), '
+            'COALESCE(description, \'\'), COALESCE(trace_id, ?), data FROM points ORDER BY id',
+            (NO_DATE, NO_TRACE)
+        )
+
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            rowIds, lat, lon, ts, offsets, descriptions, traces, extra = zip(*rows)
+            points.extendColumns(
+                lat,
+                lon,
+                ts,
+                offsets,
+                descriptions,
+                traces,
+                {i: json.loads(keys) for i, keys in enumerate(extra) if keys is not None}
+            )
+            ids.extend(rowIds)
+            yield data
+
+        self.ids['points'] = ids
+
+        return data
+
+    def summary(self):
+        '''
+        Metadata shown in the project catalog, without reading the points
+        '''
+        data = self.meta()
+
+        return {
+            'ProjectName': data.get('ProjectName'),
+            'Points': self.count(),
+            'Created': data.get('Created'),
+            'LastAccessed': data.get('LastAccessed')
+        }
+
+    def references(self):
+        return [[lat, lon] for lat, lon in self.db.execute(
+            'SELECT latitude, longitude FROM reference_points ORDER BY id'
+        )]
+
+    def count(self):
+        '''
+        Number of points in the project
+        '''
+        if 'points' in self.ids:
+            return len(self.ids['points'])
+
+        return self.db.execute('SELECT COUNT(*) FROM points').fetchone()[0]
+
+    def iterPoints(self, where='', params=(), order='id'):
+        '''
+        Yield point dicts without loading every row at once
+
+        Args:
+            where (str): optional SQL condition
+            params (tuple): parameters of the condition
+            order (str): column to order by
+        '''
+        query = f'SELECT {POINT_COLUMNS} FROM points {"WHERE " + where if where else ""} ORDER BY {order}'
+        cursor = self.db.execute(query, params)
+
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield rowPoint(row)
+
+    def pointsWithin(self, minLat, maxLat, minLon, maxLon):
+        '''
+        Points inside a latitude/longitude box, uses the location index
+        '''
+        return list(self.iterPoints(
+            'latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?',
+            (minLat, maxLat, minLon, maxLon)
+        ))
+
+    def pointsBetween(self, start, end):
+        '''
+        Points dated between two epoch timestamps ordered by date, uses the
+        timestamp index
+        '''
+        return list(self.iterPoints('timestamp BETWEEN ? AND ?', (start, end), order='timestamp'))
+
+    def tableIds(self, table):
+        '''
+        Row ids of a table in insertion order
+        '''
+        if table not in self.ids:
+            self.ids[table] = array('q', (row[0] for row in self.db.execute(f'SELECT id FROM {table} ORDER BY id')))
+
+        return self.ids[table]
+
+    def rowId(self, table, index):
+        '''
+        Row id of the index-th row of a table in insertion order
+        '''
+        try:
+            return self.tableIds(table)[index]
+        except IndexError:
+            raise IndexError(f'{table} index out of range: {index}') from None
+
+    def record(self, op, key, value=None, index=None):
+        '''
+        Apply a single change, see ProjectJournal.record
+        '''
+        try:
+            self.apply(op, key, value, index)
+        except sqlite3.Error:
+            #rolled back, the cached row ids may not match anymore
+            self.ids.clear()
+            raise
+
+    def apply(self, op, key, value, index):
+        with self.db:
+            if key == 'Points':
+                if op == 'add':
+                    ids = self.tableIds('points')
+                    cursor = self.db.execute(INSERT_POINT, pointRow(value))
+                    ids.append(cursor.lastrowid)
+                elif op == 'delete':
+                    self.db.execute('DELETE FROM points WHERE id = ?', (self.rowId('points', index),))
+                    del self.ids['points'][index]
+                elif op == 'edit':
+                    self.db.execute(
+                        'UPDATE points SET latitude = ?, longitude = ?, timestamp = ?, utc_offset = ?, '
+                        'description = ?, trace_id = ?, data = ? WHERE id = ?',
+                        pointRow(value) + (self.rowId('points', index),)
+                    )
+                elif op == 'set':
+                    self.db.execute('DELETE FROM points')
+                    self.insertPoints(value)
+                    self.ids.pop('points', None)
+                else:
+                    raise ValueError(f'Unsupported journal operation: {op}')
+
+            elif key == 'Reference':
+                if op == 'add':
+                    self.writeReferences([value])
+                    self.ids.pop('reference_points', None)
+                elif op == 'delete':
+                    self.db.execute('DELETE FROM reference_points WHERE id = ?', (self.rowId('reference_points', index),))
+                    del self.ids['reference_points'][index]
+                elif op == 'set':
+                    self.db.execute('DELETE FROM reference_points')
+                    self.writeReferences(value)
+                    self.ids.pop('reference_points', None)
+                else:
+                    raise ValueError(f'Unsupported journal operation: {op}')
+
+            elif op == 'set':
+                self.writeMeta({key: value})
+
+            else:
+                #list values other than points and references are small
+                data = self.meta()
+                ProjectJournal.applyOp(data, {'op': op, 'key': key, 'value': value, 'index': index})
+                self.writeMeta({key: data[key]})
+
+    def snapshot(self, data, wait=True):
+        '''
+        Replace all project data, only used when the data was upgraded.
+        Saves of an open project use saveMeta() since record() has already
+        written every change to the points and reference points.
+        '''
+        try:
+            with self.db:
+                self.db.execute('DELETE FROM points')
+                self.db.execute('DELETE FROM reference_points')
+                self.writeMeta(data)
+                self.writeReferences(data.get('Reference') or [])
+                self.insertPoints(data.get('Points') or [])
+        except sqlite3.Error as e:
+            self.error = e
+            return False
+        else:
+            self.error = None
+            return True
+        finally:
+            self.ids.clear()
+
+    def saveMeta(self, data):
+        '''
+        Write the metadata of project data in one transaction
+        '''
+        try:
+            with self.db:
+                self.writeMeta(data)
+        except sqlite3.Error as e:
+            self.error = e
+            return False
+        else:
+            self.error = None
+            return True
+
+    def saveTraces(self, traces):
+        '''
+        Store recorded traces, samples are kept as raw SAMPLE_DTYPE bytes
+        '''
+        with self.db:
+            self.db.executemany(
+                'INSERT INTO traces (trace_id, ref_latitude, ref_longitude, scale, units, samples, point_trace_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(
+                    trace.id,
+                    trace.ref[0],
+                    trace.ref[1],
+                    trace.scale or 0,
+                    trace.units or '',
+                    np.ascontiguousarray(trace.samples, dtype=SAMPLE_DTYPE).tobytes(),
+                    None if trace.point == NO_POINT else trace.point
+                ) for trace in traces]
+            )
+
+    def deleteTraces(self, points):
+        '''
+        Delete the traces of deleted points
+
+        Args:
+            points (list): TraceId of each deleted point
+        '''
+        with self.db:
+            self.db.executemany('DELETE FROM traces WHERE point_trace_id = ?', [(point,) for point in points])
+
+    def loadTraces(self):
+        '''
+        Yield each stored Trace
+        '''
+        for row in self.db.execute('SELECT trace_id, ref_latitude, ref_longitude, scale, units, samples, point_trace_id FROM traces ORDER BY id'):
+            traceId, lat, lon, scale, units, samples, point = row
+
+            #sqlite stores the nan reference of scale traces as NULL
+            ref = (float('nan'), float('nan')) if lat is None else (lat, lon)
+            yield Trace(traceId, ref, scale, units, np.frombuffer(samples, dtype=SAMPLE_DTYPE), NO_POINT if point is None else point)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,119 @@
+import re
+import bisect
+from array import array
+
+import numpy as np
+
+WORD = re.compile(r'\w+')
+
+#Words a prefix must match before all the word/code pairs are scanned
+#instead of each word's codes
+BROAD_PREFIX = 1024
+
+def tokenize(text):
+    '''
+    Casefolded words of a text
+    '''
+    return WORD.findall((text or '').casefold())
+
+def matches(query, text):
+    '''
+    True if every word of the query starts a word of text, the same test
+    SearchIndex.search() applies to a single text
+    '''
+    words = tokenize(text)
+    return all(any(word.startswith(prefix) for word in words) for prefix in tokenize(query))
+
+class SearchIndex():
+    '''
+    Inverted index from the words of point descriptions to the points that
+    contain them. Points share interned descriptions (see PointStore) so
+    each word maps to the codes of the distinct descriptions containing it,
+    and codes are turned into points with the store's description code
+    column. The string table only grows, so keeping the index current as
+    points are added, edited or deleted means indexing the descriptions
+    added since the last search, deleted points simply have no row.
+
+    Codes are indexed in increasing order so each word's codes are an
+    append-only int32 array, which numpy reads without copying.
+
+    Queries match descriptions containing every word of the query, each
+    word of the query may be the start of a word ('riv' finds 'River').
+    '''
+    def __init__(self, strings):
+        '''
+        Args:
+            strings (list): string table of a PointStore, read as it grows
+        '''
+        self.strings = strings
+        self.indexed = 0
+
+        #word -> array of description codes, and every word in sorted order
+        #so the words starting with a prefix are found with a binary search
+        self.postings = {}
+        self.words = []
+
+        #every (word number, code) pair, scanned at once by prefixes that
+        #match too many words to read their arrays one at a time
+        self.numbers = {}
+        self.pairWords = array('i')
+        self.pairCodes = array('i')
+
+    def update(self):
+        '''
+        Index the descriptions added since the last update
+        '''
+        new = []
+        for code in range(self.indexed, len(self.strings)):
+            for word in set(tokenize(self.strings[code])):
+                codes = self.postings.get(word)
+                if codes is None:
+                    codes = self.postings[word] = array('i')
+                    self.numbers[word] = len(self.numbers)
+                    new.append(word)
+                codes.append(code)
+                self.pairWords.append(self.numbers[word])
+                self.pairCodes.append(code)
+        self.indexed = len(self.strings)
+
+        if len(new) > 64:
+            self.words = sorted(self.words + new)
+        else:
+            for word in new:
+                bisect.insort(self.words, word)
+
+    def prefixed(self, prefix):
+        '''
+        Boolean array over the codes, True for descriptions with a word
+        starting with prefix
+        '''
+        hit = np.zeros(len(self.strings), dtype=bool)
+        start = bisect.bisect_left(self.words, prefix)
+        end = bisect.bisect_left(self.words, prefix + '\U0010ffff', start)
+        if end - start > BROAD_PREFIX:
+            selected = np.zeros(len(self.numbers), dtype=bool)
+            selected[[self.numbers[word] for word in self.words[start:end]]] = True
+            pairCodes = np.frombuffer(self.pairCodes, dtype=np.int32)
+            hit[pairCodes[selected[np.frombuffer(self.pairWords, dtype=np.int32)]]] = True
+        else:
+            for word in self.words[start:end]:
+                hit[np.frombuffer(self.postings[word], dtype=np.int32)] = True
+
+        return hit
+
+    def search(self, query):
+        '''
+        Descriptions matching a query
+
+        Returns:
+            boolean array over the description codes or None if the query
+            has no words
+        '''
+        self.update()
+
+        result = None
+        for prefix in set(tokenize(query)):
+            hit = self.prefixed(prefix)
+            result = hit if result is None else result & hit
+
+        return result
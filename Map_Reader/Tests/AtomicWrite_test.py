@@ -0,0 +1,46 @@
+import os
+import json
+import pytest
+
+from Map_Reader import AtomicWrite
+
+def test_1(tmp_path):
+    '''
+    Test each write keeps the previous generations as backups
+    '''
+    path = str(tmp_path / 'data.json')
+    for i in range(4):
+        AtomicWrite.writeJson(path, {'Version': i})
+
+    versions = [json.loads(open(p).read())['Version'] for p in [path] + AtomicWrite.backupPaths(path)]
+    assert versions == [3, 2, 1]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_2(tmp_path):
+    '''
+    Test a damaged file is read from its newest readable backup
+    '''
+    path = str(tmp_path / 'data.json')
+    AtomicWrite.writeJson(path, {'Version': 1})
+    AtomicWrite.writeJson(path, {'Version': 2})
+    with open(path, 'w') as f:
+        f.write('{"Vers')
+
+    assert AtomicWrite.readRecovering(path) == ({'Version': 1}, path + '.bak1')
+
+    os.remove(path + '.bak1')
+    with pytest.raises(ValueError):
+        AtomicWrite.readRecovering(path)
+
+def test_3(tmp_path):
+    '''
+    Test temp files of unfinished writes are removed
+    '''
+    path = str(tmp_path / 'data.json')
+    tmp = AtomicWrite.writeTemp(path, '{}', fsync='never')
+    AtomicWrite.writeJson(str(tmp_path / 'other.json'), {})
+
+    AtomicWrite.removeTemp(path)
+
+    assert not os.path.exists(tmp)
+    assert sorted(os.listdir(tmp_path)) == ['other.json']
@@ -0,0 +1,73 @@
+from Map_Reader.ChangeSet import ChangeSet
+
+def test_1():
+    '''
+    Test changes are kept in order per key and cleared when taken
+    '''
+    changes = ChangeSet()
+    assert not changes
+
+    changes.record('add', 'Points', 3)
+    changes.record('delete', 'Points', 0)
+    changes.record('add', 'Reference', 1)
+    changes.record('edit', 'Points', 2)
+
+    assert changes
+    assert changes.take() == {
+        'Points': [('add', 3), ('delete', 0), ('edit', 2)],
+        'Reference': [('add', 1)]
+    }
+    assert not changes
+    assert changes.take() == {}
+
+def test_2():
+    '''
+    Test setting a key replaces the changes recorded before it
+    '''
+    changes = ChangeSet()
+    changes.record('add', 'Points', 0)
+    changes.record('set', 'Points', None)
+    changes.record('add', 'Points', 0)
+    changes.record('set', 'Scale')
+
+    assert changes.take() == {'Points': [('set', None), ('add', 0)], 'Scale': [('set', None)]}
+
+def test_3():
+    '''
+    Test the final row of each change follows the changes after it
+    '''
+    from Map_Reader.ChangeSet import finalRows
+
+    assert finalRows([('add', 5)]) == [5]
+    assert finalRows([('add', 5), ('delete', 2), ('add', 0), ('edit', 1)]) == [5, 3, 0, 1]
+    assert finalRows([('add', 5), ('delete', 5)]) == [None, 5]
+    assert finalRows([('edit', 3), ('set', None)]) == [None, None]
+
+def test_4():
+    '''
+    Test final rows match replaying the later changes on a list
+    '''
+    import random
+    from Map_Reader.ChangeSet import finalRows
+
+    rng = random.Random(4)
+    for trial in range(200):
+        size = rng.randrange(0, 6)
+        changes = []
+        for k in range(rng.randrange(1, 30)):
+            op = rng.choice(['add', 'delete', 'edit'] if size else ['add'])
+            index = rng.randrange(size + (op == 'add'))
+            size += {'add': 1, 'delete': -1, 'edit': 0}[op]
+            changes.append((op, index))
+
+        expected = []
+        for k, (op, index) in enumerate(changes):
+            tracked = [row == index for row in range(size + len(changes))]
+            for laterOp, later in changes[k + 1:]:
+                if laterOp == 'add':
+                    tracked.insert(later, False)
+                elif laterOp == 'delete':
+                    del tracked[later]
+            expected.append(tracked.index(True) if True in tracked else None)
+
+        assert finalRows(changes) == expected
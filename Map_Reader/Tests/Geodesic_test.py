@@ -0,0 +1,82 @@
+import pytest
+import numpy as np
+from geopy.distance import geodesic
+
+from Map_Reader import Geodesic
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    n = 500
+    lat = rng.uniform(-89, 89, n)
+    lon = rng.uniform(-180, 180, n)
+    dist = rng.uniform(0, 1000e3, n)
+    bearing = rng.uniform(0, 360, n)
+    return lat, lon, dist, bearing
+
+def test_1(samples):
+    '''
+    Test scalar solver matches geopy to sub-millimetre
+    '''
+    for lat, lon, dist, bearing in zip(*samples):
+        expected = geodesic(meters=dist).destination((lat, lon), bearing)
+        result = Geodesic.destination(lat, lon, dist, bearing)
+
+        assert geodesic((expected.latitude, expected.longitude), result).meters < 1e-3
+
+def test_2(samples):
+    '''
+    Test batched solver agrees with scalar solver
+    '''
+    lat2, lon2 = Geodesic.destinations(*samples)
+
+    for i, (lat, lon, dist, bearing) in enumerate(zip(*samples)):
+        result = Geodesic.destination(lat, lon, dist, bearing)
+
+        assert lat2[i] == pytest.approx(result[0], abs=1e-10)
+        assert lon2[i] == pytest.approx(result[1], abs=1e-10)
+
+def test_3():
+    '''
+    Test single reference broadcasts against arrays of distances and bearings
+    '''
+    lat2, lon2 = Geodesic.destinations(38.5, -121.5, [0, 1000, 2000], [0, 90, 180])
+
+    assert lat2.shape == (3,)
+    assert lat2[0] == pytest.approx(38.5)
+    assert lon2[0] == pytest.approx(-121.5)
+
+def test_4():
+    '''
+    Test unit conversion matches geopy's unit handling
+    '''
+    assert Geodesic.toMeters(1, 'km') == geodesic(kilometers=1).meters
+    assert Geodesic.toMeters(1, 'mi') == pytest.approx(geodesic(miles=1).meters)
+    assert Geodesic.toMeters(1, 'ft') == pytest.approx(geodesic(feet=1).meters)
+
+    with pytest.raises(ValueError):
+        Geodesic.toMeters(1, 'yd')
+
+def test_5():
+    '''
+    Test tangent plane preview stays within its reported error bound
+    '''
+    plane = Geodesic.TangentPlane(38.5, -121.5, unit=1000)
+
+    for dist in [0.5, 5, 50]:
+        bound = plane.maxError(dist)
+        for bearing in [10, 100, 200, 300]:
+            lat, lon = plane.destination(dist, bearing)
+            lat2, lon2 = Geodesic.destination(38.5, -121.5, dist * 1000, bearing)
+
+            assert plane.error(lat, lon, lat2, lon2) <= bound * 1.01
+
+def test_6():
+    '''
+    Test tangent plane error is negligible for short traces and grows with distance
+    '''
+    plane = Geodesic.TangentPlane(38.5, -121.5, unit=1000)
+
+    assert plane.locate(0, 0) == (38.5, -121.5)
+    assert plane.maxError(0.1) < 1e-2
+    assert plane.maxError(10) < plane.maxError(100)
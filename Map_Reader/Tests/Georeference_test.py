@@ -0,0 +1,99 @@
+import pytest
+import numpy as np
+from Map_Reader import Georeference
+from Map_Reader import TraceEngine
+
+@pytest.fixture
+def controlPoints():
+    '''
+    Control points of a map rotated 30 degrees and skewed, 1 pixel ~ 1e-5 degrees
+    '''
+    theta = np.radians(30)
+    matrix = 1e-5 * np.array([
+        [np.cos(theta), np.sin(theta) + 0.1],
+        [-np.sin(theta), np.cos(theta)]
+    ])
+    pixels = np.array([[0, 0], [800, 50], [120, 600], [-400, 300], [500, -450]], dtype=float)
+    coords = pixels @ matrix.T + (38.5, -121.5)
+
+    return pixels, coords
+
+def test_1(controlPoints):
+    '''
+    Test affine fit reproduces the control points
+    '''
+    pixels, coords = controlPoints
+    transform = Georeference.GeoTransform.fit(pixels[:3], coords[:3], 'affine')
+
+    assert transform.kind == 'affine'
+    assert np.allclose(transform.applyMany(pixels), coords, atol=1e-9)
+    assert transform.residuals(pixels, coords).max() < 1e-3
+
+def test_2(controlPoints):
+    '''
+    Test homography is only fitted when asked for
+    '''
+    pixels, coords = controlPoints
+    assert Georeference.GeoTransform.fit(pixels, coords).kind == 'affine'
+
+    transform = Georeference.GeoTransform.fit(pixels, coords, 'homography')
+    assert transform.kind == 'homography'
+    assert np.allclose(transform.applyMany(pixels), coords, atol=1e-9)
+
+def test_3(controlPoints):
+    '''
+    Test scalar apply and inverse agree with the batch transform
+    '''
+    pixels, coords = controlPoints
+    transform = Georeference.GeoTransform.fit(pixels, coords)
+
+    lat, lon = transform.apply(250.0, -75.0)
+    assert np.allclose((lat, lon), transform.applyMany([(250.0, -75.0)])[0])
+    assert np.allclose(transform.inverse(lat, lon), (250.0, -75.0), atol=1e-6)
+
+def test_4():
+    '''
+    Test too few control points
+    '''
+    with pytest.raises(ValueError):
+        Georeference.GeoTransform.fit([(0, 0), (1, 0), (0, 1)], [(0, 0), (0, 1), (1, 0)], 'homography')
+
+    assert Georeference.fromControlPoints([{'X': 0, 'Y': 0, 'Latitude': 1, 'Longitude': 2}]) is None
+
+def test_7():
+    '''
+    Test collinear control points are rejected
+    '''
+    collinear = [
+        {'X': x, 'Y': 2 * x, 'Latitude': 38 + x * 1e-5, 'Longitude': -121 + x * 1e-5}
+        for x in (0, 100, 250, 400)
+    ]
+    assert Georeference.fromControlPoints(collinear) is None
+    assert Georeference.fromControlPoints(collinear, 'homography') is None
+
+    with pytest.raises(ValueError):
+        Georeference.GeoTransform.fit([(0, 0), (0, 0), (0, 0)], [(0, 0), (0, 1), (1, 0)])
+
+def test_5():
+    '''
+    Test control points across the antimeridian
+    '''
+    pixels = [(0, 0), (100, 0), (0, 100)]
+    coords = [(0.0, 179.9995), (0.0, -179.9995), (0.001, 179.9995)]
+    transform = Georeference.GeoTransform.fit(pixels, coords)
+
+    assert np.allclose(transform.apply(50, 0), (0.0, 180.0)) or np.allclose(transform.apply(50, 0), (0.0, -180.0))
+
+def test_6(controlPoints):
+    '''
+    Test engine locates traces with the transform
+    '''
+    pixels, coords = controlPoints
+    transform = Georeference.GeoTransform.fit(pixels, coords)
+
+    engine = TraceEngine.TraceEngine(tuple(coords[1]), 100, 'km', transform)
+    engine.move(*(pixels[2] - pixels[1]))
+    engine.solve()
+
+    assert np.allclose(engine.newLoc, coords[2], atol=1e-6)
+    assert engine.previewError == 0
@@ -0,0 +1,91 @@
+import time
+import pytest
+import numpy as np
+from geopy.distance import geodesic
+from geographiclib.geodesic import Geodesic
+
+from Map_Reader import LocationSolver
+from Map_Reader import TraceEngine
+
+TARGET = (38.55, -121.45)
+
+def observations(refs, target=TARGET):
+    '''
+    Exact distance and bearing from each reference to the target
+    '''
+    dists, bearings = [], []
+    for lat, lon in refs:
+        inv = Geodesic.WGS84.Inverse(lat, lon, target[0], target[1])
+        dists.append(inv['s12'])
+        bearings.append(inv['azi1'] % 360)
+    return np.array(dists), np.array(bearings)
+
+def test_1():
+    '''
+    Test exact observations from three references recover the target
+    '''
+    refs = [(38.5, -121.5), (38.6, -121.5), (38.55, -121.35)]
+    dists, bearings = observations(refs)
+    solution = LocationSolver.solve(refs, dists, bearings)
+
+    assert geodesic(TARGET, (solution.lat, solution.lon)).meters < 1
+    assert np.abs(solution.residuals).max() < 1
+
+def test_2():
+    '''
+    Test range errors are shared between references and reported as residuals
+    '''
+    refs = [(38.5, -121.5), (38.6, -121.5), (38.55, -121.35), (38.5, -121.4)]
+    dists, bearings = observations(refs)
+    dists = dists + np.array([50, -50, 50, -50])
+    solution = LocationSolver.solve(refs, dists, bearings)
+
+    assert geodesic(TARGET, (solution.lat, solution.lon)).meters < 100
+    assert len(solution.residuals) == 4
+    assert np.abs(solution.residuals).max() > 1
+
+def test_3():
+    '''
+    Test one circle inside another still gives a finite answer
+    '''
+    refs = [(38.5, -121.5), (38.501, -121.5)]
+    solution = LocationSolver.solve(refs, [10000, 100], [0, 0])
+
+    assert np.isfinite([solution.lat, solution.lon]).all()
+
+def test_4():
+    '''
+    Test a single reference gives the traced location
+    '''
+    dists, bearings = observations([(38.5, -121.5)])
+    solution = LocationSolver.solve([(38.5, -121.5)], dists, bearings)
+
+    assert geodesic(TARGET, (solution.lat, solution.lon)).meters < 1
+
+def test_5():
+    '''
+    Test dozens of references are solved quickly
+    '''
+    rng = np.random.default_rng(0)
+    refs = np.column_stack((rng.uniform(38.4, 38.7, 60), rng.uniform(-121.6, -121.3, 60)))
+    dists, bearings = observations(refs)
+
+    start = time.perf_counter()
+    solution = LocationSolver.solve(refs, dists + rng.normal(0, 20, 60), bearings)
+
+    assert time.perf_counter() - start < 0.5
+    assert geodesic(TARGET, (solution.lat, solution.lon)).meters < 50
+
+def test_6():
+    '''
+    Test circle averaging uses the solver with traced units
+    '''
+    refs = [(38.5, -121.5), (38.6, -121.5), (38.55, -121.35)]
+    dists, bearings = observations(refs)
+    traceData = [
+        {'Reference': ref, 'Distance_Actual': d / 1000, 'Bearing': b, 'Units': 'km'}
+        for ref, d, b in zip(refs, dists, bearings)
+    ]
+    newLoc = TraceEngine.averageData(traceData, circle=True)
+
+    assert geodesic(TARGET, newLoc).meters < 1
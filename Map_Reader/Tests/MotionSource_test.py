@@ -0,0 +1,139 @@
+import os
+import math
+import struct
+import pytest
+import numpy as np
+from PyQt5.QtWidgets import QMessageBox, QApplication
+
+from Map_Reader import Tracker
+from Map_Reader.MotionSource import MotionSource, SyntheticMotionSource, EvdevMotionSource, EVENT_FORMAT, EV_REL, REL_X, REL_Y
+
+def event(evType, code, value):
+    return struct.pack(EVENT_FORMAT, 0, 0, evType, code, value)
+
+@pytest.fixture
+def fifo(tmp_path):
+    path = str(tmp_path / 'event0')
+    os.mkfifo(path)
+    source = EvdevMotionSource([path])
+    writer = os.open(path, os.O_WRONLY)
+    yield source, writer
+    os.close(writer)
+    source.close()
+
+@pytest.fixture
+def noPrompt(monkeypatch):
+    monkeypatch.setattr(QMessageBox, 'information', lambda *args: QMessageBox.Ok)
+
+def test_1():
+    '''
+    Test zero drift over a long synthetic trace read at irregular intervals
+    '''
+    rng = np.random.default_rng(0)
+    deltas = rng.integers(-40, 41, size=(200000, 2))
+    source = SyntheticMotionSource()
+    dx = dy = 0
+
+    for chunk in np.array_split(deltas, 5000):
+        source.extend(map(tuple, chunk.tolist()))
+        x, y = source.read()
+        dx += x
+        dy += y
+
+    assert (dx, dy) == tuple(deltas.sum(axis=0).tolist())
+
+def test_2():
+    '''
+    Test tracing out and back to the start returns exactly to zero
+    '''
+    rng = np.random.default_rng(1)
+    deltas = rng.integers(-40, 41, size=(100000, 2)).tolist()
+    source = SyntheticMotionSource(map(tuple, deltas))
+    source.extend((-x, -y) for x, y in reversed(deltas))
+
+    assert source.read() == (0, 0)
+    assert source.read() == (0, 0)
+
+def test_3(fifo):
+    '''
+    Test relative events are parsed from an evdev stream and other events ignored
+    '''
+    source, writer = fifo
+    os.write(writer, event(EV_REL, REL_X, 5) + event(EV_REL, REL_Y, -3) + event(0, 0, 0) + event(EV_REL, 8, 1))
+
+    assert source.read() == (5, -3)
+    assert source.read() == (0, 0)
+
+def test_4(fifo):
+    '''
+    Test events split across reads are not lost
+    '''
+    source, writer = fifo
+    data = event(EV_REL, REL_X, 7) + event(EV_REL, REL_Y, 2)
+    os.write(writer, data[:30])
+
+    assert source.read() == (7, 0)
+
+    os.write(writer, data[30:])
+
+    assert source.read() == (0, 2)
+
+def test_5():
+    '''
+    Test error is raised when no device can be opened
+    '''
+    with pytest.raises(OSError):
+        EvdevMotionSource(['/nonexistent/event0'])
+
+def test_6(qtbot, noPrompt):
+    '''
+    Test a scale traced from a synthetic source polled at irregular intervals
+    has no drift and doesn't need the Windows mouse settings
+    '''
+    rng = np.random.default_rng(2)
+    deltas = rng.integers(-40, 41, size=(20000, 2))
+    source = SyntheticMotionSource()
+    tracker = Tracker.Tracker(motionSource=source)
+    qtbot.addWidget(tracker)
+
+    assert tracker.mouseController is None
+
+    tracker.startTracking()
+    for chunk in np.array_split(deltas, 700):
+        source.extend(map(tuple, chunk.tolist()))
+        tracker.refresh()
+    tracker.stopTracking()
+
+    dx, dy = deltas.sum(axis=0).tolist()
+    assert (tracker.engine.dx, tracker.engine.dy) == (dx, -dy)
+    assert tracker.engine.dist_px == pytest.approx(math.hypot(dx, dy))
+
+def test_7(qtbot, noPrompt):
+    '''
+    Test a location trace from a synthetic source converts the traced
+    counts to distance with the scale
+    '''
+    source = SyntheticMotionSource()
+    tracker = Tracker.TrackerLoc([(38.5, -121.5)], 100, 'km', motionSource=source)
+    qtbot.addWidget(tracker)
+
+    tracker.mousePressEvent(None)
+    for _ in range(50):
+        source.push(6, 0)
+        tracker.refresh()
+        source.push(0, -8)
+    tracker.stopTracking()
+    QApplication.restoreOverrideCursor()
+    tracker.engine.solve()
+
+    assert (tracker.engine.dx, tracker.engine.dy) == (300, 400)
+    assert tracker.engine.dist_px == 500
+    assert tracker.engine.dist == pytest.approx(5)
+    assert tracker.engine.bearing == pytest.approx(math.degrees(math.atan2(300, 400)))
+
+def test_8():
+    '''
+    Test a motion source has to implement read()
+    '''
+    with pytest.raises(TypeError):
+        MotionSource()
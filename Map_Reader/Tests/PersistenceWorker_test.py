@@ -0,0 +1,69 @@
+import time
+import threading
+import pytest
+
+from Map_Reader.PersistenceWorker import PersistenceWorker
+
+@pytest.fixture
+def worker(qtbot):
+    return PersistenceWorker(delay=20)
+
+def test_1(worker, qtbot):
+    '''
+    Test requests for the same key are coalesced into the latest one
+    '''
+    written = []
+
+    with qtbot.waitSignal(worker.saved, timeout=2000) as blocker:
+        for i in range(10):
+            worker.submit('settings', written.append, i)
+
+    assert blocker.args == ['settings']
+    worker.flush()
+    assert written == [9]
+
+def test_2(worker, qtbot):
+    '''
+    Test writes run off the GUI thread and failures are reported
+    '''
+    threads = []
+
+    def fail():
+        threads.append(threading.get_ident())
+        raise OSError('disk full')
+
+    with qtbot.waitSignal(worker.failed, timeout=2000) as blocker:
+        worker.submit('project', fail)
+
+    assert blocker.args[0] == 'project'
+    assert 'disk full' in blocker.args[1]
+    assert threads[0] != threading.get_ident()
+
+def test_3(worker, qtbot):
+    '''
+    Test a request made while the same key is being written runs after it
+    '''
+    written = []
+
+    def slowWrite(value):
+        time.sleep(0.05)
+        written.append(value)
+
+    worker.submit('project', slowWrite, 1)
+    worker.dispatch()
+    worker.submit('project', slowWrite, 2)
+    worker.flush()
+
+    assert written == [1, 2]
+
+def test_4(worker):
+    '''
+    Test flush writes everything queued without waiting for the delay
+    '''
+    written = []
+    worker.submit('a', written.append, 'a')
+    worker.submit('b', lambda: False)
+    worker.flush()
+
+    assert written == ['a']
+    assert not worker.pending and not worker.running
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from Map_Reader.PointStore import PointStore
+
+@pytest.fixture
+def points():
+    return [{
+        'Latitude': 40.0 + i / 100,
+        'Longitude': -105.0 - i / 100,
+        'Timestamp': 1578263400 + i * 86400,
+        'UTCOffset': -25200,
+        'Description': 'Tree' if i % 2 else 'Rock'
+    } for i in range(10)]
+
+def test_1(points):
+    '''
+    Test points round trip to the same dicts
+    '''
+    store = PointStore(points)
+
+    assert len(store) == 10
+    assert store.toDicts() == points
+    assert store[-1] == points[-1]
+    assert store[2:4] == points[2:4]
+
+def test_2(points):
+    '''
+    Test appending past the capacity grows the columns and keeps the data
+    '''
+    store = PointStore(capacity=2)
+    ids = [store.append(p) for p in points]
+
+    assert ids == list(range(10))
+    assert list(store) == points
+    assert np.allclose(store.lat, [p['Latitude'] for p in points])
+    assert len(store.strings) == 3
+
+def test_3(points):
+    '''
+    Test deleting keeps the ids of the remaining points
+    '''
+    store = PointStore(points)
+    del store[3]
+    del store[0]
+
+    assert len(store) == 8
+    assert store.toDicts() == points[1:3] + points[4:]
+    assert store.ids.tolist() == [1, 2, 4, 5, 6, 7, 8, 9]
+    assert store.indexOf(4) == 2
+    assert store.indexOf(3) == -1
+    with pytest.raises(IndexError):
+        del store[8]
+
+def test_4(points):
+    '''
+    Test unparsable dates and extra keys are kept, and the frame and map
+    points match the stored points
+    '''
+    odd = {
+        'Latitude': 1.0,
+        'Longitude': 2.0,
+        'Timestamp': None,
+        'UTCOffset': None,
+        'Description': '',
+        'Date': 'yesterday',
+        'Bearing': 90.0
+    }
+    store = PointStore(points + [odd])
+
+    assert store[-1] == odd
+    df = store.toFrame()
+    assert df['Latitude'].tolist() == [p['Latitude'] for p in points] + [1.0]
+    assert df['Description'].iloc[1] == 'Tree'
+    assert df['Date'].iloc[-1] == 'yesterday'
+    assert store.mapPoints(1, 3) == store.mapPoints()[1:3]
+    assert store.mapPoints(len(store) - 1, len(store))[0]['Date'] == 'yesterday'
+    assert store.mapPoints()[0] == {
+        'Point': {'lat': 40.0, 'lng': -105.0},
+        'Description': 'Rock',
+        'Date': '01-05-2020 03:30:00 pm'
+    }
+
+def test_5(points):
+    '''
+    Test sort keys are typed and descriptions sort and search ignoring case
+    '''
+    store = PointStore(points)
+    store.append(dict(points[0], Description='apple'))
+
+    assert store.sortKey('Latitude') is not None and store.sortKey('Latitude').dtype == np.float64
+    assert store.sortKey('Timestamp').tolist() == store.time.tolist()
+    assert store.sortKey('Bearing') is None
+
+    order = np.argsort(store.sortKey('Description'), kind='stable')
+    assert [store.strings[code] for code in store.descriptionCodes[order]] == ['apple'] + ['Rock'] * 5 + ['Tree'] * 5
+    assert np.flatnonzero(store.search('TRE')).tolist() == [1, 3, 5, 7, 9]
+
+def test_6(points):
+    '''
+    Test the TraceId of located points is kept in its own column
+    '''
+    store = PointStore(points)
+    located = dict(points[0], TraceId=1600000000123)
+    store.append(located)
+    store[0] = dict(points[0], TraceId=5, Note='kept')
+
+    assert store[-1] == located
+    assert store.cell(len(store) - 1, 'TraceId') == 1600000000123
+    assert store.cell(1, 'TraceId') is None
+    assert store[0] == dict(points[0], TraceId=5, Note='kept')
+    assert store.extra == {0: {'Note': 'kept'}}
+    assert 'TraceId' not in store[1]
+
+def test_7(points):
+    '''
+    Test a frozen store keeps its rows while the store changes and only
+    deletes and edits copy the columns
+    '''
+    store = PointStore(points, capacity=20)
+    frozen = store.frozen()
+
+    store.append(dict(points[0], Description='New'))
+    assert store.lat.base is frozen.lat.base
+
+    del store[0]
+    store[0] = dict(points[0], Note='kept')
+
+    assert store.lat.base is not frozen.lat.base
+    assert list(frozen) == points
+    assert frozen.extra == {}
+    assert len(store) == 10 and store[-1]['Description'] == 'New'
+
+    del frozen
+    lat = store.lat.base
+    del store[0]
+    assert store.lat.base is lat
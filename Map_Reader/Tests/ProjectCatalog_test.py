@@ -0,0 +1,106 @@
+import os
+import json
+import pytest
+
+from Map_Reader import ProjectCatalog
+from Map_Reader import ProjectJournal
+
+def writeProject(directory, name, points):
+    os.makedirs(directory / name, exist_ok=True)
+    with open(directory / name / ProjectJournal.SNAPSHOT_NAME, 'w') as f:
+        f.write(json.dumps({'ProjectName': name, 'Created': 'today', 'Points': [{}] * points}))
+
+@pytest.fixture
+def projects(tmp_path):
+    writeProject(tmp_path, 'A', 3)
+    writeProject(tmp_path, 'B', 5)
+    return tmp_path
+
+@pytest.fixture
+def summarize(projects):
+    '''
+    Summarize callback counting how many projects were read
+    '''
+    calls = []
+
+    def summarize(name):
+        calls.append(name)
+        data = ProjectJournal.loadProject(str(projects / name))[0]
+        return {'ProjectName': data['ProjectName'], 'Points': len(data['Points']), 'Created': data['Created']}
+
+    summarize.calls = calls
+    return summarize
+
+def test_1(projects, summarize):
+    '''
+    Test projects are only read when they aren't cataloged
+    '''
+    catalog = ProjectCatalog.ProjectCatalog(str(projects), summarize)
+    entries = catalog.projects()
+
+    assert [(e['ProjectName'], e['Points']) for e in entries] == [('A', 3), ('B', 5)]
+    assert summarize.calls == ['A', 'B']
+
+    catalog = ProjectCatalog.ProjectCatalog(str(projects), summarize)
+    catalog.projects()
+
+    assert summarize.calls == ['A', 'B']
+
+def test_2(projects, summarize):
+    '''
+    Test changed, new and removed projects are detected
+    '''
+    ProjectCatalog.ProjectCatalog(str(projects), summarize).projects()
+
+    writeProject(projects, 'A', 7)
+    os.utime(projects / 'A' / ProjectJournal.SNAPSHOT_NAME, ns=(1, 1))
+    writeProject(projects, 'C', 1)
+    os.remove(projects / 'B' / ProjectJournal.SNAPSHOT_NAME)
+    os.rmdir(projects / 'B')
+
+    entries = ProjectCatalog.ProjectCatalog(str(projects), summarize).projects()
+
+    assert [(e['ProjectName'], e['Points']) for e in entries] == [('A', 7), ('C', 1)]
+    assert summarize.calls == ['A', 'B', 'A', 'C']
+
+def test_3(projects, summarize):
+    '''
+    Test entries updated by the app are trusted without reading the project
+    '''
+    catalog = ProjectCatalog.ProjectCatalog(str(projects), summarize)
+    catalog.projects()
+
+    writeProject(projects, 'B', 6)
+    catalog.update('B', {'ProjectName': 'B', 'Points': 6})
+    catalog.save()
+
+    entries = ProjectCatalog.ProjectCatalog(str(projects), summarize).projects()
+
+    assert entries[1]['Points'] == 6
+    assert entries[1]['Size'] == os.path.getsize(projects / 'B' / ProjectJournal.SNAPSHOT_NAME)
+    assert summarize.calls == ['A', 'B']
+
+def test_4(projects, summarize):
+    '''
+    Test unreadable projects are cached until their files change
+    '''
+    with open(projects / 'B' / ProjectJournal.SNAPSHOT_NAME, 'w') as f:
+        f.write('{"Points": [')
+
+    def failing(name):
+        try:
+            return summarize(name)
+        except ValueError:
+            return False
+
+    entries = ProjectCatalog.ProjectCatalog(str(projects), failing).projects()
+    assert [(e['ProjectName'], e['Points']) for e in entries] == [('A', 3), ('B', None)]
+
+    entries = ProjectCatalog.ProjectCatalog(str(projects), failing).projects()
+    assert entries[1]['Points'] is None
+    assert summarize.calls == ['A', 'B']
+
+    writeProject(projects, 'B', 2)
+    os.utime(projects / 'B' / ProjectJournal.SNAPSHOT_NAME, ns=(1, 1))
+    entries = ProjectCatalog.ProjectCatalog(str(projects), failing).projects()
+    assert entries[1]['Points'] == 2
@@ -0,0 +1,206 @@
+import os
+import json
+import pytest
+
+from Map_Reader import ProjectJournal
+from Map_Reader import ProjectReader
+from Map_Reader.PointStore import PointStore
+
+@pytest.fixture
+def project(tmp_path):
+    '''
+    Project directory with an empty snapshot
+    '''
+    data = {
+        'ProjectName': 'Test',
+        'Reference': [[38.5, -121.5]],
+        'Scale': 0,
+        'Units': '',
+        'Points': []
+    }
+    with open(tmp_path / ProjectJournal.SNAPSHOT_NAME, 'w') as f:
+        f.write(json.dumps(data))
+
+    return str(tmp_path)
+
+def point(i):
+    return {'Latitude': i, 'Longitude': -i, 'Description': f'Point {i}'}
+
+def test_1(project):
+    '''
+    Test operations are appended to the journal and replayed on load
+    '''
+    journal = ProjectJournal.ProjectJournal(project)
+    for i in range(5):
+        journal.record('add', 'Points', point(i))
+    journal.record('delete', 'Points', index=1)
+    journal.record('edit', 'Points', point(10), index=0)
+    journal.record('set', 'Scale', 12.5)
+
+    with open(os.path.join(project, ProjectJournal.SNAPSHOT_NAME)) as f:
+        assert json.loads(f.read())['Points'] == []
+
+    data = ProjectJournal.loadProject(project)[0]
+
+    assert data['Points'] == [point(10), point(2), point(3), point(4)]
+    assert data['Scale'] == 12.5
+    assert data == journal.data
+
+def test_2(project):
+    '''
+    Test compaction folds the journal into the snapshot
+    '''
+    journal = ProjectJournal.ProjectJournal(project, compactEvery=4)
+    for i in range(10):
+        journal.record('add', 'Points', point(i))
+    journal.join()
+
+    data, seq, pending = ProjectJournal.loadProject(project)
+
+    assert [p['Latitude'] for p in data['Points']] == list(range(10))
+    assert seq == 10
+    assert pending == 2
+
+    journal.close()
+
+    assert ProjectJournal.loadProject(project)[2] == 0
+    assert os.path.getsize(os.path.join(project, ProjectJournal.JOURNAL_NAME)) == 0
+
+def test_3(project):
+    '''
+    Test entries already in the snapshot aren't applied twice after an
+    interrupted compaction and a partially written line is ignored
+    '''
+    journal = ProjectJournal.ProjectJournal(project)
+    journal.record('add', 'Points', point(1))
+    journal.record('add', 'Points', point(2))
+    journal.compact(wait=True)
+    journal.file.close()
+
+    #rotated journal left behind with entries the snapshot already has
+    path = os.path.join(project, ProjectJournal.JOURNAL_NAME)
+    with open(path + '.1', 'w') as f:
+        f.write(json.dumps({'seq': 2, 'op': 'add', 'key': 'Points', 'value': point(2)}) + '\n')
+    with open(path, 'w') as f:
+        f.write(json.dumps({'seq': 3, 'op': 'add', 'key': 'Points', 'value': point(3)}) + '\n')
+        f.write('{"seq": 4, "op": "add"')
+
+    journal = ProjectJournal.ProjectJournal(project)
+
+    assert journal.data['Points'] == [point(1), point(2), point(3)]
+    assert not os.path.exists(path + '.1')
+
+    journal.record('add', 'Points', point(4))
+    journal.close()
+
+    assert ProjectJournal.loadProject(project)[0]['Points'] == [point(i) for i in range(1, 5)]
+
+def test_4(project):
+    '''
+    Test invalid operations aren't written
+    '''
+    journal = ProjectJournal.ProjectJournal(project)
+
+    with pytest.raises(IndexError):
+        journal.record('delete', 'Points', index=3)
+    with pytest.raises(ValueError):
+        journal.record('move', 'Points', point(1))
+
+    journal.record('add', 'Points', point(1))
+    journal.close()
+
+    assert ProjectJournal.loadProject(project)[0]['Points'] == [point(1)]
+
+def test_5(project):
+    '''
+    Test a truncated snapshot is restored from its backup on open
+    '''
+    journal = ProjectJournal.ProjectJournal(project, compactEvery=2)
+    for i in range(4):
+        journal.record('add', 'Points', point(i))
+    journal.close()
+
+    path = os.path.join(project, ProjectJournal.SNAPSHOT_NAME)
+    with open(path, 'r+') as f:
+        f.truncate(20)
+
+    journal = ProjectJournal.ProjectJournal(project)
+
+    assert journal.recovered == path + '.bak1'
+    assert journal.data['Points'] == [point(0), point(1)]
+    assert os.path.exists(path + '.damaged')
+    assert ProjectJournal.loadProject(project)[0]['Points'] == [point(0), point(1)]
+
+def test_6(project):
+    '''
+    Test a live journal shares its points with the caller and writes the
+    points as they were when it compacted
+    '''
+    def full(i):
+        return dict(point(i), Timestamp=None, UTCOffset=None)
+
+    jobs = []
+    journal = ProjectJournal.ProjectJournal(
+        project,
+        compactEvery=3,
+        schedule=lambda fn, *args: jobs.append((fn, args)),
+        points=PointStore,
+        live=True
+    )
+    data = journal.load()
+    points = data['Points']
+
+    assert data is journal.data
+    for i in range(3):
+        points.append(full(i))
+        journal.record('add', 'Points', full(i))
+    journal.record('set', 'Scale', 2)
+
+    #changes made before the scheduled write runs aren't in it
+    del points[0]
+    journal.record('delete', 'Points', index=0)
+
+    fn, args = jobs.pop()
+    assert fn(*args)
+    assert ProjectJournal.readSnapshot(project)[0]['Points'] == [full(0), full(1), full(2)]
+
+    points.append(full(3))
+    journal.record('add', 'Points', full(3))
+    journal.file.close()
+    data = ProjectJournal.loadProject(project)[0]
+
+    assert data['Points'] == [full(1), full(2), full(3)]
+    assert data['Scale'] == 2
+
+def test_7(project):
+    '''
+    Test a streamed journal reads nothing until loadSteps() and replays
+    the journal after the snapshot's points
+    '''
+    def full(i):
+        return dict(point(i), Timestamp=None, UTCOffset=None)
+
+    journal = ProjectJournal.ProjectJournal(project, points=PointStore)
+    for i in range(25):
+        journal.record('add', 'Points', full(i))
+    journal.close()
+    journal = ProjectJournal.ProjectJournal(project)
+    journal.record('delete', 'Points', index=0)
+    journal.file.close()
+
+    journal = ProjectJournal.ProjectJournal(project, points=PointStore, live=True, stream=True)
+    assert journal.file is None
+
+    steps = journal.loadSteps()
+    first = next(steps)
+    assert len(first['Points']) == 25 and journal.replayed == 0
+
+    data = ProjectReader.drain(steps)
+    assert data is first
+    assert journal.replayed == 1
+    assert data['Points'].toDicts() == [full(i) for i in range(1, 25)]
+    journal.close()
+
+    journal = ProjectJournal.ProjectJournal(project, stream=True)
+    journal.close()
+    assert ProjectJournal.loadProject(project)[0]['Points'] == [full(i) for i in range(1, 25)]
@@ -0,0 +1,97 @@
+import io
+import json
+import pytest
+
+from Map_Reader import ProjectReader
+from Map_Reader.PointStore import PointStore
+
+@pytest.fixture
+def data():
+    return {
+        'ProjectName': 'Test',
+        'Reference': [[1.5, 2.5], [3, 4]],
+        'Scale': 0.25,
+        'Units': 'mi',
+        'Points': [
+            {'Latitude': 1e-7 * i, 'Longitude': -120.5 + i, 'Timestamp': 1600000000 + i, 'UTCOffset': -25200, 'Description': f'a "point", ]{i}'}
+            for i in range(25)
+        ],
+        'SchemaVersion': 2
+    }
+
+def test_1(data):
+    '''
+    Test written project data reads back the same, in chunks of any size
+    '''
+    text = ''.join(ProjectReader.dumpProject(data, chunkSize=7))
+    assert json.loads(text) == data
+
+    for readSize in (1, 3, 64):
+        f = io.StringIO(text)
+        f.read = lambda n, read=f.read, readSize=readSize: read(readSize)
+        assert ProjectReader.readProject(f, chunkSize=4) == data
+
+def test_2(data):
+    '''
+    Test points are prepared and stored one chunk at a time
+    '''
+    chunks = []
+    f = io.StringIO(json.dumps(data))
+    result = ProjectReader.readProject(f, points=PointStore, prepare=lambda chunk: chunks.append(len(chunk)), chunkSize=10)
+
+    assert chunks == [10, 10, 5]
+    assert isinstance(result['Points'], PointStore)
+    assert result['Points'].toDicts() == data['Points']
+    assert ProjectReader.readProject(io.StringIO('{"Points": []}'), points=PointStore)['Points'].toDicts() == []
+
+def test_3(data):
+    '''
+    Test truncated or damaged files raise ValueError
+    '''
+    text = json.dumps(data)
+    for bad in ('', text[:len(text) // 2], text[:-1], text.replace(':', ';', 1)):
+        with pytest.raises(ValueError):
+            ProjectReader.readProject(io.StringIO(bad))
+
+def test_4(data):
+    '''
+    Test the data written before the points is read by the first step and
+    each step adds a chunk to the same container
+    '''
+    f = io.StringIO(''.join(ProjectReader.dumpProject(data)))
+    steps = ProjectReader.readProjectSteps(f, points=PointStore, chunkSize=10)
+
+    first = next(steps)
+    points = first['Points']
+
+    assert first['Reference'] == data['Reference'] and len(points) == 10
+    assert next(steps)['Points'] is points and len(points) == 20
+    assert ProjectReader.drain(steps) is first
+    assert points.toDicts() == data['Points']
+
+def test_5(data, tmp_path):
+    '''
+    Test a file found damaged part way through is read again from its backup
+    '''
+    from Map_Reader import AtomicWrite
+
+    path = str(tmp_path / 'project_data.json')
+    text = ''.join(ProjectReader.dumpProject(data))
+    with open(path, 'w') as f:
+        f.write(text[:-200])
+    with open(AtomicWrite.backupPaths(path)[0], 'w') as f:
+        f.write(text)
+
+    load = lambda f: ProjectReader.readProjectSteps(f, points=PointStore, chunkSize=10)
+    steps = AtomicWrite.readRecoveringSteps(path, load)
+    containers = []
+    while True:
+        try:
+            containers.append(next(steps)['Points'])
+        except StopIteration as stop:
+            result, source = stop.value
+            break
+
+    assert source == AtomicWrite.backupPaths(path)[0]
+    assert result['Points'] is containers[-1] and result['Points'] is not containers[0]
+    assert result['Points'].toDicts() == data['Points']
@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import pytest
+
+from Map_Reader import ProjectCatalog
+from Map_Reader.ProjectScanner import ProjectScanner
+
+@pytest.fixture
+def projects(tmp_path):
+    '''
+    Two readable projects and a corrupt one
+    '''
+    for name, points in (('A', 1), ('B', 2)):
+        os.makedirs(tmp_path / name)
+        with open(tmp_path / name / 'project_data.json', 'w') as f:
+            f.write(json.dumps({'ProjectName': name, 'Points': [{}] * points}))
+
+    os.makedirs(tmp_path / 'Corrupt')
+    with open(tmp_path / 'Corrupt' / 'project_data.json', 'w') as f:
+        f.write('{"ProjectName": ')
+
+    return tmp_path
+
+def summarize(projects, delay=0):
+    def summarize(name):
+        time.sleep(delay)
+        try:
+            with open(projects / name / 'project_data.json') as f:
+                data = json.loads(f.read())
+        except ValueError:
+            return False
+        return {'ProjectName': data['ProjectName'], 'Points': len(data['Points'])}
+    return summarize
+
+def scan(qtbot, catalog):
+    found = []
+    scanner = ProjectScanner(catalog)
+    scanner.found.connect(lambda name, entry: found.append((name, entry['Points'])))
+
+    with qtbot.waitSignal(scanner.finished, timeout=5000):
+        scanner.start()
+
+    return found
+
+def test_1(projects, qtbot):
+    '''
+    Test every project is emitted and corrupt ones are marked unreadable
+    '''
+    catalog = ProjectCatalog.ProjectCatalog(str(projects), summarize(projects))
+
+    assert sorted(scan(qtbot, catalog)) == [('A', 1), ('B', 2), ('Corrupt', None)]
+
+def test_2(projects, qtbot):
+    '''
+    Test cataloged projects, unreadable ones included, are emitted before
+    ones that have to be read
+    '''
+    ProjectCatalog.ProjectCatalog(str(projects), summarize(projects)).projects()
+
+    with open(projects / 'A' / 'project_data.json', 'w') as f:
+        f.write(json.dumps({'ProjectName': 'A', 'Points': [{}] * 5}))
+    os.utime(projects / 'A' / 'project_data.json', ns=(1, 1))
+
+    catalog = ProjectCatalog.ProjectCatalog(str(projects), summarize(projects))
+
+    assert scan(qtbot, catalog) == [('B', 2), ('Corrupt', None), ('A', 5)]
+
+def test_3(projects, qtbot):
+    '''
+    Test the scan stops when interrupted
+    '''
+    catalog = ProjectCatalog.ProjectCatalog(str(projects), summarize(projects, delay=0.2))
+    found = []
+    scanner = ProjectScanner(catalog)
+    scanner.found.connect(lambda name, entry: found.append(name))
+
+    scanner.start()
+    scanner.stop()
+    qtbot.wait(50)
+
+    assert scanner.isFinished()
+    assert len(found) < 3
@@ -0,0 +1,53 @@
+import pytest
+
+from Map_Reader import Dates
+from Map_Reader import ProjectSchema
+from Map_Reader.PointStore import PointStore
+
+@pytest.fixture
+def legacy():
+    '''
+    Project data written before SchemaVersion and ControlPoints
+    '''
+    dates = ['01-05-2020 10:30:00 pm', '12-31-2019 12:00:00 am', 'yesterday']
+    return {
+        'ProjectName': 'Legacy',
+        'Reference': [[40.0, -105.0]],
+        'Scale': 10,
+        'Units': 'Miles',
+        'Points': [{'Latitude': 40.0, 'Longitude': -105.0, 'Date': d, 'Description': 'Tree'} for d in dates]
+    }
+
+def test_1(legacy):
+    '''
+    Test legacy projects are upgraded to the current layout
+    '''
+    assert ProjectSchema.upgrade(legacy) == True
+    assert legacy['SchemaVersion'] == ProjectSchema.SCHEMA_VERSION
+    assert legacy['ControlPoints'] == []
+
+    first, second, odd = legacy['Points']
+    assert first['Timestamp'] == Dates.timestamp('01-05-2020 10:30:00 pm')
+    assert 'Date' not in first
+    assert Dates.formatDate(second['Timestamp'], second['UTCOffset']) == '12-31-2019 12:00:00 am'
+    assert odd['Timestamp'] is None and odd['Date'] == 'yesterday'
+
+def test_2(legacy):
+    '''
+    Test upgraded points load into a PointStore and show their original dates
+    '''
+    ProjectSchema.upgrade(legacy)
+    store = PointStore(legacy['Points'])
+
+    assert store.dates() == ['01-05-2020 10:30:00 pm', '12-31-2019 12:00:00 am', 'yesterday']
+
+def test_3(legacy):
+    '''
+    Test current projects aren't migrated again and newer ones are rejected
+    '''
+    ProjectSchema.upgrade(legacy)
+    assert ProjectSchema.upgrade(legacy) == False
+
+    legacy['SchemaVersion'] = ProjectSchema.SCHEMA_VERSION + 1
+    with pytest.raises(ValueError):
+        ProjectSchema.upgrade(legacy)
@@ -0,0 +1,227 @@
+import os
+import json
+import pytest
+import numpy as np
+
+from Map_Reader import Dates
+from Map_Reader import SQLiteStore
+from Map_Reader import ProjectJournal
+from Map_Reader import ProjectSchema
+from Map_Reader.TraceRecorder import TraceRecorder
+
+def point(i):
+    ts = Dates.timestamp(f'01-{i % 28 + 1:02d}-2020 10:30:00 am')
+    return {
+        'Latitude': 38 + i / 1000,
+        'Longitude': -121 - i / 1000,
+        'Timestamp': ts,
+        'UTCOffset': Dates.utcOffset(ts),
+        'Description': f'Point {i}'
+    }
+
+@pytest.fixture
+def project(tmp_path):
+    '''
+    Json project with 100 points and a journaled change
+    '''
+    data = {
+        'ProjectName': 'Test',
+        'Created': '01-01-2020 10:00:00 am',
+        'Reference': [[38.5, -121.5]],
+        'Scale': 10,
+        'Units': 'km',
+        'Points': [point(i) for i in range(100)]
+    }
+    with open(tmp_path / ProjectJournal.SNAPSHOT_NAME, 'w') as f:
+        f.write(json.dumps(data))
+    with open(tmp_path / ProjectJournal.JOURNAL_NAME, 'w') as f:
+        f.write(json.dumps({'seq': 1, 'op': 'add', 'key': 'Points', 'value': point(100)}) + '\n')
+
+    return str(tmp_path)
+
+def test_1(project):
+    '''
+    Test migrating a json project keeps all of its data
+    '''
+    store = SQLiteStore.SQLiteStore.migrate(project)
+    data = ProjectJournal.loadProject(project)[0]
+    ProjectSchema.upgrade(data)
+
+    loaded = store.load()
+
+    assert isinstance(loaded['Points'], SQLiteStore.PointStore)
+    assert list(loaded.pop('Points')) == data.pop('Points')
+    assert loaded == data
+    assert store.count() == 101
+
+def test_2(project):
+    '''
+    Test changes are applied in place
+    '''
+    store = SQLiteStore.SQLiteStore.migrate(project)
+    store.record('add', 'Points', point(200))
+    store.record('delete', 'Points', index=0)
+    store.record('edit', 'Points', point(300), index=1)
+    store.record('add', 'Reference', [38.6, -121.6])
+    store.record('set', 'Scale', 12.5)
+    store.close()
+
+    data = SQLiteStore.SQLiteStore(project).load()
+
+    assert data['Points'][0] == point(1)
+    assert data['Points'][1] == point(300)
+    assert data['Points'][-1] == point(200)
+    assert data['Reference'] == [[38.5, -121.5], [38.6, -121.6]]
+    assert data['Scale'] == 12.5
+
+    with pytest.raises(IndexError):
+        SQLiteStore.SQLiteStore(project).record('delete', 'Points', index=500)
+
+def test_3(project):
+    '''
+    Test location and date queries use the indexes
+    '''
+    store = SQLiteStore.SQLiteStore.migrate(project)
+
+    within = store.pointsWithin(38.01, 38.02, -121.02, -121.01)
+    assert [p['Description'] for p in within] == [f'Point {i}' for i in range(10, 21)]
+
+    start = Dates.timestamp('01-05-2020 12:00:00 am')
+    end = Dates.timestamp('01-06-2020 11:59:59 pm')
+    between = store.pointsBetween(start, end)
+    assert all(start <= p['Timestamp'] <= end for p in between)
+    assert len(between) == 8
+
+    plan = ' '.join(str(row) for row in store.db.execute(
+        'EXPLAIN QUERY PLAN SELECT data FROM points WHERE latitude BETWEEN 1 AND 2 AND longitude BETWEEN 1 AND 2'
+    ))
+    assert 'points_location' in plan
+
+def test_4(project):
+    '''
+    Test traces are stored with their samples
+    '''
+    store = SQLiteStore.SQLiteStore.migrate(project)
+
+    recorder = TraceRecorder()
+    for i in range(50):
+        recorder.append(i, -i, t=i / 100)
+    store.saveTraces([recorder.trace((38.5, -121.5), 10, 'km'), recorder.trace()])
+
+    traces = list(store.loadTraces())
+
+    assert traces[0].ref == (38.5, -121.5)
+    assert np.array_equal(traces[0].samples, recorder.data)
+    assert np.isnan(traces[1].ref[0])
+
+    store.saveTraces([recorder.trace()._replace(point=5)])
+    assert [trace.point for trace in store.loadTraces()][-1] == 5
+
+    store.deleteTraces([5])
+    assert len(list(store.loadTraces())) == 2
+
+def test_5(project, monkeypatch):
+    '''
+    Test a migration that fails leaves the project on json instead of an
+    empty database
+    '''
+    def fail(self, points):
+        raise SQLiteStore.sqlite3.OperationalError('disk I/O error')
+
+    with monkeypatch.context() as m:
+        m.setattr(SQLiteStore.SQLiteStore, 'insertPoints', fail)
+        with pytest.raises(SQLiteStore.sqlite3.Error):
+            SQLiteStore.SQLiteStore.migrate(project)
+
+    assert not os.path.exists(os.path.join(project, SQLiteStore.DB_NAME))
+
+    store = SQLiteStore.SQLiteStore.migrate(project)
+
+    assert store.count() == 101
+    assert not [name for name in os.listdir(project) if name.startswith(SQLiteStore.MIGRATE_NAME)]
+
+def test_6(project):
+    '''
+    Test rows are found by index after adds and deletes and a save only
+    writes the metadata
+    '''
+    store = SQLiteStore.SQLiteStore.migrate(project)
+    points = store.load()['Points']
+    for i in range(200, 210):
+        store.record('add', 'Points', point(i))
+        points.append(point(i))
+    for index in (0, 50, -1, 30):
+        store.record('delete', 'Points', index=index)
+        del points[index]
+    store.record('edit', 'Points', point(400), index=-2)
+    points[-2] = point(400)
+
+    assert store.count() == len(points) == 107
+    assert store.saveMeta({'LastAccessed': 'now', 'Points': []})
+    store.close()
+
+    store = SQLiteStore.SQLiteStore(project)
+    data = store.load()
+
+    assert list(data['Points']) == list(points)
+    assert data['LastAccessed'] == 'now'
+
+def test_7(project):
+    '''
+    Test loading steps add CHUNK_SIZE points at a time to one PointStore
+    '''
+    store = SQLiteStore.SQLiteStore.migrate(project)
+    SQLiteStore.CHUNK_SIZE, size = 40, SQLiteStore.CHUNK_SIZE
+    try:
+        steps = store.loadSteps()
+        first = next(steps)
+        counts = [len(first['Points'])] + [len(data['Points']) for data in steps]
+    finally:
+        SQLiteStore.CHUNK_SIZE = size
+
+    assert counts == [40, 80, 101]
+    assert first['Scale'] == 10
+    assert store.count() == 101
+    store.record('delete', 'Points', index=100)
+    assert list(store.load()['Points']) == [point(i) for i in range(100)]
+
+def test_8(project):
+    '''
+    Test points are kept in typed columns, only keys without a column are
+    kept as json, and a points table of json rows is split into columns
+    '''
+    store = SQLiteStore.SQLiteStore.migrate(project)
+    undated = dict(point(200), Timestamp=None, UTCOffset=None, Date='someday')
+    traced = dict(point(201), TraceId=7)
+    store.record('add', 'Points', undated)
+    store.record('add', 'Points', traced)
+
+    assert store.db.execute('SELECT COUNT(*) FROM points WHERE data IS NOT NULL').fetchone()[0] == 1
+    points = store.load()['Points']
+    assert points[-2] == undated and points[-1] == traced
+    assert list(store.iterPoints('id > 101')) == [undated, traced]
+    store.close()
+
+    #the layout before typed columns, every point as json
+    path = os.path.join(project, SQLiteStore.DB_NAME)
+    os.remove(path)
+    db = SQLiteStore.sqlite3.connect(path)
+    db.executescript('''
+        CREATE TABLE points (id INTEGER PRIMARY KEY, latitude REAL, longitude REAL, timestamp INTEGER, description TEXT, data TEXT NOT NULL);
+        CREATE INDEX points_location ON points (latitude, longitude);
+    ''')
+    db.executemany(
+        'INSERT INTO points (id, latitude, longitude, timestamp, description, data) VALUES (?, ?, ?, ?, ?, ?)',
+        [(i * 2, 0, 0, 0, '', json.dumps(p)) for i, p in enumerate([point(0), undated, traced])]
+    )
+    db.commit()
+    db.close()
+
+    store = SQLiteStore.SQLiteStore(project)
+
+    assert list(store.load()['Points']) == [point(0), undated, traced]
+    assert store.rowId('points', 2) == 4
+    plan = ' '.join(str(row) for row in store.db.execute(
+        'EXPLAIN QUERY PLAN SELECT id FROM points WHERE latitude BETWEEN 1 AND 2 AND longitude BETWEEN 1 AND 2'
+    ))
+    assert 'points_location' in plan
@@ -0,0 +1,46 @@
+from Map_Reader import SearchIndex
+from Map_Reader.PointStore import PointStore
+
+def point(description):
+    return {'Latitude': 0.0, 'Longitude': 0.0, 'Timestamp': None, 'UTCOffset': None, 'Description': description}
+
+def test_1():
+    '''
+    Test every word of a query must start a word of the description
+    '''
+    strings = ['', 'Big River crossing', 'Rock by the river', 'Riverside camp', 'Oak tree']
+    index = SearchIndex.SearchIndex(strings)
+
+    def found(query):
+        return [strings[code] for code in index.search(query).nonzero()[0]]
+
+    assert found('river') == ['Big River crossing', 'Rock by the river', 'Riverside camp']
+    assert found('RIV cro') == ['Big River crossing']
+    assert found('iver') == []
+    assert index.search('  ') is None
+    assert all(SearchIndex.matches(query, text) == (text in found(query)) for query in ('riv', 'oak t', 'x') for text in strings[1:])
+
+def test_2():
+    '''
+    Test the index of a PointStore follows added, edited and deleted points
+    '''
+    store = PointStore([point('North trail'), point('South trail')])
+    assert store.search('trail').tolist() == [True, True]
+
+    store.append(point('Trailhead'))
+    store[0] = point('North ridge')
+    del store[1]
+
+    assert store.search('trail').tolist() == [False, True]
+    assert store.search('ridge').tolist() == [True, False]
+    assert store.search('').tolist() == [True, True]
+
+def test_3():
+    '''
+    Test prefixes matching many words give the same points
+    '''
+    strings = [''] + [f'site {n}' for n in range(SearchIndex.BROAD_PREFIX * 2)]
+    index = SearchIndex.SearchIndex(strings)
+
+    assert index.search('1').sum() == sum(str(n).startswith('1') for n in range(SearchIndex.BROAD_PREFIX * 2))
+    assert index.search('site 1').tolist() == index.search('1').tolist()
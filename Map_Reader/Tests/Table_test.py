@@ -0,0 +1,184 @@
+from Map_Reader.CustomQtObjects import Table
+from Map_Reader.PointStore import PointStore
+from PyQt5.QtCore import Qt
+import pytest
+import numpy as np
+
+@pytest.fixture
+def points():
+    return PointStore([
+        {'Latitude': 38.5 + i, 'Longitude': -121.5, 'Timestamp': 1600000000 - i * 86400, 'UTCOffset': 0, 'Description': f'Point {i}'}
+        for i in range(3)
+    ])
+
+@pytest.fixture
+def table(qtbot, points):
+    table = Table('Points', points, columns=['Latitude', 'Longitude', 'Date', 'Description'], index=True, sortKeys={'Date': 'Timestamp'}, filterable=True)
+    qtbot.addWidget(table)
+    return table
+
+def cells(table, column):
+    col = table.columns.index(column)
+    return [table.sourceModel.index(row, col).data() for row in range(table.sourceModel.rowCount())]
+
+def test_1(table, points):
+    '''
+    Test cells are read from the PointStore and dates sort by Timestamp
+    '''
+    assert table.rowCount() == 3
+    assert cells(table, 'ID') == [1, 2, 3]
+    assert cells(table, 'Description') == ['Point 0', 'Point 1', 'Point 2']
+    assert cells(table, 'Date')[0] == points.row(0)['Date']
+
+    table.proxyView.horizontalHeader().setSortIndicator(table.columns.index('Date'), Qt.AscendingOrder)
+    assert cells(table, 'Description') == ['Point 2', 'Point 1', 'Point 0']
+
+def test_2(qtbot, table, points):
+    '''
+    Test added, deleted and edited rows update the view without a reset
+    '''
+    resets = []
+    table.sourceModel.modelReset.connect(lambda: resets.append(True))
+
+    points.append({'Latitude': 1.0, 'Longitude': 2.0, 'Timestamp': None, 'UTCOffset': None, 'Description': 'New'})
+    with qtbot.waitSignal(table.sourceModel.rowsInserted) as blocker:
+        table.rowsAdded(len(points) - 1)
+    assert blocker.args[1:] == [3, 3]
+
+    del points[0]
+    with qtbot.waitSignal(table.sourceModel.rowsRemoved) as blocker:
+        table.rowsDeleted(0)
+    assert blocker.args[1:] == [0, 0]
+
+    points[0] = dict(points[0], Description='Edited')
+    with qtbot.waitSignal(table.sourceModel.dataChanged):
+        table.rowsEdited(0)
+
+    assert cells(table, 'Description') == ['Edited', 'Point 2', 'New']
+    assert cells(table, 'Date')[2] == ''
+    assert not resets
+
+def test_3(qtbot):
+    '''
+    Test checked rows of a checkable table are returned
+    '''
+    table = Table('Reference Points', [{'Latitude': 1, 'Longitude': 2}, {'Latitude': 3, 'Longitude': 4}], checkable=True)
+    qtbot.addWidget(table)
+
+    index = table.sourceModel.index(1, 0)
+    assert table.sourceModel.flags(index) & Qt.ItemIsUserCheckable
+    table.sourceModel.setData(index, Qt.Checked, Qt.CheckStateRole)
+
+    assert table.getCheckedRowData() == [{'Latitude': 3, 'Longitude': 4}]
+
+def test_4(qtbot):
+    '''
+    Test ChangeSet changes are applied to a table of sequences
+    '''
+    reference = [(1.5, 2.5)]
+    table = Table('Reference Points', reference, columns=['Latitude', 'Longitude'], index=True)
+    qtbot.addWidget(table)
+
+    reference.append((3.5, 4.5))
+    reference.append((5.5, 6.5))
+    del reference[0]
+    table.applyChanges([('add', 1), ('add', 2), ('delete', 0)])
+
+    assert cells(table, 'Latitude') == [3.5, 5.5]
+    assert cells(table, 'ID') == [1, 2]
+
+    table.applyChanges([('set', None)], [(7.5, 8.5)])
+    assert cells(table, 'Longitude') == [8.5]
+
+def test_5(qtbot, table, points):
+    '''
+    Test a sorted and filtered table keeps its order as rows change
+    '''
+    table.proxyView.horizontalHeader().setSortIndicator(table.columns.index('Latitude'), Qt.DescendingOrder)
+    assert cells(table, 'Latitude') == [40.5, 39.5, 38.5]
+
+    table.filterEdit.setText('POINT 1')
+    assert cells(table, 'ID') == [2]
+
+    points.append({'Latitude': 39.0, 'Longitude': 0.0, 'Timestamp': None, 'UTCOffset': None, 'Description': 'point 10'})
+    points.append({'Latitude': 45.0, 'Longitude': 0.0, 'Timestamp': None, 'UTCOffset': None, 'Description': 'other'})
+    table.applyChanges([('add', 3), ('add', 4)])
+    assert cells(table, 'Latitude') == [39.5, 39.0]
+
+    points[1] = dict(points[1], Latitude=10.0)
+    table.rowsEdited(1)
+    del points[0]
+    table.rowsDeleted(0)
+    assert cells(table, 'ID') == [3, 1]
+    assert cells(table, 'Latitude') == [39.0, 10.0]
+
+    table.filterEdit.setText('')
+    assert cells(table, 'Latitude') == [45.0, 40.5, 39.0, 10.0]
+
+def test_6(qtbot, table, points):
+    '''
+    Test added and edited rows keep the cached sort keys and are placed by them
+    '''
+    model = table.sourceModel
+    column = table.columns.index('Description')
+    table.proxyView.horizontalHeader().setSortIndicator(column, Qt.AscendingOrder)
+
+    points.append(dict(points[0], Description='point 05'))
+    points.append(dict(points[0], Description='Another'))
+    table.applyChanges([('add', 3), ('add', 4)])
+    assert cells(table, 'Description') == ['Another', 'Point 0', 'point 05', 'Point 1', 'Point 2']
+
+    points[1] = dict(points[1], Description='Zebra')
+    table.rowsEdited(1)
+    assert cells(table, 'Description') == ['Another', 'Point 0', 'point 05', 'Point 2', 'Zebra']
+
+    #the keys were added to, not rebuilt, and match keys built from scratch
+    assert points.rankings == 1
+    assert model.sortKey(column).tolist() == model.rowKeys(column).tolist()
+
+def test_7(qtbot):
+    '''
+    Test sort keys of a table of sequences are numpy columns
+    '''
+    reference = [(3.5, 1.5), (1.5, 2.5)]
+    table = Table('Reference Points', reference, columns=['Latitude', 'Longitude'], index=True)
+    qtbot.addWidget(table)
+
+    keys = table.sourceModel.sortKey(table.columns.index('Longitude'))
+    assert keys.dtype == np.float64 and keys.tolist() == [1.5, 2.5]
+
+    table.proxyView.horizontalHeader().setSortIndicator(table.columns.index('Latitude'), Qt.AscendingOrder)
+    reference.append((2.0, 0.0))
+    table.rowsAdded(2)
+    assert cells(table, 'Latitude') == [1.5, 2.0, 3.5]
+
+def test_8(qtbot, table, points):
+    '''
+    Test a batch of changes is applied to a sorted and filtered table with
+    the keys of the rows each change ends up at
+    '''
+    model = table.sourceModel
+    column = table.columns.index('Latitude')
+    table.proxyView.horizontalHeader().setSortIndicator(column, Qt.AscendingOrder)
+    resets = []
+    model.modelReset.connect(lambda: resets.append(True))
+
+    points.append(dict(points[0], Latitude=1.0, Description='Point a'))
+    del points[0]
+    points.append(dict(points[0], Latitude=99.0, Description='other'))
+    points[0] = dict(points[0], Latitude=50.0)
+    table.applyChanges([('add', 3), ('delete', 0), ('add', 3), ('edit', 0)])
+
+    assert cells(table, 'Latitude') == [1.0, 40.5, 50.0, 99.0]
+    assert cells(table, 'ID') == [3, 2, 1, 4]
+    assert model.sortKey(column).tolist() == model.rowKeys(column).tolist()
+    assert not resets
+
+    table.filterEdit.setText('point')
+    points.append(dict(points[0], Latitude=0.5, Description='other'))
+    points.append(dict(points[0], Latitude=45.0, Description='Point b'))
+    points[3] = dict(points[3], Description='Point c')
+    table.applyChanges([('add', 4), ('add', 5), ('edit', 3)])
+
+    assert cells(table, 'Latitude') == [1.0, 40.5, 45.0, 50.0, 99.0]
+    assert cells(table, 'ID') == [3, 2, 6, 1, 4]
@@ -0,0 +1,139 @@
+import pytest
+import numpy as np
+
+from Map_Reader import TraceEngine
+from Map_Reader import Geodesic
+
+@pytest.fixture
+def engine():
+    engine = TraceEngine.TraceEngine((38.5, -121.5), 100, 'km')
+    return engine
+
+def test_1():
+    '''
+    Test bearing is measured clockwise from grid north
+    '''
+    assert TraceEngine.getBearing(0, 10) == 0
+    assert TraceEngine.getBearing(10, 0) == 90
+    assert TraceEngine.getBearing(0, -10) == 180
+    assert TraceEngine.getBearing(-10, 0) == 270
+    assert TraceEngine.getDistance(3, 4) == 5
+    assert TraceEngine.convert(500, 100) == 5
+    assert TraceEngine.convert(500, 0) == 0
+    assert TraceEngine.convert(500, None) == 0
+
+def test_2(engine):
+    '''
+    Test moves accumulate and solve matches the geodesic solution
+    '''
+    engine.move(300, 0)
+    engine.move(0, 400)
+    newLoc = engine.solve()
+
+    lat, lon = Geodesic.destination(38.5, -121.5, 5000, engine.bearing)
+
+    assert (engine.dx, engine.dy) == (300, 400)
+    assert engine.dist == 5
+    assert newLoc == (round(lat, 6), round(lon, 6))
+    assert engine.previewError < 5
+
+def test_3():
+    '''
+    Test scale mode only computes pixel distance
+    '''
+    engine = TraceEngine.TraceEngine()
+    engine.move(6, 8)
+    engine.compute()
+
+    assert engine.dist_px == 10
+    assert engine.newLoc == (0, 0)
+
+def test_4(engine):
+    '''
+    Test engine state is fixed by __slots__
+    '''
+    with pytest.raises(AttributeError):
+        engine.extra = 1
+
+def test_5(engine):
+    '''
+    Test replay reports throughput and ends at the same place as the summed deltas
+    '''
+    rng = np.random.default_rng(0)
+    deltas = rng.integers(-3, 8, size=(5000, 2))
+    stats = TraceEngine.replay(engine, deltas)
+
+    assert stats['Events'] == 5000
+    assert stats['Events_Per_Sec'] > 0
+    assert stats['P50_us'] <= stats['P99_us'] <= stats['Max_us']
+    assert (engine.dx, engine.dy) == tuple(deltas.sum(axis=0).tolist())
+
+def test_6():
+    '''
+    Test default averaging takes the mean of each traced location
+    '''
+    traceData = [
+        {'Reference': (1, 1), 'New_Lat': 10.0, 'New_Lon': 20.0},
+        {'Reference': (2, 2), 'New_Lat': 12.0, 'New_Lon': 22.0}
+    ]
+
+    assert TraceEngine.averageData(traceData) == (11.0, 21.0)
+
+def test_7():
+    '''
+    Test running average supports weights and resets
+    '''
+    average = TraceEngine.RunningAverage()
+
+    assert average.result() is None
+
+    average.add(10.0, 20.0, weight=3)
+    average.add(14.0, 24.0)
+
+    assert average.result() == (11.0, 21.0)
+
+    average.reset()
+    average.add(1.0, 2.0)
+
+    assert average.result() == (1.0, 2.0)
+
+def test_8():
+    '''
+    Test running average across the antimeridian
+    '''
+    average = TraceEngine.RunningAverage()
+    average.add(0.0, 179.0)
+    average.add(0.0, -179.0)
+
+    assert abs(average.result().y) == 180.0
+
+def test_9():
+    '''
+    Test single trace resolution is the exact solve from the anchor and
+    agrees with references placed on the map at the scale
+    '''
+    anchor = (38.5, -121.5)
+    refs = [anchor, (38.6, -121.4), (38.3, -121.7)]
+    plane = Geodesic.TangentPlane(anchor[0], anchor[1], Geodesic.toMeters(1 / 100, 'km'))
+    pixels = [plane.offset(*anchor)] + [plane.offset(*ref) for ref in refs]
+
+    resolution = TraceEngine.resolveReferences(anchor, refs, 300, 400, 100, 'km', pixels)
+    direct = TraceEngine.newLocation(anchor, 5, TraceEngine.getBearing(300, 400), 'km')
+
+    assert resolution.location == direct
+    assert resolution.estimates.shape == (3, 2)
+    assert resolution.spread < TraceEngine.CONSISTENCY_TOLERANCE
+
+    #the same references at a scale 5% off their map positions
+    resolution = TraceEngine.resolveReferences(anchor, refs, 300, 400, 105, 'km', pixels)
+    assert resolution.spread > TraceEngine.CONSISTENCY_TOLERANCE
+
+def test_10():
+    '''
+    Test single trace resolution without map positions of the references
+    '''
+    resolution = TraceEngine.resolveReferences((10.0, 20.0), [(10.0, 20.0), (10.1, 20.1)], 0, 0, 1, 'km')
+
+    assert resolution.location == (10.0, 20.0)
+    assert resolution.estimates.tolist() == [[10.0, 20.0]]
+    assert resolution.spread == 0
@@ -0,0 +1,135 @@
+import os
+import pytest
+import numpy as np
+
+from Map_Reader.TraceRecorder import TraceRecorder, saveTraces, loadTraces, deleteTraces, compactTraces, SAMPLE_DTYPE
+from Map_Reader.TraceRecorder import NO_POINT, FILE_HEADER, FILE_MAGIC, TRACE_HEADER_V1
+
+@pytest.fixture
+def recorder():
+    recorder = TraceRecorder(capacity=4)
+    for i in range(1000):
+        recorder.append(i % 7 - 3, 2, t=i / 1000)
+    return recorder
+
+def test_1(recorder):
+    '''
+    Test samples are kept in order when the buffer grows
+    '''
+    assert len(recorder) == 1000
+    assert recorder.data['dx'].tolist() == [i % 7 - 3 for i in range(1000)]
+    assert recorder.data['dy'].sum() == 2000
+    assert recorder.data['t'][-1] == pytest.approx(0.999)
+
+def test_2():
+    '''
+    Test memory stays at 16 bytes per sample for long traces
+    '''
+    recorder = TraceRecorder()
+    for i in range(100000):
+        recorder.append(1, -1)
+
+    assert SAMPLE_DTYPE.itemsize == 16
+    assert recorder.nbytes <= 2 * 16 * len(recorder)
+
+def test_3(recorder):
+    '''
+    Test clearing keeps the buffer and starts a new trace
+    '''
+    capacity = recorder.nbytes
+    recorder.clear()
+    recorder.append(5, 5)
+
+    assert len(recorder) == 1
+    assert recorder.nbytes == capacity
+
+def test_4(tmp_path, recorder):
+    '''
+    Test traces round trip through the sidecar file and appends are kept
+    '''
+    path = str(tmp_path / 'project_traces.bin')
+    first = recorder.trace((38.5, -121.5), 250.0, 'km')
+    saveTraces(path, [first])
+    second = recorder.trace()
+    saveTraces(path, [second])
+
+    loaded = list(loadTraces(path))
+
+    assert len(loaded) == 2
+    assert loaded[0].ref == (38.5, -121.5)
+    assert loaded[0].scale == 250.0
+    assert loaded[0].units == 'km'
+    assert np.array_equal(loaded[0].samples, first.samples)
+    assert np.isnan(loaded[1].ref[0])
+    assert loaded[1].units == ''
+
+def test_5(tmp_path, recorder):
+    '''
+    Test a partially written trace at the end of the file is skipped
+    '''
+    path = str(tmp_path / 'project_traces.bin')
+    saveTraces(path, [recorder.trace(), recorder.trace()])
+
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 10)
+
+    assert len(list(loadTraces(path))) == 1
+
+def test_6(tmp_path, recorder):
+    '''
+    Test traces appended after a damaged record are still read
+    '''
+    path = str(tmp_path / 'project_traces.bin')
+    saveTraces(path, [recorder.trace()])
+
+    #a crash while appending leaves half a trace at the end
+    size = os.path.getsize(path)
+    saveTraces(path, [recorder.trace()])
+    with open(path, 'r+b') as f:
+        f.truncate(size + 100)
+    saveTraces(path, [recorder.trace(scale=3.0)])
+
+    #a flipped sample byte fails its checksum
+    with open(path, 'r+b') as f:
+        f.seek(200)
+        byte = f.read(1)
+        f.seek(200)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    loaded = list(loadTraces(path))
+    assert [trace.scale for trace in loaded] == [3.0]
+
+def test_7(tmp_path, recorder):
+    '''
+    Test traces of deleted points are skipped and compacted away
+    '''
+    path = str(tmp_path / 'project_traces.bin')
+    saveTraces(path, [recorder.trace()._replace(point=1), recorder.trace()._replace(point=2), recorder.trace()])
+    size = os.path.getsize(path)
+
+    deleteTraces(path, [1])
+    assert [trace.point for trace in loadTraces(path)] == [2, NO_POINT]
+
+    assert compactTraces(path)
+    assert os.path.getsize(path) < size
+    assert [trace.point for trace in loadTraces(path)] == [2, NO_POINT]
+    assert not compactTraces(path)
+
+def test_8(tmp_path, recorder):
+    '''
+    Test version 1 files are read and converted before appending
+    '''
+    path = str(tmp_path / 'project_traces.bin')
+    samples = recorder.data.copy()
+    with open(path, 'wb') as f:
+        f.write(FILE_HEADER.pack(FILE_MAGIC, 1))
+        f.write(TRACE_HEADER_V1.pack(7, 38.5, -121.5, 250.0, b'km', len(samples)))
+        f.write(samples.tobytes())
+
+    assert [trace.id for trace in loadTraces(path)] == [7]
+
+    saveTraces(path, [recorder.trace()._replace(id=8)])
+    loaded = list(loadTraces(path))
+
+    assert [trace.id for trace in loaded] == [7, 8]
+    assert loaded[0].units == 'km' and np.array_equal(loaded[0].samples, samples)
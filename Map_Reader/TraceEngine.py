@@ -0,0 +1,377 @@
+import math
+import time
+from collections import namedtuple
+import numpy as np
+
+import Geodesic
+import LocationSolver
+
+#Create namedtuple for readability to store point data
+Point = namedtuple('Point', 'x y')
+
+#Result of resolving one trace against several references
+Resolution = namedtuple('Resolution', 'location estimates spread')
+
+#Largest spread (meters) between per-reference estimates before a single trace
+#resolution is reported as inconsistent with the control points
+CONSISTENCY_TOLERANCE = 25.0
+
+def getDistance(dx, dy):
+    '''
+    Calculate straight line distance from point a to b using net distance
+    in x and y direction
+
+    Args:
+        dx (float): total distance in pixels traveled in x direction
+        dy (float): total distance in pixels traveled in y direction
+
+    Returns:
+        Total distance
+    '''
+    try:
+        return round(math.sqrt(dx**2 + dy**2), 6)
+    except:
+        return 0
+
+def getBearing(dx, dy):
+    '''
+    Calculate the bearing of the mouse movement
+
+    Args:
+        dx (float): total distance in pixels traveled in x direction
+        dy (float): total distance in pixels traveled in y direction
+
+    Returns:
+        bearing (float): bearing in degrees, 0 if it can't be computed
+    '''
+    try:
+        bearing = math.degrees(math.atan2(dy, dx))
+    except:
+        return 0
+
+    #shift bearing so 0 degrees is now grid north
+    bearing = (360 + (90 - bearing)) % 360
+
+    return round(bearing, 6)
+
+def convert(dist, scale):
+    '''
+    Convert distance in pixels to unit of measurement (km, mi, etc...)
+
+    Args:
+        dist (float): Euclidean distances from start to end point
+        scale (int): scale to convert pixels to proper units
+
+    Returns:
+        convDist (float): converted mouse movement in correct unit of
+            measurement, 0 if it can't be computed (no scale)
+    '''
+    try:
+        return round(dist / scale, 6)
+    except:
+        return 0
+
+def newLocation(ref, dist, bearing, units):
+    '''
+    Computes the latitude and longitude using mouse movements distance
+    and bearing from a reference point
+
+    Args:
+        ref (tuple): latitude and longitude of the reference point
+        dist (float): converted euclidean distance of mouse movement
+        bearing (float): bearing in degrees of mouse movement
+        units (str): unit of measurement of dist
+
+    Returns:
+        lat (float): latitude of new location
+        lon (float): longitude of new location
+    '''
+    lat, lon = Geodesic.destination(ref[0], ref[1], Geodesic.toMeters(dist, units), bearing)
+    return Point(round(lat, 6), round(lon, 6))
+
+def averageData(traceData, circle=False):
+    '''
+    Averaging master function
+
+    Args:
+        traceData (list): trace dicts recorded by TrackerLoc, one per reference
+
+    Returns:
+        newLoc (Point): combined location or None if it can't be computed
+    '''
+    if circle == True:
+        #least-squares fit of the traced distances from every reference
+        refs = [data['Reference'] for data in traceData]
+        dists = [Geodesic.toMeters(data['Distance_Actual'], data['Units']) for data in traceData]
+        bearings = [data['Bearing'] for data in traceData]
+
+        solution = LocationSolver.solve(refs, dists, bearings)
+        if not np.isfinite([solution.lat, solution.lon]).all():
+            return None
+
+        return Point(round(solution.lat, 6), round(solution.lon, 6))
+    else:
+        average = RunningAverage()
+        for data in traceData:
+            average.add(data['New_Lat'], data['New_Lon'])
+        return average.result()
+
+def resolveReferences(anchor, refs, dx, dy, scale, units, pixels=None):
+    '''
+    Resolve one trace from an anchor reference. The location is the exact
+    geodesic solve of the traced displacement from the anchor. When the
+    pixel position of every selected reference on the map is known (from
+    the control points) the trace is also resolved from each reference in
+    a single vectorized pass: the traced point's pixel offset from that
+    reference is converted with the scale and added to the reference in a
+    tangent plane at the anchor. The pixel positions are independent of
+    the scale, so estimates that don't agree point to a bad scale or bad
+    control points.
+
+    Args:
+        anchor (tuple): reference point the trace started from
+        refs (list): all selected reference points, may include the anchor
+        dx (float): total distance in pixels traveled in x direction
+        dy (float): total distance in pixels traveled in y direction
+        scale (float): pixels per unit
+        units (str): unit of measurement
+        pixels (list): x, y pixel position of the anchor followed by the
+            position of each reference, None if they aren't known
+
+    Returns:
+        Resolution: location, (n, 2) array of per-reference estimates and
+            the largest distance in meters of an estimate from the location.
+            Without pixels the only estimate is the location and the
+            spread is 0.
+    '''
+    dist = convert(getDistance(dx, dy), scale)
+    location = newLocation(anchor, dist, getBearing(dx, dy), units)
+
+    if pixels is None:
+        return Resolution(location, np.array([location], dtype=np.float64), 0.0)
+
+    refs = np.atleast_2d(np.asarray(refs, dtype=np.float64))
+    pixels = np.atleast_2d(np.asarray(pixels, dtype=np.float64))
+    perPixel = Geodesic.toMeters(1 / scale, units)
+
+    #pixel offset of each reference from the anchor at the scale and on
+    #the map, the traced point seen from a reference moves by the difference
+    east, north = Geodesic.TangentPlane(anchor[0], anchor[1], perPixel).offset(refs[:, 0], refs[:, 1])
+    east = east - (pixels[1:, 0] - pixels[0, 0])
+    north = north - (pixels[1:, 1] - pixels[0, 1])
+
+    lat, lon = Geodesic.TangentPlane(location.x, location.y, perPixel).locate(east, north)
+    spread = float(np.max(np.hypot(east, north))) * perPixel
+
+    return Resolution(location, np.column_stack((lat, lon)), spread)
+
+class RunningAverage():
+    '''
+    Streaming (optionally weighted) average of locations. Each traced
+    location is added as its trace completes so the combined location is
+    ready as soon as the last trace is released. Longitudes are summed
+    relative to the first one so averaging across the antimeridian works.
+    '''
+    __slots__ = ('sumLat', 'sumLon', 'weight', 'count', 'origin')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.sumLat = 0.0
+        self.sumLon = 0.0
+        self.weight = 0.0
+        self.count = 0
+        self.origin = None
+
+    def add(self, lat, lon, weight=1.0):
+        '''
+        Add a location to the average
+
+        Args:
+            lat (float): latitude in degrees
+            lon (float): longitude in degrees
+            weight (float): relative weight of the location
+        '''
+        if self.origin is None:
+            self.origin = lon
+
+        self.sumLat += lat * weight
+        self.sumLon += ((lon - self.origin + 540) % 360 - 180) * weight
+        self.weight += weight
+        self.count += 1
+
+    def result(self):
+        '''
+        Return the averaged location or None if nothing has been added
+        '''
+        if not self.weight:
+            return None
+
+        lat = self.sumLat / self.weight
+        lon = (self.origin + self.sumLon / self.weight + 540) % 360 - 180
+
+        return Point(round(lat, 6), round(lon, 6))
+
+class TraceEngine():
+    '''
+    Qt-free state and math of a single trace. Tracker and TrackerLoc feed
+    it pixel deltas and read the derived values back for display. Without
+    a reference and scale only the pixel distance is computed (scale mode).
+    With a GeoTransform fitted from control points locations come from the
+    transform instead, correcting rotated or skewed maps.
+    '''
+    __slots__ = (
+        'ref', 'scale', 'units', 'plane', 'transform', 'origin',
+        'dx', 'dy', 'dist_px', 'dist', 'bearing', 'newLoc', 'previewError'
+    )
+
+    def __init__(self, ref=None, scale=None, units=None, transform=None):
+        self.ref = None
+        self.scale = scale
+        self.units = units
+        self.plane = None
+        self.transform = transform
+        self.origin = (0.0, 0.0)
+        self.reset()
+
+        if ref is not None:
+            self.setReference(ref)
+
+    def setReference(self, ref):
+        '''
+        Set the reference point traced from and precompute the tangent-plane
+        projection around it so live updates only cost a few multiplies.
+        One pixel is 1/scale units.
+        '''
+        self.ref = ref
+        self.plane = Geodesic.TangentPlane(
+            ref[0],
+            ref[1],
+            Geodesic.toMeters(1 / self.scale, self.units)
+        )
+
+        #pixel position of the reference in the control point frame
+        if self.transform:
+            self.origin = self.transform.inverse(ref[0], ref[1])
+
+    def reset(self):
+        '''
+        Zero out the net distance and derived values
+        '''
+        self.dx = 0
+        self.dy = 0
+        self.dist = 0
+        self.dist_px = 0
+        self.bearing = 0
+        self.newLoc = Point(0, 0)
+        self.previewError = 0
+
+    def move(self, dx, dy):
+        '''
+        Add a movement to the net distance
+
+        Args:
+            dx (float): pixels moved in x direction
+            dy (float): pixels moved in y direction (up is positive)
+        '''
+        self.dx += dx
+        self.dy += dy
+
+    def preview(self, dx, dy):
+        '''
+        Approximate location of a net distance from the reference
+        '''
+        if self.transform:
+            lat, lon = self.transform.apply(self.origin[0] + dx, self.origin[1] + dy)
+        else:
+            lat, lon = self.plane.locate(dx, dy)
+        return Point(round(lat, 6), round(lon, 6))
+
+    def compute(self):
+        '''
+        Compute distance, bearing and previewed location from the net distance
+        '''
+        dx = self.dx
+        dy = self.dy
+
+        self.dist_px = getDistance(dx, dy)
+
+        if self.plane:
+            self.bearing = getBearing(dx, dy)
+            self.dist = convert(self.dist_px, self.scale)
+            self.newLoc = self.preview(dx, dy)
+
+    def solve(self):
+        '''
+        Full geodesic solve of the location, live updates only used the
+        tangent plane. The distance in meters between the preview and the
+        solved location is stored in previewError. With a transform the
+        preview is already exact.
+
+        Returns:
+            newLoc (Point): solved location
+        '''
+        self.compute()
+        ref = self.ref
+
+        if self.transform:
+            #true distance and bearing of the located point from the reference
+            east, north = self.plane.offset(self.newLoc.x, self.newLoc.y)
+            self.bearing = getBearing(east, north)
+            self.dist = convert(getDistance(east, north), self.scale)
+            self.previewError = 0
+            return self.newLoc
+
+        lat, lon = Geodesic.destination(ref[0], ref[1], Geodesic.toMeters(self.dist, self.units), self.bearing)
+        preview = self.plane.locate(self.dx, self.dy)
+        self.previewError = float(self.plane.error(preview[0], preview[1], lat, lon))
+        self.newLoc = Point(round(lat, 6), round(lon, 6))
+
+        return self.newLoc
+
+def replay(engine, deltas, computeEvery=1):
+    '''
+    Push a stream of pixel deltas through an engine as fast as possible,
+    timing every event. Derived values are recomputed every computeEvery
+    events, 1 matches Tracker with refreshRate=None.
+
+    Args:
+        engine (TraceEngine): engine to drive
+        deltas (array_like): (dx, dy) pairs, up is positive
+        computeEvery (int): events between calls to compute()
+
+    Returns:
+        stats (dict): events, seconds, events/sec and latency percentiles in microseconds
+    '''
+    deltas = np.asarray(deltas).tolist()
+    latency = np.empty(len(deltas), dtype=np.int64)
+    clock = time.perf_counter_ns
+    move = engine.move
+    compute = engine.compute
+
+    start = clock()
+    for i, (dx, dy) in enumerate(deltas):
+        t = clock()
+        move(dx, dy)
+        if i % computeEvery == 0:
+            compute()
+        latency[i] = clock() - t
+    seconds = (clock() - start) / 1e9
+
+    if engine.plane:
+        engine.solve()
+    else:
+        engine.compute()
+
+    p50, p95, p99 = np.percentile(latency, [50, 95, 99]) / 1000 if len(latency) else (0, 0, 0)
+
+    return {
+        'Events': len(deltas),
+        'Seconds': seconds,
+        'Events_Per_Sec': len(deltas) / seconds if seconds else 0,
+        'P50_us': p50,
+        'P95_us': p95,
+        'P99_us': p99,
+        'Max_us': latency.max() / 1000 if len(latency) else 0
+    }
@@ -0,0 +1,288 @@
+import os
+import mmap
+import time
+import zlib
+import struct
+from collections import namedtuple
+import numpy as np
+
+#16 bytes per sample: seconds since trace start and pixel deltas (y up, same as Tracker)
+SAMPLE_DTYPE = np.dtype([('t', '<f8'), ('dx', '<i4'), ('dy', '<i4')])
+
+#File header: magic and format version
+FILE_MAGIC = b'MRTR'
+FILE_VERSION = 2
+FILE_HEADER = struct.Struct('<4sH')
+
+#Record header: magic, kind, payload size and crc32 of the payload. Every
+#record is framed so a record cut short by a crash or damaged on disk is
+#skipped and reading carries on at the next record's magic.
+RECORD_MAGIC = b'MRtr'
+RECORD_HEADER = struct.Struct('<4sBII')
+RECORD_TRACE = 1
+RECORD_DELETED = 2
+
+#Trace header: id (epoch ms at start), TraceId of the point it located,
+#reference lat, lon, scale, units, sample count
+TRACE_HEADER = struct.Struct('<qqddd2sI')
+
+#Trace header of version 1 files, without the point
+TRACE_HEADER_V1 = struct.Struct('<qddd2sI')
+
+#point of traces that didn't locate a point (scale and control points)
+NO_POINT = -1
+
+Trace = namedtuple('Trace', 'id ref scale units samples point', defaults=(NO_POINT,))
+
+class TraceRecorder():
+    '''
+    Growable array of (timestamp, dx, dy) samples for a single trace.
+    Samples are stored in a numpy structured array that doubles in size
+    when full so appends are O(1) amortized and each sample costs 16 bytes.
+    '''
+    def __init__(self, capacity=1024):
+        self.samples = np.empty(capacity, dtype=SAMPLE_DTYPE)
+        self.clear()
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        '''
+        Start a new trace, keeping the allocated buffer
+        '''
+        self.count = 0
+        self.id = int(time.time() * 1000)
+        self.start = time.perf_counter()
+
+    def append(self, dx, dy, t=None):
+        '''
+        Record a movement
+
+        Args:
+            dx (int): pixels moved in x direction since the last sample
+            dy (int): pixels moved in y direction since the last sample
+            t (float): seconds since the trace started, defaults to now
+        '''
+        if self.count == len(self.samples):
+            grown = np.empty(len(self.samples) * 2, dtype=SAMPLE_DTYPE)
+            grown[:self.count] = self.samples
+            self.samples = grown
+
+        if t is None:
+            t = time.perf_counter() - self.start
+
+        self.samples[self.count] = (t, dx, dy)
+        self.count += 1
+
+    @property
+    def data(self):
+        '''
+        View of the recorded samples
+        '''
+        return self.samples[:self.count]
+
+    @property
+    def nbytes(self):
+        return self.samples.nbytes
+
+    def trace(self, ref=None, scale=0, units=''):
+        '''
+        Return a copy of the recorded samples as a Trace
+
+        Args:
+            ref (tuple): reference point traced from, None for scale traces
+            scale (float): pixels per unit at the time of the trace
+            units (str): unit of measurement
+        '''
+        ref = tuple(ref) if ref else (float('nan'), float('nan'))
+        return Trace(self.id, ref, scale, units, self.data.copy())
+
+def record(kind, payload):
+    '''
+    Frame a record payload
+    '''
+    return RECORD_HEADER.pack(RECORD_MAGIC, kind, len(payload), zlib.crc32(payload)) + payload
+
+def traceRecord(trace):
+    samples = np.ascontiguousarray(trace.samples, dtype=SAMPLE_DTYPE)
+    return record(RECORD_TRACE, TRACE_HEADER.pack(
+        trace.id,
+        NO_POINT if trace.point is None else trace.point,
+        trace.ref[0],
+        trace.ref[1],
+        trace.scale or 0,
+        (trace.units or '').encode('ascii')[:2],
+        len(samples)
+    ) + samples.tobytes())
+
+def openForAppend(path):
+    '''
+    Open a trace file to append records, creating it or converting a
+    version 1 file first
+    '''
+    try:
+        with open(path, 'rb') as f:
+            magic, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    except FileNotFoundError:
+        version = None
+    except struct.error:
+        #the header itself was cut short, nothing was stored yet
+        version = None
+
+    if version is None:
+        f = open(path, 'wb')
+        f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        return f
+    if magic != FILE_MAGIC or version not in (1, FILE_VERSION):
+        raise ValueError(f'Unsupported trace file: {path}')
+    if version == 1:
+        rewrite(path, list(loadTraces(path)))
+
+    return open(path, 'ab')
+
+def saveTraces(path, traces):
+    '''
+    Append traces to a binary trace file, creating it if needed
+
+    Args:
+        path (str): path of the trace file
+        traces (list): Trace tuples to append
+    '''
+    with openForAppend(path) as f:
+        f.write(b''.join(traceRecord(trace) for trace in traces))
+
+def deleteTraces(path, points):
+    '''
+    Mark the traces of deleted points as deleted, loadTraces() skips them
+    and compactTraces() drops them from the file
+
+    Args:
+        path (str): path of the trace file
+        points (list): TraceId of each deleted point
+    '''
+    if not points or not os.path.exists(path):
+        return
+
+    with openForAppend(path) as f:
+        f.write(record(RECORD_DELETED, np.asarray(points, dtype='<i8').tobytes()))
+
+def records(buf):
+    '''
+    Yield (kind, payload) of each intact record of a version 2 trace file.
+    A record that was cut short or doesn't match its checksum is skipped
+    by searching for the next record's magic.
+
+    Args:
+        buf: contents of the file, bytes or mmap
+    '''
+    offset = FILE_HEADER.size
+    end = len(buf)
+
+    while offset + RECORD_HEADER.size <= end:
+        magic, kind, size, checksum = RECORD_HEADER.unpack_from(buf, offset)
+        start = offset + RECORD_HEADER.size
+        if magic == RECORD_MAGIC and start + size <= end:
+            payload = buf[start:start + size]
+            if zlib.crc32(payload) == checksum:
+                yield kind, payload
+                offset = start + size
+                continue
+
+        offset = buf.find(RECORD_MAGIC, offset + 1)
+        if offset < 0:
+            break
+
+def parseTrace(payload):
+    traceId, point, lat, lon, scale, units, count = TRACE_HEADER.unpack_from(payload)
+    samples = np.frombuffer(payload, dtype=SAMPLE_DTYPE, count=count, offset=TRACE_HEADER.size)
+    return Trace(traceId, (lat, lon), scale, units.rstrip(b'\x00').decode('ascii'), samples, point)
+
+def loadTraces(path):
+    '''
+    Yield each Trace stored in a binary trace file, except the traces of
+    deleted points
+
+    Args:
+        path (str): path of the trace file
+    '''
+    with open(path, 'rb') as f:
+        header = f.read(FILE_HEADER.size)
+        magic, version = FILE_HEADER.unpack(header) if len(header) == FILE_HEADER.size else (None, None)
+        if magic != FILE_MAGIC or version not in (1, FILE_VERSION):
+            raise ValueError(f'Unsupported trace file: {path}')
+
+        if version == 1:
+            yield from loadTracesV1(f)
+            return
+
+        if os.fstat(f.fileno()).st_size == FILE_HEADER.size:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            traces = []
+            deleted = set()
+            for kind, payload in records(buf):
+                if kind == RECORD_TRACE:
+                    traces.append(parseTrace(payload))
+                elif kind == RECORD_DELETED:
+                    deleted.update(np.frombuffer(payload, dtype='<i8').tolist())
+
+    for trace in traces:
+        if trace.point == NO_POINT or trace.point not in deleted:
+            yield trace
+
+def loadTracesV1(f):
+    '''
+    Yield the traces of a version 1 file, traces were written back to back
+    without framing and aren't linked to points
+    '''
+    while True:
+        header = f.read(TRACE_HEADER_V1.size)
+        if len(header) < TRACE_HEADER_V1.size:
+            break
+
+        traceId, lat, lon, scale, units, count = TRACE_HEADER_V1.unpack(header)
+        data = f.read(count * SAMPLE_DTYPE.itemsize)
+        if len(data) < count * SAMPLE_DTYPE.itemsize:
+            #partially written trace at end of file
+            break
+
+        samples = np.frombuffer(data, dtype=SAMPLE_DTYPE)
+        yield Trace(traceId, (lat, lon), scale, units.rstrip(b'\x00').decode('ascii'), samples)
+
+def rewrite(path, traces):
+    '''
+    Replace a trace file with only the given traces, written to a
+    temporary file first so the old file is kept if writing fails
+    '''
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        for trace in traces:
+            f.write(traceRecord(trace))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def compactTraces(path):
+    '''
+    Rewrite a trace file without the traces of deleted points and any
+    damaged records, it's only rewritten if something was deleted
+
+    Returns:
+        True if the file was rewritten
+    '''
+    if not os.path.exists(path):
+        return False
+
+    with open(path, 'rb') as f:
+        header = f.read(FILE_HEADER.size)
+        if header != FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION) or os.fstat(f.fileno()).st_size == FILE_HEADER.size:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if not any(kind == RECORD_DELETED for kind, _ in records(buf)):
+                return False
+
+    rewrite(path, list(loadTraces(path)))
+    return True
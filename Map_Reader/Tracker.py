@@ -1,36 +1,62 @@
-from PyQt5.QtCore import Qt, QDateTime
+from PyQt5.QtCore import Qt, QDateTime, QTimer
 from PyQt5.QtWidgets import QLabel, QMessageBox, QApplication, QDialog, QWidget
 from PyQt5.QtGui import QCursor, QFont
-from geopy.distance import geodesic
-from collections import namedtuple
-import math
 from MouseController import MouseController
-import numpy as np
-import pandas as pd
+import MotionSource
+import TraceEngine
+from TraceEngine import Point
+from TraceRecorder import TraceRecorder
 
 from CustomQtObjects import *
 
-#Create namedtuple for readability to store point data
-Point = namedtuple('Point', 'x y')
+#Rate (Hz) derived values and display are refreshed at while tracing
+#None recomputes and redraws on every mouse move
+REFRESH_RATE = 60
 
 #Tracker class to handle mouse movement for locating point and setting scale
 #Two modes: scale and location
 class Tracker(QDialog):
 
-    def __init__(self, parent=None, hidden=True):
+    def __init__(self, parent=None, hidden=True, refreshRate=REFRESH_RATE, motionSource=None):
         super(Tracker, self).__init__(parent)
 
         self.hidden = hidden
+        self.refreshRate = refreshRate
+        self.dirty = False
 
-        self.mouseController = MouseController()
-        self.origMouseSpeed = self.mouseController.getSpeed()
-        self.origAcceleration = self.mouseController.getAcceleration()
+        #Relative motion source, None measures the cursor against the window center
+        self.motionSource = motionSource if motionSource else MotionSource.defaultSource()
+
+        #Timer decouples mouse sampling from recomputing and redrawing the display
+        #it also polls the motion source since no mouse events arrive at screen edges
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(max(1, round(1000 / (refreshRate or REFRESH_RATE))))
+        self.refreshTimer.timeout.connect(self.refresh)
+
+        #Pointer speed and acceleration only change cursor movement, motion
+        #sources read raw device deltas. MouseController is Windows only.
+        self.mouseController = None if self.motionSource else MouseController()
+        if self.mouseController:
+            self.origMouseSpeed = self.mouseController.getSpeed()
+            self.origAcceleration = self.mouseController.getAcceleration()
+
+        #Qt-free trace state and math
+        self.engine = self.createEngine()
+
+        #Samples of the current trace and finished traces waiting to be saved
+        self.recorder = TraceRecorder()
+        self.traces = []
 
         self.zeroVariables()
            
         self.cursor = QCursor()
         self.initUI()
-        
+
+    def createEngine(self):
+        '''
+        Create the engine used for scale mode
+        '''
+        return TraceEngine.TraceEngine()
     
     def initUI(self):
         '''
@@ -108,113 +134,373 @@ class Tracker(QDialog):
 
     def getDistance(self, dx, dy):
         '''
-        Calculate straight line distance from point a to b using net distance
-        in x and y direction
+        Calculate straight line distance, see TraceEngine.getDistance
+        '''
+        return TraceEngine.getDistance(dx, dy)
 
-        Args:
-            dx (float): total distance in pixels traveled in x direction
-            dy (float): total distance in pixels traveled in y direction
+    def getBearing(self, dx, dy):
+        '''
+        Calculate the bearing of the mouse movement, see TraceEngine.getBearing
+        '''
+        return TraceEngine.getBearing(dx, dy)
+    
+    def convert(self, dist, scale):
+        '''
+        Convert distance in pixels to units, see TraceEngine.convert
+        '''
+        return TraceEngine.convert(dist, scale)
+    
+    def newLocation(self, ref, dist, bearing):
+        '''
+        Computes the latitude and longitude of a point, see TraceEngine.newLocation
+        '''
+        return TraceEngine.newLocation(ref, dist, bearing, self.units)
+    
+    def zeroVariables(self):
+        '''
+        Zero out all instance variables after mouse has been released.
+        '''
+        self.temp_dx = 0
+        self.temp_dy = 0
+        self.engine.reset()
+
+    def resetTrace(self):
+        '''
+        Reset reference points if user needs to trace again
+        '''
+        self.traces = []
+        self.zeroVariables()
+        self.updateLabel()
+
+    def updateLabel(self):
+        '''
+        Constantly update data on window label
+        '''
+        engine = self.engine
         
-        Returns:
-            Total distance
+        self.displayBox.update(engine.dx, engine.dy, engine.dist_px)
+
+    def track(self):
         '''
-        try:
-            return round(math.sqrt(dx**2 + dy**2), 6)
-        except:
-            return 0
+        Feed the raw distance travelled to the engine and record the movement.
+        This is the only work done on every mouse move.
+        '''
+        if self.motionSource:
+            dx, dy = self.readSource()
+        else:
+            dx, dy = self.readCursor()
 
-    def getBearing(self, dx, dy):
+        if dx or dy:
+            self.engine.move(dx, dy)
+            self.recorder.append(dx, dy)
+            self.dirty = True
+
+    def readSource(self):
+        '''
+        Return the deltas reported by the motion source
         '''
-        Calculate the bearing of the mouse movement
+        dx, dy = self.motionSource.read()
 
-        Args:
-            dx (float): total distance in pixels traveled in x direction
-            dy (float): total distance in pixels traveled in y direction
+        #reverse y for inverted y-axis
+        return dx, -dy
 
-        Returns:
-            bearing (float): bearing in degrees
+    def readCursor(self):
         '''
-        try:
-            bearing = math.degrees(math.atan2(dy, dx))
+        Return the movement since the last event measured from the cursor
+        distance to the window center, repositioning the cursor at the center
+        when a border is reached
+        '''
+        geo = self.geometry()
+        center = self.getCenter()
+        pos = self.cursor.pos()
+        x, y = pos.x(), pos.y()
 
-        except Exception as e:
-            print('Error: getBearing:', e.__class__.__name__)
-            #do something to handle error
-            return 1
+        #Get current x, y distance from center, reverse y for inverted y-axis
+        temp_dx = x - center.x
+        temp_dy = center.y - y
+        dx = temp_dx - self.temp_dx
+        dy = temp_dy - self.temp_dy
+        self.temp_dx = temp_dx
+        self.temp_dy = temp_dy
 
-        else:
-            #shift bearing so 0 degrees is now grid north
-            bearing = (360 + (90 - bearing)) % 360
+        #Check if cursor is within window boundaries
+        #Only reset distance from center when border has been reached
+        curLoc = {x, y}
+        boundaries = {0, geo.width()-1, geo.height()-1}
 
-            return round(bearing, 6)
-    
-    def convert(self, dist, scale):
+        if curLoc.intersection(boundaries):
+            self.temp_dx = 0
+            self.temp_dy = 0
+            self.cursor.setPos(center.x, center.y)
+
+        return dx, dy
+
+    def refresh(self):
+        '''
+        Recompute derived values and redraw the label if the mouse has moved
+        since the last refresh
         '''
-        Convert distance in pixels to unit of measurement (km, mi, etc...)
+        if self.motionSource:
+            self.track()
 
-        Args:
-            dist (float): Euclidean distances from start to end point
-            scale (int): scale to convert pixels to proper units
+        if self.dirty:
+            self.dirty = False
+            self.engine.compute()
+            self.updateLabel()
 
-        Returns:
-            convDist (float): converted mouse movement in correct unit of measurement
+    def update(self):
         '''
-        try:
-            convDist = dist / scale
+        Tracks current x and y distance and updates label
+        '''
+        self.track()
 
-        except Exception as e:
-            print('Error: convert:', e.__class__.__name__)
-            #do something to handle error
-            return 1
+        if not self.refreshRate:
+            self.refresh()
 
+    def restoreMouse(self):
+        '''
+        Reset mouse speed and acceleration to the original settings
+        '''
+        if self.mouseController:
+            self.mouseController.setSpeed(self.origMouseSpeed)
+            self.mouseController.setAcceleration(self.origAcceleration)
+
+    def startTracking(self):
+        '''
+        Start periodic display refresh
+        '''
+        self.dirty = False
+        self.temp_dx = 0
+        self.temp_dy = 0
+        self.recorder.clear()
+        if self.motionSource:
+            self.motionSource.start()
+        if self.refreshRate or self.motionSource:
+            self.refreshTimer.start()
+
+    def stopTracking(self):
+        '''
+        Stop periodic display refresh and compute final derived values
+        '''
+        self.refreshTimer.stop()
+        if self.motionSource:
+            self.track()
+            self.motionSource.stop()
+        self.dirty = True
+        self.refresh()
+        
+    def mousePressEvent(self, e):
+        '''
+        When mouse is pressed cursor will be repositioned at the center
+        of the window and tracking will start.
+        '''
+        if not self.motionSource:
+            center = self.getCenter()
+            self.cursor.setPos(center.x, center.y)
+
+        #Max out mouse pointer speed
+        #self.mouseController.setSpeed(20)
+
+        #turn mouse acceleration off
+        if self.mouseController:
+            self.mouseController.setAcceleration(False)
+
+        self.startTracking()
+                
+        if self.hidden:
+            QApplication.setOverrideCursor(Qt.CrossCursor)
         else:
-            return round(convDist, 6)
+            QApplication.setOverrideCursor(Qt.CrossCursor)
     
-    def newLocation(self, ref, dist, bearing):
+    def mouseReleaseEvent(self, e):
+        '''
+        When mouse is released cursor type will be reset or shown
+        again if hidden.
+        '''
+        #update net dx, dy one more time
+        self.stopTracking()
+
+        #restore cursor type and zero out variables
+        QApplication.restoreOverrideCursor()
+
+        self.restoreMouse()
+
+        self.traces.append(self.recorder.trace())
+        
+        self.parent().confirmScale(self.engine.dist_px)
+        return
+        
+    def closeEvent(self, e):
+        '''
+        Release the motion source devices when the tracker is closed
+        '''
+        self.refreshTimer.stop()
+        if self.motionSource:
+            self.motionSource.close()
+        super(Tracker, self).closeEvent(e)
+
+    def mouseMoveEvent(self, e):
+        '''
+        When mouse button is pressed and moving all fields will be actively updated.
+        The current distance x, y, and total from the center will be added to the 
+        overall distance to track current bearing, distance, and current location.
+        '''
+        self.update()
+
+class TrackerLoc(Tracker):
+
+    def __init__(self, ref, scale, units, parent=None, hidden=True, motionSource=None, singleTrace=False, transform=None):
+        self.ref = ref
+        self.singleTrace = singleTrace
+        self.transform = transform
+        self.scale = scale
+        self.units = units
+        self.refIter = iter(ref)
+        self.currentRef = next(self.refIter)
+        self.traceData = []
+        self.average = TraceEngine.RunningAverage()
+        super(TrackerLoc, self).__init__(parent, hidden, motionSource=motionSource)
+
+    def createEngine(self):
+        '''
+        Create the engine used for location mode
+        '''
+        return TraceEngine.TraceEngine(self.currentRef, self.scale, self.units, self.transform)
+
+    def initUI(self):
+        '''
+        Setup GUI elements of mouse tracker screen.
+        '''      
+        grid = QGridLayout()
+        grid.setContentsMargins(80, 80, 80, 80)
+
+        self.displayBox = LocationDisplayWidget(self.units)          
+        grid.addWidget(self.displayBox, 0, 0, Qt.AlignTop)
+        grid.addWidget(QLabel(''), 0, 1, Qt.AlignTop)
+        self.setLayout(grid)
+        self.setWindowTitle('Location')
+        self.showFullScreen()
+        self.setModal(True)
+        QMessageBox.information(
+            self,
+            'Tracing Prompt',
+            'Begin tracing from first reference point:\n\n'+'Latitude: '+str(self.currentRef[0])+'\nLongitude: '+str(self.currentRef[1]),
+            QMessageBox.Ok
+        )
+
+    def mousePressEvent(self, e):
+        '''
+        Set the current reference before tracking starts.
         '''
-        Computes the latitude and longitude using mouse movements distance
-        and bearing from a reference point
-
-        Args:
-            ref (tuple): latitude and longitude of the reference point
-            dist (float): converted euclidean distance of mouse movement
-            bearing (float): bearing in degrees of mouse movement
-
-        Returns:
-            coords.latitude (float): latitude of new location
-            coords.longitude(float): longitude of new location
-        '''
-        #kilometers
-        if self.units == 'km':
-            coords = geodesic(kilometers=dist).destination(ref, bearing)
-        #miles    
-        elif self.units == 'mi':
-            coords = geodesic(miles=dist).destination(ref, bearing)
-        #meters        
-        elif self.units == 'm':
-            coords = geodesic(meters=dist).destination(ref, bearing)
-        #feet    
-        elif self.units == 'ft':
-            coords = geodesic(feet=dist).destination(ref, bearing)
-        return Point(round(coords.latitude, 6), round(coords.longitude, 6))
+        self.engine.setReference(self.currentRef)
+        super(TrackerLoc, self).mousePressEvent(e)
+
+    def mouseReleaseEvent(self, e):
+        '''
+        When mouse is released cursor type will be reset or shown
+        again if hidden.
+        '''
+        #update net dx, dy one more time
+        self.stopTracking()
+
+        #restore cursor type and zero out variables
+        QApplication.restoreOverrideCursor()
+
+        self.restoreMouse()
+
+        #Full geodesic solve for the stored value, live updates only used the tangent plane
+        engine = self.engine
+        engine.solve()
+        self.updateLabel()
+
+        data = {
+            'Reference': (self.currentRef[0], self.currentRef[1]),
+            'DX': engine.dx,
+            'DY': engine.dy,
+            'Distance_PX': engine.dist_px,
+            'Distance_Actual': engine.dist,
+            'Bearing': engine.bearing,
+            'New_Lat': engine.newLoc[0],
+            'New_Lon': engine.newLoc[1],
+            'Units': self.units,
+            'Preview_Error': round(engine.previewError, 3),
+            'TraceId': self.recorder.id
+        }
+        self.traceData.append(data)
+        self.average.add(engine.newLoc.x, engine.newLoc.y)
+        self.traces.append(self.recorder.trace(self.currentRef, self.scale, self.units))
+        self.zeroVariables()
+
+        #Trace once from the first reference and resolve against all of them
+        if self.singleTrace:
+            self.resolveReferences()
+            self.parent().confirmLocation(self.newLoc.x, self.newLoc.y)
+            return
+
+        try:
+            self.currentRef = next(self.refIter)
+            QMessageBox.information(self,
+                'Tracing Prompt',
+                'Begin tracing from next reference point:\n\n'+'Latitude: '+str(self.currentRef[0])+'\nLongitude: '+str(self.currentRef[1]),
+                QMessageBox.Ok
+            )
+        except StopIteration:
+            self.averageData()
+            self.parent().confirmLocation(self.newLoc.x, self.newLoc.y)
     
-    def zeroVariables(self):
+    def averageData(self, circle=False):
         '''
-        Zero out all instance variables after mouse has been released.
+        Combine the locations traced from each reference. The plain average
+        is accumulated as each trace is released, see TraceEngine.averageData
+        for circle averaging.
         '''
-        self.dx = 0
-        self.dy = 0
-        self.temp_dx = 0
-        self.temp_dy = 0
-        self.dist = 0
-        self.dist_px = 0
-        self.bearing = 0
-        self.newLoc = Point(0, 0)
+        if circle:
+            newLoc = TraceEngine.averageData(self.traceData, circle)
+        else:
+            newLoc = self.average.result()
+        self.newLoc = newLoc if newLoc is not None else Point(0, 0)
+
+    def resolveReferences(self):
+        '''
+        Locate the single trace from the anchor. With control points the
+        trace is also resolved from the map position of every selected
+        reference and the user is warned if those locations don't agree.
+        '''
+        data = self.traceData[-1]
+
+        #engine.solve() already located the trace, exactly from the anchor
+        #or with the control point transform
+        self.newLoc = Point(data['New_Lat'], data['New_Lon'])
+
+        if not self.transform:
+            return
+
+        anchor = data['Reference']
+        pixels = [self.transform.inverse(*point) for point in [anchor] + list(self.ref)]
+        resolution = TraceEngine.resolveReferences(
+            anchor,
+            self.ref,
+            data['DX'],
+            data['DY'],
+            self.scale,
+            self.units,
+            pixels
+        )
+        data['Spread'] = round(resolution.spread, 3)
+
+        if resolution.spread > TraceEngine.CONSISTENCY_TOLERANCE:
+            QMessageBox.warning(
+                self,
+                'Reference Consistency',
+                f'Locations resolved from the selected references differ by up to {resolution.spread:.1f} m, '
+                'check the scale and control points'
+            )
 
     def resetTrace(self):
         '''
         Reset reference points if user needs to trace again
         '''
+        self.traces = []
         self.zeroVariables()
         self.updateLabel()
 
@@ -222,50 +508,136 @@ class Tracker(QDialog):
         '''
         Constantly update data on window label
         '''
-        dx_update = self.dx + self.temp_dx
-        dy_update = self.dy + self.temp_dy
-        dist_update = self.dist_px
+        engine = self.engine
         
-        self.displayBox.update(dx_update, dy_update, dist_update)
+        self.displayBox.update(engine.dx, engine.dy, engine.dist_px)
 
-    def update(self):
+    def track(self):
         '''
-        Tracks current x and y distance and updates label
+        Feed the raw distance travelled to the engine and record the movement.
+        This is the only work done on every mouse move.
+        '''
+        if self.motionSource:
+            dx, dy = self.readSource()
+        else:
+            dx, dy = self.readCursor()
+
+        if dx or dy:
+            self.engine.move(dx, dy)
+            self.recorder.append(dx, dy)
+            self.dirty = True
+
+    def readSource(self):
+        '''
+        Return the deltas reported by the motion source
+        '''
+        dx, dy = self.motionSource.read()
+
+        #reverse y for inverted y-axis
+        return dx, -dy
+
+    def readCursor(self):
+        '''
+        Return the movement since the last event measured from the cursor
+        distance to the window center, repositioning the cursor at the center
+        when a border is reached
         '''
         geo = self.geometry()
-        cur = self.cursor
         center = self.getCenter()
-        
-        #Get current x, y, and straight line distance from center
-        self.temp_dx = self.getDX()
-        self.temp_dy = self.getDY()
-        self.dist_px = self.getDistance(self.dx + self.temp_dx, self.dy + self.temp_dy)
+        pos = self.cursor.pos()
+        x, y = pos.x(), pos.y()
+
+        #Get current x, y distance from center, reverse y for inverted y-axis
+        temp_dx = x - center.x
+        temp_dy = center.y - y
+        dx = temp_dx - self.temp_dx
+        dy = temp_dy - self.temp_dy
+        self.temp_dx = temp_dx
+        self.temp_dy = temp_dy
 
         #Check if cursor is within window boundaries
-        #Only update dx, dy instance variables when border has been reached
-        curLoc = {cur.pos().x(), cur.pos().y()}
+        #Only reset distance from center when border has been reached
+        curLoc = {x, y}
         boundaries = {0, geo.width()-1, geo.height()-1}
 
         if curLoc.intersection(boundaries):
-            self.dx += self.temp_dx
-            self.dy += self.temp_dy
-            cur.setPos(center.x, center.y)
+            self.temp_dx = 0
+            self.temp_dy = 0
+            self.cursor.setPos(center.x, center.y)
 
-        self.updateLabel()
+        return dx, dy
+
+    def refresh(self):
+        '''
+        Recompute derived values and redraw the label if the mouse has moved
+        since the last refresh
+        '''
+        if self.motionSource:
+            self.track()
+
+        if self.dirty:
+            self.dirty = False
+            self.engine.compute()
+            self.updateLabel()
+
+    def update(self):
+        '''
+        Tracks current x and y distance and updates label
+        '''
+        self.track()
+
+        if not self.refreshRate:
+            self.refresh()
+
+    def restoreMouse(self):
+        '''
+        Reset mouse speed and acceleration to the original settings
+        '''
+        if self.mouseController:
+            self.mouseController.setSpeed(self.origMouseSpeed)
+            self.mouseController.setAcceleration(self.origAcceleration)
+
+    def startTracking(self):
+        '''
+        Start periodic display refresh
+        '''
+        self.dirty = False
+        self.temp_dx = 0
+        self.temp_dy = 0
+        self.recorder.clear()
+        if self.motionSource:
+            self.motionSource.start()
+        if self.refreshRate or self.motionSource:
+            self.refreshTimer.start()
+
+    def stopTracking(self):
+        '''
+        Stop periodic display refresh and compute final derived values
+        '''
+        self.refreshTimer.stop()
+        if self.motionSource:
+            self.track()
+            self.motionSource.stop()
+        self.dirty = True
+        self.refresh()
         
     def mousePressEvent(self, e):
         '''
         When mouse is pressed cursor will be repositioned at the center
         of the window and tracking will start.
         '''
-        center = self.getCenter()
-        self.cursor.setPos(center.x, center.y)
+        if not self.motionSource:
+            center = self.getCenter()
+            self.cursor.setPos(center.x, center.y)
 
         #Max out mouse pointer speed
         #self.mouseController.setSpeed(20)
 
         #turn mouse acceleration off
-        self.mouseController.setAcceleration(False)
+        if self.mouseController:
+            self.mouseController.setAcceleration(False)
+
+        self.startTracking()
                 
         if self.hidden:
             QApplication.setOverrideCursor(Qt.CrossCursor)
@@ -278,21 +650,27 @@ class Tracker(QDialog):
         again if hidden.
         '''
         #update net dx, dy one more time
-        self.dx += self.temp_dx
-        self.dy += self.temp_dy
+        self.stopTracking()
 
         #restore cursor type and zero out variables
         QApplication.restoreOverrideCursor()
 
-        #Reset mouse speed to original setting
-        self.mouseController.setSpeed(self.origMouseSpeed)
+        self.restoreMouse()
 
-        #Reset mouse acceleration
-        self.mouseController.setAcceleration(self.origAcceleration)
+        self.traces.append(self.recorder.trace())
         
-        self.parent().confirmScale(self.dist_px)
+        self.parent().confirmScale(self.engine.dist_px)
         return
         
+    def closeEvent(self, e):
+        '''
+        Release the motion source devices when the tracker is closed
+        '''
+        self.refreshTimer.stop()
+        if self.motionSource:
+            self.motionSource.close()
+        super(Tracker, self).closeEvent(e)
+
     def mouseMoveEvent(self, e):
         '''
         When mouse button is pressed and moving all fields will be actively updated.
@@ -303,14 +681,23 @@ class Tracker(QDialog):
 
 class TrackerLoc(Tracker):
 
-    def __init__(self, ref, scale, units, parent=None, hidden=True):
+    def __init__(self, ref, scale, units, parent=None, hidden=True, motionSource=None, singleTrace=False, transform=None):
         self.ref = ref
+        self.singleTrace = singleTrace
+        self.transform = transform
         self.scale = scale
         self.units = units
         self.refIter = iter(ref)
         self.currentRef = next(self.refIter)
         self.traceData = []
-        super(TrackerLoc, self).__init__(parent, hidden)
+        self.average = TraceEngine.RunningAverage()
+        super(TrackerLoc, self).__init__(parent, hidden, motionSource=motionSource)
+
+    def createEngine(self):
+        '''
+        Create the engine used for location mode
+        '''
+        return TraceEngine.TraceEngine(self.currentRef, self.scale, self.units, self.transform)
 
     def initUI(self):
         '''
@@ -333,37 +720,55 @@ class TrackerLoc(Tracker):
             QMessageBox.Ok
         )
 
+    def mousePressEvent(self, e):
+        '''
+        Set the current reference before tracking starts.
+        '''
+        self.engine.setReference(self.currentRef)
+        super(TrackerLoc, self).mousePressEvent(e)
+
     def mouseReleaseEvent(self, e):
         '''
         When mouse is released cursor type will be reset or shown
         again if hidden.
         '''
         #update net dx, dy one more time
-        self.dx += self.temp_dx
-        self.dy += self.temp_dy
+        self.stopTracking()
 
         #restore cursor type and zero out variables
         QApplication.restoreOverrideCursor()
 
-        #Reset mouse speed to original setting
-        self.mouseController.setSpeed(self.origMouseSpeed)
+        self.restoreMouse()
+
+        #Full geodesic solve for the stored value, live updates only used the tangent plane
+        engine = self.engine
+        engine.solve()
+        self.updateLabel()
 
-        #Reset mouse acceleration
-        self.mouseController.setAcceleration(self.origAcceleration)
-        
         data = {
             'Reference': (self.currentRef[0], self.currentRef[1]),
-            'DX': self.dx,
-            'DY': self.dy,
-            'Distance_PX': self.dist_px,
-            'Distance_Actual': self.dist,
-            'Bearing': self.bearing,
-            'New_Lat': self.newLoc[0],
-            'New_Lon': self.newLoc[1],
-            'Units': self.units 
+            'DX': engine.dx,
+            'DY': engine.dy,
+            'Distance_PX': engine.dist_px,
+            'Distance_Actual': engine.dist,
+            'Bearing': engine.bearing,
+            'New_Lat': engine.newLoc[0],
+            'New_Lon': engine.newLoc[1],
+            'Units': self.units,
+            'Preview_Error': round(engine.previewError, 3),
+            'TraceId': self.recorder.id
         }
         self.traceData.append(data)
+        self.average.add(engine.newLoc.x, engine.newLoc.y)
+        self.traces.append(self.recorder.trace(self.currentRef, self.scale, self.units))
         self.zeroVariables()
+
+        #Trace once from the first reference and resolve against all of them
+        if self.singleTrace:
+            self.resolveReferences()
+            self.parent().confirmLocation(self.newLoc.x, self.newLoc.y)
+            return
+
         try:
             self.currentRef = next(self.refIter)
             QMessageBox.information(self,
@@ -377,85 +782,45 @@ class TrackerLoc(Tracker):
     
     def averageData(self, circle=False):
         '''
-        Averaging master function
-        '''
-        if circle == True:
-            df = pd.DataFrame(self.traceData, columns=['Reference', 'New_Lat', 'New_Lon'])
-            df[['Reference_x', 'Reference_y']] = pd.DataFrame(df['Reference'].tolist(), index=df.index)
-            df.drop('Reference', axis=1, inplace=True)
-            df = df[['Reference_x', 'Reference_y', 'New_Lat', 'New_Lon']]
-            df['Euclidean_Dist'] = self.convertEuclidean(df['Reference_x'], df['Reference_y'], df['New_Lat'], df['New_Lon'])
-            df.drop(['New_Lat', 'New_Lon'], axis=1, inplace=True)
-            final = []
-            for row1 in df.itertuples(index=False):
-                for row2 in df.itertuples(index=False):
-                    dx = row2.Reference_x - row1.Reference_x
-                    dy = row2.Reference_y - row1.Reference_y
-                    d = math.sqrt((dx**2 + dy**2))
-                    if row1 == row2:
-                        print("Same Circle!")
-                        continue
-                    if d >= (row2.Euclidean_Dist + row1.Euclidean_Dist):
-                        #Sure of this formula, derived it myself
-                        print("Circles do not meet or meet at exactly 1 point!")
-                        temp1X = row2.Reference_x + row2.Euclidean_Dist * ((row1.Reference_x - row2.Reference_x)/d)
-                        temp1Y = row2.Reference_y + row2.Euclidean_Dist * ((row1.Reference_y - row2.Reference_y)/d)
-                        temp2X = row1.Reference_x + row1.Euclidean_Dist * ((row2.Reference_x - row1.Reference_x)/d)
-                        temp2Y = row1.Reference_y + row1.Euclidean_Dist * ((row2.Reference_y - row1.Reference_y)/d)
-                        data1 = {
-                            'New_Lat': temp1X,
-                            'New_Lon': temp1Y
-                        }
-                        data2 = {
-                            'New_Lat': temp2X,
-                            'New_Lon': temp2Y
-                        }
-                        final.append(data1)
-                        final.append(data2)
-                    elif d > abs(row2.Euclidean_Dist - row1.Euclidean_Dist):
-                        #Unsure of this formula, pulled it from online, needs testing
-                        print("Circles meet at exactly 2 points!")
-                        centerDist = ((row1.Euclidean_Dist**2 - row2.Euclidean_Dist**2 + d**2)/(2.0 * d))
-                        centerX = row1.Reference_x + (dx * (centerDist/d))
-                        centerY = row1.Reference_y + (dy * (centerDist/d))
-                        height = math.sqrt(row2.Euclidean_Dist**2 - centerDist**2)
-                        temp1X = centerX + (-1) * dy * (height/d)
-                        temp1Y = centerY + dx * (height/d)
-                        temp2X = centerX - (-1) * dy * (height/d)
-                        temp2Y = centerY - dx * (height/d)
-                        data1 = {
-                            'New_Lat': temp1X,
-                            'New_Lon': temp1Y
-                        }
-                        data2 = {
-                            'New_Lat': temp2X,
-                            'New_Lon': temp2Y
-                        }
-                        final.append(data1)
-                        final.append(data2)
-                    else:
-                        print("Error! One circle is completely inside another.  Cannot perform calculation!")
-                        return
-            finaldf = pd.DataFrame(final, columns=['New_Lat','New_Lon'])
-            print(finaldf)
-            self.newLoc = Point(round(finaldf["New_Lat"].mean(), 6), round(finaldf["New_Lon"].mean(), 6))
-            return
+        Combine the locations traced from each reference. The plain average
+        is accumulated as each trace is released, see TraceEngine.averageData
+        for circle averaging.
+        '''
+        if circle:
+            newLoc = TraceEngine.averageData(self.traceData, circle)
         else:
-            df = pd.DataFrame(self.traceData, columns=['Reference', 'DX', 'DY', 'Distance_PX', 'Distance_Actual', 'Bearing', 'New_Lat', 'New_Lon', 'Units'])
-            df[['Reference_x', 'Reference_y']] = pd.DataFrame(df['Reference'].tolist(), index=df.index)
-            df.drop('Reference', axis=1, inplace=True)
-            df = df[['Reference_x', 'Reference_y', 'DX', 'DY', 'Distance_PX', 'Distance_Actual', 'Bearing', 'New_Lat', 'New_Lon', 'Units']]
-            #print(df)
-            self.newLoc = Point(round(df["New_Lat"].mean(), 6), round(df["New_Lon"].mean(), 6))
-            return
-    
-    def convertEuclidean(self, refx, refy, endx, endy):
+            newLoc = self.average.result()
+        self.newLoc = newLoc if newLoc is not None else Point(0, 0)
+
+    def resolveReferences(self):
         '''
-        Convert reference point (lat, long) and new point (lat, long) to euclidian distance in (lat, long)
+        Resolve the single trace against every selected reference and warn
+        if the per-reference locations don't agree
         '''
-        actualx = endx - refx
-        actualy = endy - refy
-        return round(np.sqrt(actualx**2 + actualy**2), 6)
+        data = self.traceData[-1]
+
+        #control point transform already located the trace on the map
+        if self.transform:
+            self.newLoc = Point(data['New_Lat'], data['New_Lon'])
+            return
+
+        resolution = TraceEngine.resolveReferences(
+            data['Reference'],
+            self.ref,
+            data['DX'],
+            data['DY'],
+            self.scale,
+            self.units
+        )
+        data['Spread'] = round(resolution.spread, 3)
+        self.newLoc = resolution.location
+
+        if resolution.spread > TraceEngine.CONSISTENCY_TOLERANCE:
+            QMessageBox.warning(
+                self,
+                'Reference Consistency',
+                f'Locations resolved from the selected references differ by up to {resolution.spread:.1f} m'
+            )
 
     def resetTrace(self):
         '''
@@ -464,6 +829,8 @@ class TrackerLoc(Tracker):
         self.refIter = iter(self.ref)
         self.currentRef = next(self.refIter)
         self.traceData = []
+        self.average.reset()
+        self.traces = []
         self.zeroVariables()
         self.updateLabel()
 
@@ -471,52 +838,63 @@ class TrackerLoc(Tracker):
         '''
         Constantly update data on window label
         '''
-        dx = self.dx + self.temp_dx
-        dy = self.dy + self.temp_dy
-        distpx = self.dist_px
-        ref = self.currentRef
-        bearing = self.bearing
-        dist = self.dist
-        new_loc = (self.newLoc.x, self.newLoc.y)
+        engine = self.engine
 
         self.displayBox.update(
-            dx,
-            dy,
-            distpx,
-            ref,
-            bearing,
-            dist,
-            new_loc
+            engine.dx,
+            engine.dy,
+            engine.dist_px,
+            self.currentRef,
+            engine.bearing,
+            engine.dist,
+            (engine.newLoc.x, engine.newLoc.y)
         )
-    
-    def update(self):
+
+class TrackerControl(Tracker):
+    '''
+    Traces from the first reference point to a control point. The net
+    pixel distance is the control point's position on the map, see
+    Georeference.GeoTransform.
+    '''
+    def __init__(self, ref, parent=None, hidden=True, motionSource=None):
+        self.ref = ref
+        super(TrackerControl, self).__init__(parent, hidden, motionSource=motionSource)
+
+    def initUI(self):
         '''
-        Tracks current x and y distance and updates label
+        Setup GUI elements of mouse tracker screen.
         '''
-        geo = self.geometry()
-        cur = self.cursor
-        center = self.getCenter()
-        
-        #Get current x, y, and straight line distance from center
-        self.temp_dx = self.getDX()
-        self.temp_dy = self.getDY()
-        self.dist_px = self.getDistance(self.dx + self.temp_dx, self.dy + self.temp_dy)
-
-        self.bearing = self.getBearing(self.dx + self.temp_dx, self.dy + self.temp_dy)
-        self.dist = self.convert(self.dist_px, self.scale)
-        self.newLoc = self.newLocation(self.currentRef, self.dist, self.bearing)
-            
-        #Check if cursor is within window boundaries
-        #Only update dx, dy instance variables when border has been reached
-        curLoc = {cur.pos().x(), cur.pos().y()}
-        boundaries = {0, geo.width()-1, geo.height()-1}
+        grid = QGridLayout()
+        grid.setContentsMargins(80, 80, 80, 80)
 
-        if curLoc.intersection(boundaries):
-            self.dx += self.temp_dx
-            self.dy += self.temp_dy
-            cur.setPos(center.x, center.y)
+        self.displayBox = ScaleDisplayWidget()
+        grid.addWidget(self.displayBox, 0, 0, Qt.AlignTop)
+        grid.addWidget(QLabel(''), 0, 1, Qt.AlignTop)
+        self.setLayout(grid)
+        self.setWindowTitle('Control Point')
+        self.showFullScreen()
+        self.setModal(True)
+        QMessageBox.information(
+            self,
+            'Tracing Prompt',
+            'Trace from first reference point to the control point:\n\n'+'Latitude: '+str(self.ref[0])+'\nLongitude: '+str(self.ref[1]),
+            QMessageBox.Ok
+        )
 
-        self.updateLabel()
+    def mouseReleaseEvent(self, e):
+        '''
+        When mouse is released cursor type will be reset or shown
+        again if hidden.
+        '''
+        #update net dx, dy one more time
+        self.stopTracking()
+
+        #restore cursor type and zero out variables
+        QApplication.restoreOverrideCursor()
+
+        self.restoreMouse()
+
+        self.parent().confirmControlPoint(self.engine.dx, self.engine.dy)
 
 class ScaleDisplayWidget(QWidget):
     def __init__(self, parent=None):
@@ -1,13 +1,18 @@
 import os
+import bisect
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import QDoubleValidator, QRegExpValidator
 from PyQt5.QtCore import Qt, QRegExp, QDateTime
 from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import Qt, QUrl, pyqtSlot, qInstallMessageHandler
+from PyQt5.QtCore import Qt, QUrl, pyqtSlot, pyqtSignal, qInstallMessageHandler
 from PyQt5.QtWebChannel import QWebChannel
 from statistics import mean
 import webbrowser
 from functools import partial
+
+import Dates
+import ChangeSet
+import SearchIndex
 from geopy import Point
 
 from MouseController import MouseController
@@ -260,10 +265,12 @@ class AddPointWindow(QDialog):
             self.saveButton.setEnabled(False)
 
     def getConfirmedData(self):
+        ts, offset = Dates.now()
         return {
             'Latitude': self.lat,
             'Longitude': self.lon,
-            'Date': QDateTime().currentDateTime().toString('MM-dd-yyyy hh:mm:ss ap'),
+            'Timestamp': ts,
+            'UTCOffset': offset,
             'Description': self.desc
         }
 
@@ -361,10 +368,12 @@ class LocationWindow(QDialog):
             self.saveButton.setEnabled(False)
 
     def getConfirmedData(self):
+        ts, offset = Dates.now()
         return {
             'Latitude': self.lat,
             'Longitude': self.lon,
-            'Date': QDateTime().currentDateTime().toString('MM-dd-yyyy hh:mm:ss ap'),
+            'Timestamp': ts,
+            'UTCOffset': offset,
             'Description': self.desc
         }
 
@@ -608,12 +617,24 @@ class ProjectSettingsWindow(QDialog):
         self.close()
 
 class MapWindow(QWidget):
+    #changes to the points and reference points sent to index.html through
+    #the web channel, so the page updates its markers instead of rebuilding
+    #the map. Points are in the form of PointStore.mapPoints().
+    pointsAdded = pyqtSignal(int, list)
+    pointsRemoved = pyqtSignal(int, int)
+    pointsChanged = pyqtSignal(int, list)
+    pointsReset = pyqtSignal(list)
+    referenceChanged = pyqtSignal(list)
+    #whether points are highlighted and the rows to highlight
+    pointsHighlighted = pyqtSignal(bool, list)
+
     def __init__(self, api, ref, points):
         super(MapWindow, self).__init__()
         qInstallMessageHandler(lambda *args: None)
         self.api = api
         self.ref = ref
         self.points = points
+        self.query = ''
 
         self.resize(1080, 768)
         self.initUI()
@@ -648,16 +669,14 @@ class MapWindow(QWidget):
     def getRef(self):
         return [{'lat': lat, 'lng': lng} for lat, lng in self.ref]
 
-    #pass point data to index.html
-    @pyqtSlot(result=list)
-    def getPoints(self):
-        gmapsPoints = [{
-            'Point': {'lat': p['Latitude'], 'lng': p['Longitude']},
-            'Description': p['Description'],
-            'Date': p['Date']
-        } for p in self.points]
-
-        return gmapsPoints
+    #pass everything the map shows to index.html when it's first drawn
+    @pyqtSlot(result='QVariantMap')
+    def getMap(self):
+        return {
+            'Center': self.getCenter()[0],
+            'Reference': self.getRef(),
+            'Points': self.mapPoints()
+        }
 
     #pass api key to index.html
     @pyqtSlot(result=str)
@@ -665,10 +684,78 @@ class MapWindow(QWidget):
         return self.api
 
     def update(self, api, ref, points):
+        '''
+        Show new points and reference points, every marker is replaced but
+        the map keeps its position and zoom
+        '''
         self.api = api
         self.ref = ref
         self.points = points
-        self.mapView.page().runJavaScript('initMap()')
+        self.pointsReset.emit(self.mapPoints())
+        self.referenceChanged.emit(self.getRef())
+
+    def mapPoints(self, start=0, stop=None):
+        '''
+        PointStore.mapPoints() with whether each point matches the search
+        being highlighted. All the points are matched with the search
+        index, a range of changed points only tests their own descriptions.
+        '''
+        points = self.points.mapPoints(start, stop)
+        if SearchIndex.tokenize(self.query):
+            if stop is None:
+                hits = self.points.search(self.query)[start:].tolist()
+            else:
+                hits = [SearchIndex.matches(self.query, point['Description']) for point in points]
+            for point, hit in zip(points, hits):
+                point['Highlighted'] = hit
+
+        return points
+
+    def applyChanges(self, changes):
+        '''
+        Send the changes to the points and reference points since the last
+        refresh to the map, one marker per added, deleted or edited point
+
+        Args:
+            changes (dict): ChangeSet.take() of MainWindow
+        '''
+        points = changes.get('Points', ())
+        rows = ChangeSet.finalRows(points)
+        if any(row is None for (op, _), row in zip(points, rows) if op != 'delete'):
+            #a point was replaced or deleted after being added or edited
+            self.pointsReset.emit(self.mapPoints())
+        else:
+            for (op, index), row in zip(points, rows):
+                if op == 'add':
+                    self.pointsAdded.emit(index, self.mapPoints(row, row + 1))
+                elif op == 'delete':
+                    self.pointsRemoved.emit(index, 1)
+                elif op == 'edit':
+                    self.pointsChanged.emit(index, self.mapPoints(row, row + 1))
+
+        if changes.get('Reference'):
+            self.referenceChanged.emit(self.getRef())
+
+    def pointsLoaded(self, first, count):
+        '''
+        Send count points appended from row first while the project is read
+        '''
+        self.pointsAdded.emit(first, self.mapPoints(first, first + count))
+
+    def highlight(self, query):
+        '''
+        Highlight the markers of the points matching a search. The whole
+        search only runs when the query changes, points added or edited
+        later are sent with their own match (see mapPoints) and the map
+        shows the highlight of each point when it's first drawn.
+
+        Args:
+            query (str): SearchIndex query, no words for none
+        '''
+        self.query = query
+        active = bool(SearchIndex.tokenize(query))
+        rows = self.points.search(query).nonzero()[0].tolist() if active else []
+        self.pointsHighlighted.emit(active, rows)
 
 '''
 About Window Class Containing Info About Project
@@ -728,7 +815,11 @@ class ReferenceSelectionWindow(QDialog):
 
         self.table = Table('Reference Points', self.tableData, checkable=True)
 
+        #trace once from the first checked reference and resolve against all of them
+        self.singleTraceBox = QCheckBox('Single trace from first reference')
+
         mainLayout.addWidget(self.table)
+        mainLayout.addWidget(self.singleTraceBox)
         mainLayout.addLayout(h2Layout)
     
         self.setLayout(mainLayout)
@@ -744,6 +835,7 @@ class ReferenceSelectionWindow(QDialog):
             return
 
         self.selectedData = [(item['Latitude'], item['Longitude']) for item in self.selectedData]
+        self.singleTrace = self.singleTraceBox.isChecked()
         self.accept()
         self.close()
 
@@ -769,17 +861,17 @@ class StarterWindow(QDialog):
         hLayout = QHBoxLayout()
         self.projectTable = QTableWidget(self)
 
-        projects_data = self.controller.getAllProjectData()
-        self.projectTable.setRowCount(len(projects_data))
-        self.projectTable.setColumnCount(2)
-        
-        for i, project in enumerate(projects_data):
-            self.projectTable.setItem(i,0, QTableWidgetItem(project.get('ProjectName')))
-            self.projectTable.setItem(i,1, QTableWidgetItem(str(len(project.get('Points')))))
+        self.projectTable.setColumnCount(3)
+
+        #Rows are added by the scanner as projects are found, most recently
+        #accessed first. sortKeys holds -timestamp of each row in order
+        self.sortKeys = []
+        self.scanner = self.controller.scanProjects()
+        self.scanner.found.connect(self.addProject)
             
         self.projectTable.cellDoubleClicked.connect(self.openProjectDC)
         
-        self.projectTable.setHorizontalHeaderLabels(["Projects", "No. Points"])
+        self.projectTable.setHorizontalHeaderLabels(["Projects", "No. Points", "Last Accessed"])
         header = self.projectTable.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.ResizeToContents)       
         header.setSectionResizeMode(0, QHeaderView.Stretch)
@@ -804,12 +896,35 @@ class StarterWindow(QDialog):
         self.setLayout(mainLayout)
 
         self.show()     
+        self.scanner.start()
+
+    def addProject(self, name, project):
+        '''
+        Slot for the project scanner, insert a project keeping the rows
+        ordered by last accessed
+        '''
+        lastAccessed = project.get('LastAccessed')
+        key = -(Dates.timestamp(lastAccessed) or 0)
+        row = bisect.bisect_right(self.sortKeys, key)
+        self.sortKeys.insert(row, key)
+
+        points = project.get('Points')
+        nameItem = QTableWidgetItem(project.get('ProjectName') or name)
+        nameItem.setData(Qt.UserRole, name)
+
+        self.projectTable.insertRow(row)
+        self.projectTable.setItem(row, 0, nameItem)
+        self.projectTable.setItem(row, 1, QTableWidgetItem('Unreadable' if points is None else str(points)))
+        self.projectTable.setItem(row, 2, QTableWidgetItem(lastAccessed or ''))
 
     def openProjectDC(self, row, column):
-        item = self.projectTable.currentItem()
+        item = self.projectTable.item(row, 0)
         
-        projectName = item.text()
+        projectName = item.data(Qt.UserRole)
         if column == 0:
+            #the scan could be reading the project being opened
+            self.scanner.found.disconnect(self.addProject)
+            self.controller.stopScan()
             self.hide()
             self.controller.openProject(projectName, self)
         